@@ -3,7 +3,6 @@ import random
 import math
 import warnings
 from sys import maxsize
-import json
 
 
 """
@@ -15,14 +14,18 @@ Advanced strategy tips:
   - You can analyze action frames by modifying on_action_frame function
 
   - The GameState.map object can be manually manipulated to create hypothetical 
-  board states. Though, we recommended making a copy of the map to preserve 
-  the actual current map state.
+  board states. Though, we recommended using game_state.fork() to get a cheap 
+  copy of the state and preserve the actual current map state.
 """
 
 
 class AlgoStrategy(gamelib.AlgoCore):
     def __init__(self):
         super().__init__()
+        # Have on_turn and on_action_frame receive decoded dicts, so each message is only parsed once
+        self.decode_messages = True
+        # on_action_frame only reads breaches, so frames without one are skipped
+        self.set_action_frame_filter(events=["breach"])
         seed = random.randrange(maxsize)
         random.seed(seed)
         gamelib.debug_write('Random seed: {}'.format(seed))
@@ -149,12 +152,8 @@ class AlgoStrategy(gamelib.AlgoCore):
 
         # 2. If enemy's total effective shielding amount > 25, prepare more destructive interceptors
         # health for scout is 15, 25+15 will require an additional interceptor (40)
-        for enemyLocation in ENEMY_MAP:
-            unit = game_state.contains_stationary_unit(enemyLocation)
-            if unit != False:
-                if unit.unit_type == "EF":
-                    self.enemy_shielding_power += self.cf_calculate_support_power(
-                        unit.y, unit.upgraded)
+        # Only supports along a path the enemy units can actually take count, use the best spawn for them
+        self.enemy_shielding_power = self.cf_calculate_enemy_shielding(game_state)
         self.destructive_interceptors_count += (
             self.enemy_shielding_power+25)//40
         # gamelib.debug_write("Enemy has {} effective shielding".format(
@@ -279,14 +278,18 @@ class AlgoStrategy(gamelib.AlgoCore):
             game_state, nextfullScan, xCoord+1, nextCoordinatesList)
         return
 
-    def cf_calculate_support_power(self, y: int, upgraded: bool) -> int:
+    def cf_calculate_enemy_shielding(self, game_state) -> float:
         """
-        calculate the shield a particular enemy support provides
+        calculate the most shield an enemy mobile unit can gain on its way to our edge
         """
-        if (upgraded):
-            return 2 + (27 - y) * 0.34
-        else:
-            return 3
+        shield_map = game_state.shield_map(1)
+        if not shield_map.supports:
+            return 0
+        edges = game_state.game_map.get_edges()
+        spawn_locations = [location for location in edges[game_state.game_map.TOP_LEFT] + edges[game_state.game_map.TOP_RIGHT]
+                           if not game_state.contains_stationary_unit(location)]
+        paths = game_state.find_paths_from_edges(spawn_locations)
+        return max([shield_map.path_shield(path) for path in paths.values()] + [0])
 
     def cf_build_core(self, game_state):
         game_state.attempt_spawn(WALL, self.wall_build_core)
@@ -688,22 +691,22 @@ class AlgoStrategy(gamelib.AlgoCore):
         # By asking attempt_spawn to spawn 1000 units, it will essentially spawn as many as we have resources for
         game_state.attempt_spawn(DEMOLISHER, [24, 10], 1000)
 
-    def least_damage_spawn_location(self, game_state, location_options):
+    def least_damage_spawn_location(self, game_state, location_options, unit_type=None):
         """
         This function will help us guess which location is the safest to spawn moving units from.
         It gets the path the unit will take then checks locations on that path to 
         estimate the path's damage risk.
         """
+        if unit_type is None:
+            unit_type = SCOUT
         damages = []
+        # Get all the paths at once, this is much faster than calling find_path_to_edge for each location
+        paths = game_state.find_paths_from_edges(location_options)
+        # The threat map holds the damage enemy turrets deal on every tile, computed once per turn
+        threat_map = game_state.threat_map(0)
         # Get the damage estimate each path will take
         for location in location_options:
-            path = game_state.find_path_to_edge(location)
-            damage = 0
-            for path_location in path:
-                # Get number of enemy turrets that can attack each location and multiply by turret damage
-                damage += len(game_state.get_attackers(path_location, 0)) * \
-                    gamelib.GameUnit(TURRET, game_state.config).damage_i
-            damages.append(damage)
+            damages.append(threat_map.path_damage(paths[tuple(location)], unit_type))
 
         # Now just return the location that takes the least damage
         return location_options[damages.index(min(damages))]
@@ -724,7 +727,7 @@ class AlgoStrategy(gamelib.AlgoCore):
                 filtered.append(location)
         return filtered
 
-    def on_action_frame(self, turn_string):
+    def on_action_frame(self, state):
         """
         This is the action frame of the game. This function could be called 
         hundreds of times per turn and could slow the algo down so avoid putting slow code here.
@@ -732,7 +735,7 @@ class AlgoStrategy(gamelib.AlgoCore):
         Full doc on format of a game frame at in json-docs.html in the root of the Starterkit.
         """
         # Let's record at what position we get scored on
-        state = json.loads(turn_string)
+        # The filter set in __init__ only keeps the breach events of frames that have some
         events = state["events"]
         breaches = events["breach"]
         for breach in breaches:
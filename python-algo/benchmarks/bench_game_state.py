@@ -0,0 +1,54 @@
+"""
+Measures the cost of building a GameState at the start of a turn, eagerly and lazily.
+
+Usage, from the python-algo folder:
+    python benchmarks/bench_game_state.py [REPLAY_FILE.replay ...]
+
+With replays, the first and last turns of each replay are used as the early and late game states.
+Without, states with few and many structures are made up from game-configs.json.
+
+For each state it reports, in milliseconds per turn:
+    eager       GameState(config, turn)
+    eager + map GameState(config, turn), then reading every tile of the map
+    lazy        GameState(config, turn, lazy=True), reading only the resources
+    lazy + map  GameState(config, turn, lazy=True), then reading every tile of the map
+"""
+
+import sys
+
+from common import load_config, load_replay, synthetic_turn, time_per_call, turn_frames
+
+import gamelib
+
+
+def sample_states():
+    if len(sys.argv) > 1:
+        for path in sys.argv[1:]:
+            config, frames = load_replay(path)
+            turns = turn_frames(frames)
+            yield "{} early (turn 1)".format(path), config, turns[min(1, len(turns) - 1)]
+            yield "{} late (turn {})".format(path, len(turns) - 1), config, turns[-1]
+    else:
+        config = load_config()
+        yield "synthetic early (10 structures per player)", config, synthetic_turn(config, 2, 10)
+        yield "synthetic late (120 structures per player)", config, synthetic_turn(config, 60, 120, 20)
+
+
+def read_map(game_state):
+    game_map = game_state.game_map
+    for location in game_map:
+        game_map[location]
+
+
+def main():
+    print("{:<60}{:>12}{:>12}{:>12}{:>12}".format("state", "eager", "eager + map", "lazy", "lazy + map"))
+    for name, config, turn in sample_states():
+        eager = time_per_call(lambda: gamelib.GameState(config, turn))
+        eager_map = time_per_call(lambda: read_map(gamelib.GameState(config, turn)))
+        lazy = time_per_call(lambda: gamelib.GameState(config, turn, lazy=True).get_resources())
+        lazy_map = time_per_call(lambda: read_map(gamelib.GameState(config, turn, lazy=True)))
+        print("{:<60}{:>10.3f}ms{:>10.3f}ms{:>10.3f}ms{:>10.3f}ms".format(name, eager, eager_map, lazy, lazy_map))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Measures the json backends gamelib can use to talk to the game engine.
+
+Usage, from the python-algo folder:
+    python benchmarks/bench_json.py [REPLAY_FILE.replay ...]
+
+Every frame of the replays is parsed with each installed backend, as the algo does during a game,
+and a build stack is serialized as submit_turn does. Without replays, a game's worth of made up
+turn frames is used instead.
+
+For each backend it reports:
+    loads       frames parsed per second
+    dumps       build stacks serialized per second
+"""
+
+import sys
+
+from common import load_config, load_replay, synthetic_turn, time_per_call
+
+from gamelib.util import JSON_CODECS
+
+
+def sample_frames():
+    if len(sys.argv) > 1:
+        frames = []
+        for path in sys.argv[1:]:
+            frames.extend(load_replay(path)[1])
+        return "{} frames from {}".format(len(frames), ", ".join(sys.argv[1:])), frames
+    config = load_config()
+    frames = [synthetic_turn(config, turn, min(120, 5 + 2 * turn), turn % 10, seed=turn) for turn in range(60)]
+    return "{} synthetic turn frames".format(len(frames)), frames
+
+
+def main():
+    name, frames = sample_frames()
+    build_stack = [("FF", x, 13) for x in range(28)] + [("DF", x, 12) for x in range(2, 26, 3)]
+    print(name)
+    print("{:<10}{:>18}{:>18}".format("backend", "loads", "dumps"))
+    for codec in JSON_CODECS:
+        loads, dumps = codec.loads, codec.dumps
+        parse_ms = time_per_call(lambda: [loads(frame) for frame in frames], number=5)
+        dump_ms = time_per_call(lambda: dumps(build_stack), number=2000)
+        print("{:<10}{:>11.0f} fps{:>11.0f} /s".format(codec.name, len(frames) / parse_ms * 1000, 1000 / dump_ms))
+
+
+if __name__ == "__main__":
+    main()
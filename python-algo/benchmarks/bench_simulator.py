@@ -0,0 +1,79 @@
+"""
+Measures how many candidate deployments the simulator evaluates per second.
+
+Usage, from the python-algo folder:
+    python benchmarks/bench_simulator.py [REPLAY_FILE.replay ...]
+
+With replays, the board of the last turn of each replay is used. Without, a late game board is made up
+from game-configs.json. The candidates are a stack of each mobile unit type on every free tile of
+your edges, against a few enemy scouts.
+
+For each board it reports, in scenarios per second:
+    run         a new Simulator for every candidate, as a strategy calling it once would
+    shared      one Simulator, calling run for every candidate
+    batch       one Simulator, run_batch over every candidate
+
+Each measure starts from a new Simulator, so the path cache starts empty. run_batch finds the paths
+missing in a frame for every candidate at once, with one pathfinder call per board instead of one
+per candidate, so batch should be a little ahead of shared, by how much depending on how often the
+candidates destroy structures.
+"""
+
+import sys
+import time
+
+from common import load_config, load_replay, synthetic_turn, turn_frames
+
+import gamelib
+from gamelib.simulator import Simulator
+
+
+def sample_boards():
+    if len(sys.argv) > 1:
+        for path in sys.argv[1:]:
+            config, frames = load_replay(path)
+            turns = turn_frames(frames)
+            yield "{} (turn {})".format(path, len(turns) - 1), config, turns[-1]
+    else:
+        config = load_config()
+        yield "synthetic (60 structures per player)", config, synthetic_turn(config, 40, 60)
+
+
+def candidates(game_state):
+    edges = game_state.game_map.get_edges()
+    locations = [location for location in edges[game_state.game_map.BOTTOM_LEFT] + edges[game_state.game_map.BOTTOM_RIGHT]
+                 if not game_state.contains_stationary_unit(location)]
+    return [[(unit_type, x, y)] * count for x, y in locations
+            for unit_type, count in [(game_state.SCOUT, 8), (game_state.DEMOLISHER, 3), (game_state.INTERCEPTOR, 2)]]
+
+
+def scenarios_per_second(function, count, repeat=3):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return count / best
+
+
+def run_shared(game_state, deployments, enemy):
+    simulator = Simulator(game_state)
+    return [simulator.run(spawns, enemy) for spawns in deployments]
+
+
+def main():
+    print("{:<50}{:>10}{:>12}{:>12}{:>12}".format("board", "scenarios", "run", "shared", "batch"))
+    for name, config, turn in sample_boards():
+        game_state = gamelib.GameState(config, turn)
+        game_state.suppress_warnings(True)
+        deployments = candidates(game_state)
+        enemy = [(game_state.SCOUT, 13, 27)] * 3
+        single = scenarios_per_second(lambda: [Simulator(game_state).run(spawns, enemy) for spawns in deployments], len(deployments))
+        shared = scenarios_per_second(lambda: run_shared(game_state, deployments, enemy), len(deployments))
+        batch = scenarios_per_second(lambda: Simulator(game_state).run_batch(deployments, enemy), len(deployments))
+        print("{:<50}{:>10}{:>10.0f}/s{:>10.0f}/s{:>10.0f}/s".format(name, len(deployments), single, shared, batch))
+
+
+if __name__ == "__main__":
+    main()
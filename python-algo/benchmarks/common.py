@@ -0,0 +1,89 @@
+"""
+Helpers shared by the benchmarks: loading replays and making up game states when no replay is given.
+
+Replays are the .replay files the engine writes, one json object per line. The line holding the
+config has a "debug" key, every other line is a frame whose turnInfo is [phase, turn, frame].
+"""
+
+import json
+import os
+import random
+import sys
+import timeit
+
+ALGO_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_CONFIG = os.path.join(os.path.dirname(ALGO_DIRECTORY), "game-configs.json")
+sys.path.insert(0, ALGO_DIRECTORY)
+
+
+def load_replay(path):
+    """Reads a replay file
+
+    Returns:
+        The config as a dict, and the frame lines as strings in file order
+    """
+    config = None
+    frames = []
+    with open(path) as replay:
+        for line in replay:
+            line = line.strip()
+            if not line:
+                continue
+            if config is None and '"debug"' in line:
+                config = json.loads(line)
+            else:
+                frames.append(line)
+    return config, frames
+
+
+def turn_frames(frames):
+    """Keeps the frames sent to algos at the start of each turn, the deploy phase frames
+    """
+    return [frame for frame in frames if json.loads(frame)["turnInfo"][0] == 0]
+
+
+def load_config(path=DEFAULT_CONFIG):
+    with open(path) as config_file:
+        return json.load(config_file)
+
+
+def synthetic_turn(config, turn_number, structure_count, mobile_count=0, seed=0):
+    """Makes up a turn state with structures spread over both halves of the board
+
+    Args:
+        config: The game config, used for the unit shorthands
+        turn_number: The turn number to report
+        structure_count: The number of structures per player
+        mobile_count: The number of mobile units per player
+        seed: Seed for the placement
+
+    Returns:
+        The state as a json string, in the engine's format
+    """
+    rng = random.Random(seed)
+    arena = [(x, y) for y in range(28) for x in range(28) if (y < 14 and 13 - y <= x <= 14 + y) or (y >= 14 and y - 14 <= x <= 41 - y)]
+    state = {"turnInfo": [0, turn_number, -1], "p1Stats": [30.0, 40.0, 10.0, 1200], "p2Stats": [25.0, 38.0, 12.0, 1500],
+             "events": {key: [] for key in ["selfDestruct", "breach", "damage", "shield", "move", "spawn", "death", "attack", "melee"]}}
+    unit_id = 0
+    for player, key in enumerate(["p1Units", "p2Units"]):
+        half = [location for location in arena if (location[1] < 14) == (player == 0)]
+        rng.shuffle(half)
+        units = [[] for _ in range(8)]
+        for x, y in half[:structure_count]:
+            type_index = rng.choice([0, 0, 0, 1, 2, 2])
+            units[type_index].append([x, y, float(config["unitInformation"][type_index].get("startHealth", 1)), str(unit_id)])
+            if rng.random() < 0.3:
+                units[7].append([x, y, 0.0, str(unit_id)])
+            unit_id += 1
+        for x, y in half[structure_count:structure_count + mobile_count]:
+            type_index = rng.choice([3, 4, 5])
+            units[type_index].append([x, y, float(config["unitInformation"][type_index].get("startHealth", 1)), str(unit_id)])
+            unit_id += 1
+        state[key] = units
+    return json.dumps(state)
+
+
+def time_per_call(function, repeat=5, number=200):
+    """Best time of one call to function, in milliseconds
+    """
+    return min(timeit.repeat(function, repeat=repeat, number=number)) / number * 1000
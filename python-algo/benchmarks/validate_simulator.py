@@ -0,0 +1,205 @@
+"""
+Compares gamelib.simulator against the engine, using the action phases recorded in replays.
+
+Usage, from the python-algo folder:
+    python benchmarks/validate_simulator.py [-j JOBS] [-v] REPLAY_FILE_OR_FOLDER [...]
+
+For every turn of every replay, the board is read from the first action frame, keeping only the
+structures, and the mobile units come from the spawn events of the action phase. The simulator then
+steps through the action phase, and after each frame its mobile units are compared by id with the
+units recorded in the replay's frame of the same number:
+
+    moved       units the simulator has on a different tile than the engine
+    health      total absolute health difference of units alive in both
+    missing     units alive in the engine but gone in the simulation
+    extra       units gone in the engine but alive in the simulation
+    breaches    difference in the number of breaches scored so far, per player
+
+Replays are processed in parallel, one per worker. For each replay it prints the turns that diverge,
+with their first diverging frame, or every diverging frame with -v. A summary then gives the share
+of unit frames the simulator got exactly right, the turns whose breaches matched, and the speed
+of the simulation.
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from common import load_replay
+
+import gamelib
+from gamelib.simulator import Simulator
+from gamelib.util import json_loads
+
+MOBILE_TYPES = (3, 4, 5)
+
+
+def action_phases(frames):
+    """Groups the decoded action frames of a replay by turn, in frame order
+    """
+    phases = {}
+    for frame in frames:
+        turn_type, turn_number, _ = frame["turnInfo"]
+        if turn_type == 1:
+            phases.setdefault(turn_number, []).append(frame)
+    return [phases[turn_number] for turn_number in sorted(phases)]
+
+
+def board_state(config, frame):
+    """Builds a GameState holding the structures of an action frame, without its mobile units
+    """
+    state = dict(frame)
+    for key in ["p1Units", "p2Units"]:
+        state[key] = [[] if type_index in MOBILE_TYPES else units for type_index, units in enumerate(frame[key])]
+    game_state = gamelib.GameState(config, state)
+    game_state.suppress_warnings(True)
+    return game_state
+
+
+def recorded_units(frame):
+    """Maps the id of each mobile unit in a frame to its (x, y, health)
+    """
+    units = {}
+    for key in ["p1Units", "p2Units"]:
+        for type_index in MOBILE_TYPES:
+            for x, y, health, unit_id in frame[key][type_index]:
+                units[unit_id] = (int(x), int(y), float(health))
+    return units
+
+
+class FrameDivergence:
+    """How the simulation differs from the engine after one frame
+    """
+    def __init__(self, frame, units):
+        self.frame = frame
+        self.units = units
+        self.moved = 0
+        self.health = 0
+        self.missing = 0
+        self.extra = 0
+        self.breaches = [0, 0]
+
+    def diverged(self):
+        return self.moved or self.missing or self.extra or self.health > 1e-6 or self.breaches != [0, 0]
+
+    def __str__(self):
+        return "frame {:>3}: {} moved, {:.1f} health, {} missing, {} extra, breaches off by {}".format(
+            self.frame, self.moved, self.health, self.missing, self.extra, self.breaches)
+
+
+def validate_turn(config, phase):
+    """Simulates one action phase and compares it frame by frame with the recorded one
+
+    Returns:
+        The list of FrameDivergence of every frame, and the seconds spent simulating
+    """
+    game_state = board_state(config, phase[0])
+    spawns = [[], []]
+    # Maps the id of each recorded unit to its player and position in that player's spawns
+    spawn_keys = {}
+    for frame in phase:
+        for location, type_index, unit_id, player_number in frame["events"]["spawn"]:
+            if type_index in MOBILE_TYPES:
+                player_spawns = spawns[player_number - 1]
+                spawn_keys[unit_id] = (player_number - 1, len(player_spawns))
+                player_spawns.append((config["unitInformation"][type_index]["shorthand"], int(location[0]), int(location[1])))
+
+    started = time.perf_counter()
+    simulator = Simulator(game_state)
+    scenario = simulator.start(spawns[0], spawns[1])
+    elapsed = time.perf_counter() - started
+
+    recorded_breaches = [0, 0]
+    divergences = []
+    for frame in phase[1:]:
+        started = time.perf_counter()
+        simulator.step(scenario)
+        elapsed += time.perf_counter() - started
+        for breach in frame["events"]["breach"]:
+            recorded_breaches[breach[4] - 1] += 1
+
+        recorded = recorded_units(frame)
+        simulated = scenario.mobile_units()
+        divergence = FrameDivergence(frame["turnInfo"][2], len(recorded))
+        for unit_id, (x, y, health) in recorded.items():
+            unit = simulated.pop(spawn_keys.get(unit_id), None)
+            if unit is None:
+                divergence.missing += 1
+                continue
+            divergence.moved += unit[:2] != (x, y)
+            divergence.health += abs(unit[2] - health)
+        # Whatever was not matched with a recorded unit is gone in the engine
+        divergence.extra = len(simulated)
+        divergence.units += divergence.extra
+        divergence.breaches = [len(scenario.result.breaches[player]) - recorded_breaches[player] for player in range(2)]
+        divergences.append(divergence)
+    return divergences, elapsed
+
+
+def validate_replay(path):
+    """Validates every turn of a replay
+
+    Returns:
+        The path, and for each turn its number, its FrameDivergences and the seconds spent simulating
+    """
+    config, lines = load_replay(path)
+    turns = []
+    for phase in action_phases([json_loads(line) for line in lines]):
+        divergences, elapsed = validate_turn(config, phase)
+        turns.append((phase[0]["turnInfo"][1], divergences, elapsed))
+    return path, turns
+
+
+def replay_paths(arguments):
+    paths = []
+    for argument in arguments:
+        if os.path.isdir(argument):
+            paths.extend(sorted(os.path.join(argument, name) for name in os.listdir(argument) if name.endswith(".replay")))
+        else:
+            paths.append(argument)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compares gamelib.simulator with the action phases recorded in replays")
+    parser.add_argument("replays", nargs="+", help="Replay files, or folders of replay files")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="Number of replays processed at once")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Print every diverging frame instead of the first one of each turn")
+    args = parser.parse_args()
+
+    paths = replay_paths(args.replays)
+    if not paths:
+        sys.exit("No replay found in {}".format(args.replays))
+
+    unit_frames = exact_unit_frames = frames = turns = breach_turns = 0
+    simulated_seconds = 0
+    started = time.perf_counter()
+    with ProcessPoolExecutor(args.jobs) as executor:
+        for path, replay_turns in executor.map(validate_replay, paths):
+            print(path)
+            for turn_number, divergences, elapsed in replay_turns:
+                turns += 1
+                frames += len(divergences)
+                simulated_seconds += elapsed
+                for divergence in divergences:
+                    unit_frames += divergence.units
+                    exact_unit_frames += divergence.units - divergence.moved - divergence.missing - divergence.extra
+                if not divergences or divergences[-1].breaches == [0, 0]:
+                    breach_turns += 1
+                diverged = [divergence for divergence in divergences if divergence.diverged()]
+                for divergence in diverged if args.verbose else diverged[:1]:
+                    print("    turn {:>3} {}".format(turn_number, divergence))
+    wall_seconds = time.perf_counter() - started
+
+    print()
+    print("{} replays, {} turns, {} frames".format(len(paths), turns, frames))
+    print("units on the right tile and alive: {:.1%} of {} unit frames".format(exact_unit_frames / unit_frames if unit_frames else 1, unit_frames))
+    print("turns with the right breaches:     {:.1%}".format(breach_turns / turns if turns else 1))
+    print("simulation speed:                  {:.0f} frames/s in each worker, {:.1f}s wall time with {} workers".format(
+        frames / simulated_seconds if simulated_seconds else 0, wall_seconds, args.jobs))
+
+
+if __name__ == "__main__":
+    main()
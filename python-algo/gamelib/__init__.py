@@ -16,14 +16,37 @@ Investigating it is useful for advanced players interested in getting data from
 The Navigation class in navigation.py contains functions related to pathfinding, which are used by GameState in pathing related functions. 
 Investigating it is useful for advanced player who want to optimize the slow default pathing algorithm we provide. \n 
 
-util.py contains a small handful of functions that help with communication, including the debug-printing function, debug_write().
+background.py runs a planning function in a worker thread during the action phase, so the next turn can start from a finished plan. \n
+
+bitboard.py represents sets of tiles as python ints, with precomputed masks for the arena, its edges and ranges.
+Investigating it is useful for players who want to count or compare structures without looping over the game map. \n
+
+fields.py computes per tile values for the whole board at once, such as the damage turrets deal or the shield supports give on each tile.
+Investigating it is useful for players who score many paths or placements per turn. \n
+
+scenario_pool.py keeps worker processes alive for the whole game and simulates candidate deployments on several cores. \n
+
+scheduler.py runs planning stages with their own time budgets, and submits the best plan found before the turn's soft time limit. \n
+
+rules.py holds the constants of a game config, such as the unit shorthands, shared by every GameState built with that config. \n
+
+simulator.py plays out deployments against the structures of a GameState frame by frame, and reports breaches, damage and destroyed structures. \n
+
+unit_table.py stores the units parsed from a game state column by column, GameUnits are only created when game_map[x, y] is read. \n
+
+util.py contains a small handful of functions that help with communication, including the debug-printing function, debug_write(),
+and json_loads() and json_dumps(), which use the fastest json library installed.
 """
 
 from .algocore import AlgoCore
-from .util import debug_write
+from .util import debug_write, json_loads, json_dumps
 from .game_state import GameState
 from .unit import GameUnit
 from .game_map import GameMap
+from .background import BackgroundPlanner
+from .scheduler import TurnScheduler
+from .simulator import Simulator
+from .scenario_pool import ScenarioPool
 
-__all__ = ["algocore", "game_state", "game_map", "navigation", "unit", "util"]
+__all__ = ["algocore", "background", "bitboard", "fields", "game_state", "game_map", "navigation", "rules", "scenario_pool", "scheduler", "simulator", "unit", "unit_table", "util"]
  
\ No newline at end of file
@@ -1,7 +1,10 @@
-import json
+import time
 
 from .game_state import GameState
-from .util import get_command, debug_write, BANNER_TEXT, send_command
+from .util import get_command, debug_write, BANNER_TEXT, send_command, json_loads, extract_json_value, find_json_value
+
+# Keys of the events object in an action frame
+EVENT_KINDS = ("selfDestruct", "breach", "damage", "shield", "move", "spawn", "death", "attack", "melee")
 
 class AlgoCore(object):
     """
@@ -10,16 +13,29 @@ class AlgoCore(object):
 
     Attributes :
         * config (JSON): json object containing information about the game
+        * decode_messages (bool): If True, on_turn and on_action_frame are passed the message already decoded
+          as a dict instead of the json string. GameState accepts either. False by default so that
+          overrides expecting a string keep working.
+        * background_planner (:obj: BackgroundPlanner): If set, fed every action frame while it is planning, see background.py
+        * scenario_pool (:obj: ScenarioPool): If set, its worker processes are stopped when the game ends, see scenario_pool.py
+        * turn_started (float): The time.perf_counter() value when the current turn's state was received, see TurnScheduler.run
 
     """
     def __init__(self):
         self.config = None
+        self.decode_messages = False
+        self.background_planner = None
+        self.scenario_pool = None
+        self.turn_started = None
+        self._frame_events = None
+        self._frame_fields = ()
 
     def on_game_start(self, config):
         """
         This function is called once at the start of the game. 
         By default, it just initializes the config. \n
         You can override it it in algo_strategy.py to perform start of game setup
+        such as starting a ScenarioPool.
         """
         self.config = config
 
@@ -43,6 +59,49 @@ class AlgoCore(object):
         """
         pass
 
+    def set_action_frame_filter(self, events=None, fields=()):
+        """
+        Only decode the parts of action frames this algo reads. \n
+        Once a filter is set, on_action_frame is passed a dict holding "turnInfo", the requested fields,
+        and an "events" dict with only the requested event kinds, whatever decode_messages is set to.
+        Frames where every requested event kind is empty are skipped, unless fields are requested.
+        For example, set_action_frame_filter(events=["breach"]) calls on_action_frame only for frames with a breach.
+
+        Args:
+            events: Event kinds to keep, from EVENT_KINDS. None removes the filter and passes whole frames again.
+            fields: Top level keys of the frame to keep, such as "p1Units" or "p2Stats"
+
+        """
+        if events is None:
+            self._frame_events = None
+            self._frame_fields = ()
+            return
+        for kind in events:
+            if kind not in EVENT_KINDS:
+                raise ValueError("Unknown event kind {}, expected one of {}".format(kind, EVENT_KINDS))
+        self._frame_events = tuple(events)
+        self._frame_fields = tuple(fields)
+
+    def _filter_action_frame(self, message, turn_info):
+        """
+        Decodes the parts of an action frame requested with set_action_frame_filter, or returns None if the frame can be skipped.
+        """
+        events = {}
+        found = False
+        for kind in self._frame_events:
+            # Empty lists are spotted without decoding anything
+            start = find_json_value(message, kind)
+            if start == -1 or message.startswith("[]", start):
+                events[kind] = []
+            else:
+                events[kind] = extract_json_value(message, kind)
+                found = True
+        if not found and not self._frame_fields:
+            return None
+        frame = {"turnInfo": turn_info, "events": events}
+        for field in self._frame_fields:
+            frame[field] = extract_json_value(message, field)
+        return frame
 
     def start(self):
         """ 
@@ -53,6 +112,9 @@ class AlgoCore(object):
         """
         debug_write(BANNER_TEXT)
 
+        # Action frames are the most frequent message, skip decoding them if nothing reads them
+        handles_action_frames = type(self).on_action_frame is not AlgoCore.on_action_frame
+
         while True:
             # Note: Python blocks and hangs on stdin. Can cause issues if connections aren't setup properly and may need to
             # manually kill this Python program.
@@ -61,35 +123,66 @@ class AlgoCore(object):
                 """
                 This means this must be the config file. So, load in the config file as a json and add it to your AlgoStrategy class.
                 """
-                parsed_config = json.loads(game_state_string)
+                parsed_config = json_loads(game_state_string)
                 self.on_game_start(parsed_config)
-            elif "turnInfo" in game_state_string:
-                state = json.loads(game_state_string)
-                stateType = int(state.get("turnInfo")[0])
-                if stateType == 0:
-                    """
-                    This is the game turn game state message. Algo must now print to stdout 2 lines, one for build phase one for
-                    deploy phase. Printing is handled by the provided functions.
-                    """
-                    self.on_turn(game_state_string)
-                elif stateType == 1:
-                    """
-                    If stateType == 1, this game_state_string string represents a single frame of an action phase
-                    """
-                    self.on_action_frame(game_state_string)
-                elif stateType == 2:
-                    """
-                    This is the end game message. This means the game is over so break and finish the program.
-                    """
-                    debug_write("Got end state, game over. Stopping algo.")
-                    break
+                continue
+
+            # Only the turnInfo array is decoded to find the kind of message, the rest is decoded once at most
+            turn_info = extract_json_value(game_state_string, "turnInfo")
+            decoded = None
+            if turn_info is None:
+                # The fast scan missed it, decode the whole message before giving up on it
+                try:
+                    decoded = json_loads(game_state_string)
+                except ValueError:
+                    decoded = None
+                if isinstance(decoded, dict):
+                    turn_info = decoded.get("turnInfo")
+            if turn_info is None:
+                """
+                Something is wrong? Received an incorrect or improperly formatted string.
+                """
+                debug_write("Got unexpected string : {}".format(game_state_string))
+                continue
+
+            stateType = int(turn_info[0])
+            if stateType == 0:
+                """
+                This is the game turn game state message. Algo must now print to stdout 2 lines, one for build phase one for
+                deploy phase. Printing is handled by the provided functions.
+                """
+                self.turn_started = time.perf_counter()
+                if self.decode_messages and decoded is None:
+                    decoded = json_loads(game_state_string)
+                self.on_turn(decoded if self.decode_messages else game_state_string)
+            elif stateType == 1:
+                """
+                If stateType == 1, this game_state_string string represents a single frame of an action phase
+                """
+                if self.background_planner is not None and self.background_planner.running():
+                    self.background_planner.feed(game_state_string)
+                if not handles_action_frames:
+                    continue
+                if self._frame_events is not None:
+                    frame = self._filter_action_frame(game_state_string, turn_info)
+                    if frame is not None:
+                        self.on_action_frame(frame)
                 else:
-                    """
-                    Something is wrong? Received an incorrect or improperly formatted string.
-                    """
-                    debug_write("Got unexpected string with turnInfo: {}".format(game_state_string))
+                    if self.decode_messages and decoded is None:
+                        decoded = json_loads(game_state_string)
+                    self.on_action_frame(decoded if self.decode_messages else game_state_string)
+            elif stateType == 2:
+                """
+                This is the end game message. This means the game is over so break and finish the program.
+                """
+                debug_write("Got end state, game over. Stopping algo.")
+                if self.background_planner is not None:
+                    self.background_planner.cancel()
+                if self.scenario_pool is not None:
+                    self.scenario_pool.shutdown()
+                break
             else:
                 """
                 Something is wrong? Received an incorrect or improperly formatted string.
                 """
-                debug_write("Got unexpected string : {}".format(game_state_string))
+                debug_write("Got unexpected string with turnInfo: {}".format(game_state_string))
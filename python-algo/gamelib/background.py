@@ -0,0 +1,198 @@
+"""
+Planning for the next turn while the engine plays out the action phase.
+
+Between submitting a turn and receiving the next one, AlgoCore.start only reads action frames.
+A BackgroundPlanner runs a planning function in a worker thread during that time, starting from
+the state the algo expects at the end of the turn, so on_turn can pick up a finished plan instead
+of doing all its work inside the turn time limit:
+
+    def on_game_start(self, config):
+        self.config = config
+        self.background_planner = gamelib.BackgroundPlanner(self.plan_next_turn)
+
+    def on_turn(self, turn_state):
+        game_state = gamelib.GameState(self.config, turn_state)
+        plan = self.background_planner.result()
+        ...
+        game_state.submit_turn()
+        self.background_planner.start(game_state.fork())
+
+    def plan_next_turn(self, predicted_state, run):
+        # Check run.cancelled() regularly, read run.latest_frame() to follow the action phase
+        ...
+
+Each start begins a new PlanningRun, which is what the planning function is passed. A run keeps its
+own cancellation and frames, so a worker left over from an earlier start sees that it was cancelled
+and is never handed the frames of the new turn.
+
+The worker is a thread, so planning shares the interpreter with the frame reader. The reader spends
+almost all of its time blocked on stdin, which leaves the worker free to run.
+"""
+
+import threading
+import traceback
+
+from .util import debug_write
+
+
+class PlanningRun:
+    """One call of a planning function, started by BackgroundPlanner.start
+
+    Attributes :
+        * frames (int): The number of action frames fed to this run
+
+    """
+    def __init__(self):
+        self.frames = 0
+        self.__lock = threading.Lock()
+        self.__cancel = threading.Event()
+        self.__done = threading.Event()
+        self.__latest_frame = None
+        self.__plan = None
+
+    def cancelled(self):
+        """Checks if this run was cancelled. Planning functions should return as soon as this is True.
+        """
+        return self.__cancel.is_set()
+
+    def latest_frame(self):
+        """Gets the last action frame fed to this run, or None if there has been none
+        """
+        with self.__lock:
+            return self.__latest_frame
+
+    def done(self):
+        """Checks if the planning function returned
+        """
+        return self.__done.is_set()
+
+    def _feed(self, frame):
+        with self.__lock:
+            self.__latest_frame = frame
+            self.frames += 1
+
+    def _cancel(self):
+        with self.__lock:
+            self.__cancel.set()
+            self.__plan = None
+
+    def _finish(self, plan):
+        with self.__lock:
+            if not self.__cancel.is_set():
+                self.__plan = plan
+        self.__done.set()
+
+    def _wait(self, timeout):
+        return self.__done.wait(timeout)
+
+    def _take_plan(self):
+        with self.__lock:
+            plan = self.__plan
+            self.__plan = None
+            return plan
+
+
+class BackgroundPlanner:
+    """Runs a planning function in a worker thread, one turn at a time
+
+    Attributes :
+        * plan_function (function): Called as plan_function(game_state, run) in the worker thread, returns the plan
+        * run (:obj: PlanningRun): The run of the last start, or None before the first one
+
+    """
+    def __init__(self, plan_function):
+        """Creates an idle planner
+
+        Args:
+            plan_function: The function computing a plan. It is passed the predicted GameState and its PlanningRun,
+                and should return early when run.cancelled() is True.
+
+        """
+        self.plan_function = plan_function
+        self.run = None
+        self.__thread = None
+        self.__claimed = True
+
+    @property
+    def frames(self):
+        """The number of action frames fed since the last start
+        """
+        return self.run.frames if self.run is not None else 0
+
+    def start(self, game_state):
+        """Starts planning from a game state, cancelling any plan still running
+
+        Args:
+            game_state: The state expected at the end of this turn, usually the turn's GameState forked
+                after submit_turn. The worker owns it, do not modify it afterwards.
+
+        """
+        self.cancel()
+        run = PlanningRun()
+        self.run = run
+        self.__claimed = False
+        self.__thread = threading.Thread(target=self.__work, args=(game_state, run), daemon=True)
+        self.__thread.start()
+
+    def __work(self, game_state, run):
+        try:
+            plan = self.plan_function(game_state, run)
+        except Exception:
+            debug_write("Background planning failed:\n{}".format(traceback.format_exc()))
+            plan = None
+        run._finish(plan)
+
+    def feed(self, frame):
+        """Hands the current run the latest action frame. Called by AlgoCore for every action frame while planning.
+
+        Args:
+            frame: The action frame as received by AlgoCore, a json string
+
+        """
+        run = self.run
+        if run is not None:
+            run._feed(frame)
+
+    def latest_frame(self):
+        """Gets the last action frame fed to the current run, or None if there has been none since start
+        """
+        run = self.run
+        return run.latest_frame() if run is not None else None
+
+    def cancelled(self):
+        """Checks if the current run was cancelled
+        """
+        run = self.run
+        return run is not None and run.cancelled()
+
+    def running(self):
+        """Checks if the worker of the last start is still running, even if it was cancelled
+        """
+        return self.__thread is not None and self.__thread.is_alive()
+
+    def result(self, timeout=0):
+        """Gets the finished plan, waiting for the worker at most timeout seconds
+
+        If the worker is not done by then it is cancelled. Either way the plan is only returned once.
+
+        Args:
+            timeout: Seconds to wait for the worker to finish
+
+        Returns:
+            The plan returned by plan_function, or None if there is no finished plan
+        """
+        run = self.run
+        if run is None or self.__claimed:
+            return None
+        if not run._wait(timeout):
+            self.cancel()
+            return None
+        self.__claimed = True
+        return run._take_plan()
+
+    def cancel(self):
+        """Asks the current run to stop and drops its plan. Does not wait for the worker to return.
+        """
+        if self.run is not None:
+            self.run._cancel()
+        self.__claimed = True
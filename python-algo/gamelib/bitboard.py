@@ -0,0 +1,169 @@
+"""
+Bitboards for the diamond shaped arena.
+
+A bitboard is a python int with one bit per tile, bit x * ARENA_SIZE + y standing for location [x, y].
+This is the same layout as GameMap.get_blocked_mask. Sets of tiles can then be combined with & | ^ ~
+and counted with popcount instead of looping over the game map, for example:
+
+    planes = BoardPlanes(game_state)
+    enemy_turrets_in_range = planes.of_type(TURRET, 1) & planes.range_mask([13, 13], 3.5)
+    popcount(enemy_turrets_in_range)
+"""
+
+import functools
+
+from .game_map import ARENA_SIZE, HALF_ARENA, ARENA_LOCATION_LIST, locations_in_range
+
+
+def bit(location):
+    """Gets the bitboard of a single location
+    """
+    return 1 << (int(location[0]) * ARENA_SIZE + int(location[1]))
+
+
+def from_locations(locations):
+    """Gets the bitboard containing every location in locations
+    """
+    mask = 0
+    for x, y in locations:
+        mask |= 1 << (int(x) * ARENA_SIZE + int(y))
+    return mask
+
+
+def to_locations(mask):
+    """Gets the locations in a bitboard as a list of [x, y], ordered by x then y
+    """
+    locations = []
+    while mask:
+        lowest = mask & -mask
+        x, y = divmod(lowest.bit_length() - 1, ARENA_SIZE)
+        locations.append([x, y])
+        mask ^= lowest
+    return locations
+
+
+def popcount(mask):
+    """Counts the tiles in a bitboard
+    """
+    return bin(mask).count("1")
+
+
+def is_line_closed(blocked, line):
+    """Checks if every tile of line is blocked
+
+    Args:
+        blocked: A bitboard of blocked tiles, for example BoardPlanes.structures[1]
+        line: A bitboard of the tiles making up the line, for example ROWS[14]
+
+    Returns:
+        True if no tile of the line is open
+    """
+    return blocked & line == line
+
+
+def _build_masks():
+    arena = 0
+    rows = [0] * ARENA_SIZE
+    columns = [0] * ARENA_SIZE
+    for x, y in ARENA_LOCATION_LIST:
+        tile = 1 << (x * ARENA_SIZE + y)
+        arena |= tile
+        rows[y] |= tile
+        columns[x] |= tile
+    return arena, rows, columns
+
+ARENA, ROWS, COLUMNS = _build_masks()
+BOTTOM_HALF = 0
+for _row in ROWS[:HALF_ARENA]:
+    BOTTOM_HALF |= _row
+TOP_HALF = ARENA & ~BOTTOM_HALF
+
+# Same order as GameMap.get_edges, so EDGES[game_map.TOP_LEFT] is the top left edge
+EDGES = [
+    from_locations([HALF_ARENA + num, ARENA_SIZE - 1 - num] for num in range(HALF_ARENA)),
+    from_locations([HALF_ARENA - 1 - num, ARENA_SIZE - 1 - num] for num in range(HALF_ARENA)),
+    from_locations([HALF_ARENA - 1 - num, num] for num in range(HALF_ARENA)),
+    from_locations([HALF_ARENA + num, num] for num in range(HALF_ARENA)),
+]
+
+# Bounded like the caches of game_map, so callers passing computed radii cannot grow it without limit
+RANGE_MASK_CACHE_SIZE = 16384
+
+
+def range_mask(location, radius, get_hit_radius):
+    """Gets the bitboard of the tiles in range of a location
+
+    Built from game_map.locations_in_range, so it holds the same tiles as GameMap.get_locations_in_range.
+
+    Args:
+        location: The center of the disk
+        radius: The range, for example a unit's attackRange
+        get_hit_radius: The getHitRadius from the unit information in the config
+
+    Returns:
+        The bitboard of in bounds tiles within range
+    """
+    return _range_mask(int(location[0]), int(location[1]), radius, get_hit_radius)
+
+
+@functools.lru_cache(maxsize=RANGE_MASK_CACHE_SIZE)
+def _range_mask(x, y, radius, get_hit_radius):
+    return from_locations(locations_in_range(x, y, radius, get_hit_radius))
+
+
+class BoardPlanes:
+    """Bitboards of the units on the board of a GameState
+
+    Attributes :
+        * units ([int, int]): The tiles holding any unit, for player 0 and player 1
+        * structures ([int, int]): The tiles holding a structure, for player 0 and player 1
+        * upgraded ([int, int]): The tiles holding an upgraded structure, for player 0 and player 1
+        * pending_removal ([int, int]): The tiles holding a structure flagged for removal, for player 0 and player 1
+        * types (dict): Maps a unit type to the tiles holding that type, for player 0 and player 1
+
+    The planes are a snapshot, build a new BoardPlanes after changing the game map.
+
+    """
+    def __init__(self, game_state):
+        """Reads the planes from a GameState
+
+        Args:
+            game_state: The GameState to read units from
+
+        """
+        self.get_hit_radius = game_state.rules.get_hit_radius
+        self.units = [0, 0]
+        self.structures = [0, 0]
+        self.upgraded = [0, 0]
+        self.pending_removal = [0, 0]
+        self.types = {}
+        game_map = game_state.game_map
+        for x, y in ARENA_LOCATION_LIST:
+            tile = 1 << (x * ARENA_SIZE + y)
+            for unit in game_map._peek(x, y):
+                player_index = unit.player_index
+                self.units[player_index] |= tile
+                if unit.unit_type not in self.types:
+                    self.types[unit.unit_type] = [0, 0]
+                self.types[unit.unit_type][player_index] |= tile
+                if unit.stationary:
+                    self.structures[player_index] |= tile
+                    if unit.upgraded:
+                        self.upgraded[player_index] |= tile
+                    if unit.pending_removal:
+                        self.pending_removal[player_index] |= tile
+
+    def of_type(self, unit_type, player_index):
+        """Gets the tiles holding units of a given type for a player
+        """
+        return self.types.get(unit_type, [0, 0])[player_index]
+
+    def blocked(self):
+        """Gets the tiles holding a structure of either player
+        """
+        return self.structures[0] | self.structures[1]
+
+    def range_mask(self, location, radius):
+        """Gets the tiles in range of a location, using the getHitRadius of this game's config
+        """
+        return range_mask(location, radius, self.get_hit_radius)
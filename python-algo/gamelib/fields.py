@@ -0,0 +1,163 @@
+"""
+Per tile fields computed once for the whole board.
+
+A field is a flat list with one entry per tile, entry x * ARENA_SIZE + y standing for location [x, y],
+the same layout as GameMap.get_blocked_mask. Building a field walks the structures once and
+spreads their effect with the cached range stencils, so querying many tiles or paths afterwards
+costs a list lookup per tile instead of a scan of the game map.
+
+Fields are snapshots, use GameState.threat_map and GameState.shield_map to get ones that are rebuilt when the board changes.
+"""
+
+from .game_map import ARENA_SIZE, ARENA_LOCATION_LIST, locations_in_range
+
+
+class ThreatMap:
+    """Damage per frame the structures of one player deal to the mobile units of the other
+
+    Every structure that can attack mobile units adds its damage to each tile in its attack range,
+    upgrades included. A turret only attacks one target per frame, so this is the damage a lone unit
+    standing on a tile would take, an upper bound when several units walk together.
+
+    Attributes :
+        * player_index (int): The player whose mobile units are threatened, 0 for you 1 for the enemy
+        * damage (list): Damage per frame on each tile, indexed x * ARENA_SIZE + y
+        * attackers (list): Number of structures attacking each tile, indexed x * ARENA_SIZE + y
+
+    """
+    def __init__(self, game_state, player_index):
+        """Builds the threat map from the structures on a GameState's map
+
+        Args:
+            game_state: The GameState to read structures from
+            player_index: The index corresponding to the defending player, 0 for you 1 for the enemy
+
+        """
+        self.player_index = player_index
+        self.rules = game_state.rules
+        self.damage = [0] * (ARENA_SIZE * ARENA_SIZE)
+        self.attackers = [0] * (ARENA_SIZE * ARENA_SIZE)
+        self.__speeds = {}
+        get_hit_radius = game_state.rules.get_hit_radius
+        game_map = game_state.game_map
+        for x, y in ARENA_LOCATION_LIST:
+            for unit in game_map._peek(x, y):
+                if not unit.stationary or unit.player_index == player_index or unit.damage_i <= 0:
+                    continue
+                for i, j in locations_in_range(x, y, unit.attackRange, get_hit_radius):
+                    self.damage[i * ARENA_SIZE + j] += unit.damage_i
+                    self.attackers[i * ARENA_SIZE + j] += 1
+
+    def damage_at(self, location):
+        """Gets the damage per frame a mobile unit at a location would take
+        """
+        return self.damage[int(location[0]) * ARENA_SIZE + int(location[1])]
+
+    def attackers_at(self, location):
+        """Gets the number of structures that can attack a mobile unit at a location
+        """
+        return self.attackers[int(location[0]) * ARENA_SIZE + int(location[1])]
+
+    def path_damage(self, path, unit_type=None):
+        """Estimates the damage a unit walking along a path would take
+
+        A unit moves once every 1/speed frames, so it is attacked that many times on each tile of its path.
+
+        Args:
+            path: A list of locations, such as the one returned by find_path_to_edge
+            unit_type: The type of the walking unit. If None, the unit spends one frame per tile.
+
+        Returns:
+            The total damage taken over the path
+        """
+        frames_per_tile = 1
+        if unit_type is not None:
+            frames_per_tile = self.__speeds.get(unit_type)
+            if frames_per_tile is None:
+                speed = self.rules.unit_definitions[unit_type].speed
+                frames_per_tile = 1 / speed if speed > 0 else 1
+                self.__speeds[unit_type] = frames_per_tile
+        damage = self.damage
+        return sum(damage[int(x) * ARENA_SIZE + int(y)] for x, y in path) * frames_per_tile
+
+
+class ShieldMap:
+    """Shield the supports of one player give to that player's mobile units
+
+    A support shields each friendly mobile unit once, the first time the unit comes within its shield range.
+    The amount is shieldPerUnit plus shieldBonusPerY for every row the support stands away from its owner's edge,
+    upgrades included.
+
+    Attributes :
+        * player_index (int): The player owning the supports and the shielded units, 0 for you 1 for the enemy
+        * supports (list): The supporting GameUnits, in game map iteration order
+        * amounts (list): The shield each support gives, in the same order as supports
+        * shield (list): Total shield of the supports covering each tile, indexed x * ARENA_SIZE + y
+        * coverage (list): For each tile, an int with bit i set if supports[i] covers the tile, indexed x * ARENA_SIZE + y
+
+    """
+    def __init__(self, game_state, player_index):
+        """Builds the shield map from the structures on a GameState's map
+
+        Args:
+            game_state: The GameState to read structures from
+            player_index: The index corresponding to the shielded player, 0 for you 1 for the enemy
+
+        """
+        self.player_index = player_index
+        self.supports = []
+        self.amounts = []
+        self.shield = [0] * (ARENA_SIZE * ARENA_SIZE)
+        self.coverage = [0] * (ARENA_SIZE * ARENA_SIZE)
+        get_hit_radius = game_state.rules.get_hit_radius
+        game_map = game_state.game_map
+        for x, y in ARENA_LOCATION_LIST:
+            for unit in game_map._peek(x, y):
+                if not unit.stationary or unit.player_index != player_index or unit.shieldPerUnit + unit.shieldBonusPerY <= 0:
+                    continue
+                rows_from_edge = y if player_index == 0 else ARENA_SIZE - 1 - y
+                amount = unit.shieldPerUnit + unit.shieldBonusPerY * rows_from_edge
+                support_bit = 1 << len(self.supports)
+                self.supports.append(unit)
+                self.amounts.append(amount)
+                for i, j in locations_in_range(x, y, unit.shieldRange, get_hit_radius):
+                    self.shield[i * ARENA_SIZE + j] += amount
+                    self.coverage[i * ARENA_SIZE + j] |= support_bit
+
+    def shield_at(self, location):
+        """Gets the total shield of the supports covering a location
+        """
+        return self.shield[int(location[0]) * ARENA_SIZE + int(location[1])]
+
+    def supports_covering(self, locations):
+        """Gets the supports covering any of the given locations, each support once
+
+        Args:
+            locations: A list of locations, such as a path
+
+        Returns:
+            A list of GameUnits, in the same order as supports
+        """
+        covered = self.__covered(locations)
+        return [support for index, support in enumerate(self.supports) if covered >> index & 1]
+
+    def path_shield(self, path):
+        """Gets the total shield a mobile unit gains walking along a path
+
+        Each support covering the path is counted once, no matter how many tiles of the path it covers.
+
+        Args:
+            path: A list of locations, such as the one returned by find_path_to_edge
+
+        Returns:
+            The total shield gained over the path
+        """
+        covered = self.__covered(path)
+        return sum(amount for index, amount in enumerate(self.amounts) if covered >> index & 1)
+
+    def __covered(self, locations):
+        coverage = self.coverage
+        covered = 0
+        for x, y in locations:
+            covered |= coverage[int(x) * ARENA_SIZE + int(y)]
+        return covered
@@ -1,7 +1,97 @@
+import copy
+import functools
 import math
 from .unit import GameUnit
 from .util import debug_write
 
+ARENA_SIZE = 28
+HALF_ARENA = ARENA_SIZE // 2
+
+
+def _build_bounds_table():
+    """Computes which tiles are inside the diamond shaped board, once per process
+
+    Returns:
+        A 28x28 list of booleans indexed [x][y], and the in bounds locations as (x, y) tuples in iteration order
+    """
+    table = [[False] * ARENA_SIZE for _ in range(ARENA_SIZE)]
+    locations = []
+    for y in range(ARENA_SIZE):
+        if y < HALF_ARENA:
+            startx = HALF_ARENA - y - 1
+        else:
+            startx = y - HALF_ARENA
+        for x in range(startx, ARENA_SIZE - startx):
+            table[x][y] = True
+            locations.append((x, y))
+    return table, locations
+
+# IN_ARENA_BOUNDS[x][y] is True for tiles on the board, ARENA_LOCATIONS holds the same tiles as (x, y) tuples
+IN_ARENA_BOUNDS, ARENA_LOCATION_LIST = _build_bounds_table()
+ARENA_LOCATIONS = frozenset(ARENA_LOCATION_LIST)
+
+# Ownership of each location's unit list, see GameMap.fork
+_SHARED = 0
+_PRIVATE = 1
+_HANDED_OUT = 2
+# Applied to the parent's ownership when forking, locations nobody holds become shared
+_FORK_OWNERSHIP = bytes([_SHARED, _SHARED, _HANDED_OUT]) + bytes(253)
+
+# Range lookups are cached per process. Keys include the radius and getHitRadius, so games with different configs
+# never share entries. The caches are bounded, so callers passing computed radii cannot grow them without limit.
+# The sizes fit every tile of the arena with the ranges of a few configs.
+RANGE_OFFSETS_CACHE_SIZE = 256
+LOCATIONS_IN_RANGE_CACHE_SIZE = 16384
+
+
+@functools.lru_cache(maxsize=RANGE_OFFSETS_CACHE_SIZE)
+def range_offsets(radius, get_hit_radius):
+    """Gets the (dx, dy) offsets of the tiles within range of a tile, ordered by dx then dy
+
+    A unit with a given range affects all locations who's centers are within that range + get hit radius.
+
+    Args:
+        radius: The radius of the search area
+        get_hit_radius: The getHitRadius from the unit information in the config
+
+    Returns:
+        A tuple of (dx, dy) offsets, which may fall outside the arena for tiles near the edges
+    """
+    search_radius = math.ceil(radius)
+    return tuple((dx, dy) for dx in range(-search_radius, search_radius + 1) for dy in range(-search_radius, search_radius + 1)
+                 if math.sqrt(dx ** 2 + dy ** 2) < radius + get_hit_radius)
+
+
+@functools.lru_cache(maxsize=LOCATIONS_IN_RANGE_CACHE_SIZE)
+def locations_in_range(x, y, radius, get_hit_radius):
+    """Gets the in bounds locations within range of an in bounds tile, as a cached tuple of (x, y) tuples
+
+    This is the shared, read only version of GameMap.get_locations_in_range, for code that queries many tiles per turn.
+
+    Args:
+        x: The x coordinate of the center, an int
+        y: The y coordinate of the center, an int
+        radius: The radius of the search area
+        get_hit_radius: The getHitRadius from the unit information in the config
+
+    Returns:
+        A tuple of (x, y) tuples, in the same order as GameMap.get_locations_in_range
+    """
+    return tuple((x + dx, y + dy) for dx, dy in range_offsets(radius, get_hit_radius) if (x + dx, y + dy) in ARENA_LOCATIONS)
+
+
+def config_ranges(config):
+    """Gets every distinct attack, shield and self destruct range in a config, including upgraded values
+    """
+    ranges = set()
+    for unit_information in config["unitInformation"]:
+        for values in [unit_information, unit_information.get("upgrade", {})]:
+            for key in ["attackRange", "shieldRange", "selfDestructRange"]:
+                if key in values:
+                    ranges.add(values[key])
+    return sorted(ranges)
+
+
 class GameMap:
     """Holds data about the current game map and provides functions
     useful for getting information related to the map.
@@ -9,9 +99,17 @@ class GameMap:
     game_map[x, y] will return a list of Units located at that location, 
     or an empty list if there are no units at the location
 
+    When built from a UnitTable, the GameUnits of a location are only created
+    the first time that location is accessed
+
+    Maps returned by fork() share the locations neither map has handed out yet, and
+    a map copies a shared location's units the first time it accesses them. Units and
+    lists the parent handed out before the fork stay the parent's, the fork gets copies
+
     Attributes :
         * config (JSON): Contains information about the current game rules
         * enable_warnings (bool): If true, debug messages for game_map functions will print out
+        * revision (int): Incremented every time units are added, removed or assigned to a location
         * ARENA_SIZE (int): The size of the arena.
         * HALF_ARENA (int): Half of the size of the arena.
         * TOP_RIGHT (int): A constant that represents the top right edge
@@ -20,52 +118,125 @@ class GameMap:
         * BOTTOM_RIGHT (int): A constant that represents the bottom right edge
 
     """
-    def __init__(self, config):
+    def __init__(self, config, unit_table=None, rules=None):
         """Initializes constants and game map
 
         Args:
             config (JSON): Contains information about the game
+            unit_table (:obj: UnitTable): The parsed units to fill the map with. The map starts empty if None.
+            rules (:obj: GameRules): The constants of config, which already hold its ranges. Read from config if None.
 
         """
         self.config = config
         self.enable_warnings = True
-        self.ARENA_SIZE = 28
-        self.HALF_ARENA = int(self.ARENA_SIZE / 2)
+        self.ARENA_SIZE = ARENA_SIZE
+        self.HALF_ARENA = HALF_ARENA
         self.TOP_RIGHT = 0
         self.TOP_LEFT = 1
         self.BOTTOM_LEFT = 2
         self.BOTTOM_RIGHT = 3
         self.__map = self.__empty_grid()
-        self.__start = [13,0]
+        self.__unit_table = unit_table
+        if unit_table is not None:
+            # None marks a location whose units are still only in the table
+            for tile in unit_table.occupied_tiles():
+                x, y = divmod(tile, self.ARENA_SIZE)
+                self.__map[x][y] = None
+        # Per location, whether the list is shared with a fork, private, or private and handed out to callers
+        self.__owned = bytearray([_PRIVATE]) * (ARENA_SIZE * ARENA_SIZE)
+        self.__start = 0
+        self.__blocked_mask = None
+        self.revision = 0
+        if rules is not None:
+            self.__get_hit_radius = rules.get_hit_radius
+        else:
+            self.__get_hit_radius = self.config["unitInformation"][0].get("getHitRadius", 0)
+            for radius in config_ranges(self.config):
+                range_offsets(radius, self.__get_hit_radius)
     
     def __getitem__(self, location):
-        if len(location) == 2 and self.in_arena_bounds(location):
-            x,y = location
-            return self.__map[x][y]
+        if len(location) == 2 and (location[0], location[1]) in ARENA_LOCATIONS:
+            return self.get_unchecked(location[0], location[1])
         self._invalid_coordinates(location)
 
     def __setitem__(self, location, val):
-        if type(location) == tuple and len(location) == 2 and self.in_arena_bounds(location):
+        if type(location) == tuple and len(location) == 2 and location in ARENA_LOCATIONS:
             self.__map[location[0]][location[1]] = val
+            self.__owned[location[0] * ARENA_SIZE + location[1]] = _HANDED_OUT
+            self.__blocked_mask = None
+            self.revision += 1
             return
         self._invalid_coordinates(location)
 
+    def get_unchecked(self, x, y):
+        """Fast version of game_map[x, y] that skips the bounds check.
+
+        Only use it for locations known to be in bounds, such as the ones produced by
+        iterating over the game map. Out of bounds locations silently return an empty list or raise an IndexError.
+
+        Args:
+            x: The x coordinate, an int
+            y: The y coordinate, an int
+
+        Returns:
+            The list of units at [x, y]
+        """
+        units = self.__map[x][y]
+        if units is None:
+            units = self.__materialize(x, y)
+        elif self.__owned[x * ARENA_SIZE + y] == _SHARED:
+            # The units may be shared with a fork, and callers are free to change them
+            units = [unit.copy() for unit in units]
+            self.__map[x][y] = units
+        self.__owned[x * ARENA_SIZE + y] = _HANDED_OUT
+        return units
+
+    def _peek(self, x, y):
+        # Read only access for scans inside gamelib, which never copies the units of a shared location
+        units = self.__map[x][y]
+        if units is None:
+            units = self.__materialize(x, y)
+        return units
+
+    def __materialize(self, x, y):
+        units = self.__unit_table.materialize(x, y)
+        self.__map[x][y] = units
+        self.__owned[x * ARENA_SIZE + y] = _PRIVATE
+        return units
+
+    def fork(self):
+        """Creates a copy of this map that can be changed without affecting it, and the other way around
+
+        This map keeps every unit and list it handed out, through game_map[x, y] or get_unchecked,
+        so references taken before the fork still point at this map. The fork gets copies of those
+        locations up front. The other locations are shared, and their units are copied the first time
+        either map accesses them, so forking only costs as much as the locations handed out.
+
+        Returns:
+            A new GameMap holding the same units as this one
+        """
+        child = copy.copy(self)
+        child.__map = [column[:] for column in self.__map]
+        child.__owned = bytearray(ARENA_SIZE * ARENA_SIZE)
+        tile = self.__owned.find(_HANDED_OUT)
+        while tile != -1:
+            x, y = divmod(tile, ARENA_SIZE)
+            child.__map[x][y] = [unit.copy() for unit in self.__map[x][y]]
+            child.__owned[tile] = _PRIVATE
+            tile = self.__owned.find(_HANDED_OUT, tile + 1)
+        self.__owned = self.__owned.translate(_FORK_OWNERSHIP)
+        return child
+
     def __iter__(self):
-        self.__start = [13,0]
+        self.__start = 0
         return self
     
     def __next__(self):
-        location = self.__start
-        if location == [15,27]:
+        if self.__start >= len(ARENA_LOCATION_LIST):
             raise StopIteration
-        new_location = [location[0]+1, location[1]]
-        while not self.in_arena_bounds(new_location) and not location == [14,27]:
-            if new_location[0] == self.ARENA_SIZE:
-                new_location = [0, new_location[1]+1]
-            else:
-                new_location = [new_location[0]+1, new_location[1]]
-        self.__start = new_location
-        return location 
+        x, y = ARENA_LOCATION_LIST[self.__start]
+        self.__start += 1
+        return [x, y]
 
     def __empty_grid(self):
         grid = []
@@ -89,19 +260,7 @@ class GameMap:
         
         """
         x, y = location
-        half_board = self.HALF_ARENA
-
-        row_size = y + 1
-        startx = half_board - row_size
-        endx = startx + (2 * row_size) - 1
-        top_half_check = (y < self.HALF_ARENA and x >= startx and x <= endx)
-
-        row_size = (self.ARENA_SIZE - 1 - y) + 1
-        startx = half_board - row_size
-        endx = startx + (2 * row_size) - 1
-        bottom_half_check = (y >= self.HALF_ARENA and x >= startx and x <= endx)
-
-        return bottom_half_check or top_half_check
+        return (x, y) in ARENA_LOCATIONS
 
     def get_edge_locations(self, quadrant_description):
         """Takes in an edge description and returns a list of locations.
@@ -168,10 +327,13 @@ class GameMap:
 
         x, y = location
         new_unit = GameUnit(unit_type, self.config, player_index, None, location[0], location[1])
+        self.revision += 1
         if not new_unit.stationary:
-            self.__map[x][y].append(new_unit)
+            self.get_unchecked(x, y).append(new_unit)
         else:
             self.__map[x][y] = [new_unit]
+            self.__owned[x * ARENA_SIZE + y] = _PRIVATE
+            self.__blocked_mask = None
 
     def remove_unit(self, location):
         """Remove all units on the map in the given location.
@@ -187,6 +349,32 @@ class GameMap:
         
         x, y = location
         self.__map[x][y] = []
+        self.__owned[x * ARENA_SIZE + y] = _PRIVATE
+        self.__blocked_mask = None
+        self.revision += 1
+
+    def get_blocked_mask(self):
+        """Gets the set of tiles blocked by structures as a bitmask
+
+        Bit x * ARENA_SIZE + y is set if location [x, y] contains a structure. The mask is cached
+        and recomputed after add_unit, remove_unit or an assignment to game_map[x, y] changes the map.
+
+        Returns:
+            An int with one bit set per blocked location
+        """
+        if self.__blocked_mask is None:
+            mask = 0
+            for x, column in enumerate(self.__map):
+                for y, units in enumerate(column):
+                    if units is None:
+                        mask |= self.__unit_table.structure_mask & (1 << (x * self.ARENA_SIZE + y))
+                        continue
+                    for unit in units:
+                        if unit.stationary:
+                            mask |= 1 << (x * self.ARENA_SIZE + y)
+                            break
+            self.__blocked_mask = mask
+        return self.__blocked_mask
 
     def get_locations_in_range(self, location, radius):
         """Gets locations in a circular area around a location
@@ -204,15 +392,20 @@ class GameMap:
         if not self.in_arena_bounds(location):
             self._invalid_coordinates(location)
 
+        if (location[0], location[1]) not in ARENA_LOCATIONS:
+            return self.__scan_locations_in_range(location, radius)
+
+        return [[i, j] for i, j in locations_in_range(int(location[0]), int(location[1]), radius, self.__get_hit_radius)]
+
+    def __scan_locations_in_range(self, location, radius):
         x, y = location
         locations = []
         search_radius = math.ceil(radius)
-        getHitRadius = self.config["unitInformation"][0]['getHitRadius']
         for i in range(int(x - search_radius), int(x + search_radius + 1)):
             for j in range(int(y - search_radius), int(y + search_radius + 1)):
                 new_location = [i, j]
                 # A unit with a given range affects all locations who's centers are within that range + get hit radius
-                if self.in_arena_bounds(new_location) and self.distance_between_locations(location, new_location) < radius + getHitRadius:
+                if self.in_arena_bounds(new_location) and self.distance_between_locations(location, new_location) < radius + self.__get_hit_radius:
                     locations.append(new_location)
         return locations
 
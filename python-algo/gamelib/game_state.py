@@ -1,21 +1,22 @@
+import copy
+import itertools
 import math
-import json
 import sys
 
-from .navigation import ShortestPathFinder
-from .util import send_command, debug_write
+from .navigation import ShortestPathFinder, FlatShortestPathFinder
+from .util import send_command, debug_write, extract_json_value, json_loads, json_dumps
 from .unit import GameUnit
 from .game_map import GameMap
+from .unit_table import UnitTable
+from .fields import ThreatMap, ShieldMap
+from .rules import get_rules
 
-def is_stationary(unit_type):
-    """
-        Args:
-            unit_type: A unit type
-        
-        Returns: 
-            Boolean, True if the unit is stationary, False otherwise.
-    """
-    return unit_type in STRUCTURE_TYPES
+# Kinds of entries in the undo log of GameState.savepoint
+_UNDO_RESOURCE = 0
+_UNDO_TILE = 1
+_UNDO_UNIT = 2
+# Savepoint ids are unique across states, so a savepoint can not be mistaken for one of a fork
+_savepoint_ids = itertools.count()
 
 class GameState:
     """Represents the entire gamestate for a given turn
@@ -31,7 +32,9 @@ class GameState:
         * INTERCEPTOR (str): A constant representing the interceptor unit
         * REMOVE (str): A constant representing removing your own unit
         * UPGRADE (str): A constant representing upgrading a unit
-        * STRUCTURE_TYPES (list): A list of the structure units
+        * STRUCTURE_TYPES (tuple): The structure units
+        * ALL_UNITS (tuple): The units that can be spawned
+        * rules (:obj: GameRules): The constants of the config, shared with every GameState using the same config
 
         * ARENA_SIZE (int): The size of the arena
         * HALF_ARENA (int): Half the size of the arena
@@ -39,6 +42,7 @@ class GameState:
         * SP (int): A constant representing the SP resource, used in the get_resource function
          
         * game_map (:obj: GameMap): The current GameMap. To retrieve a list of GameUnits at a location, use game_map[x, y]
+        * unit_table (:obj: UnitTable): The units parsed from the serialized game state, one column per attribute
         * turn_number (int): The current turn number. Starts at 0.
         * my_health (int): Your current remaining health
         * my_time (int): The time you took to submit your previous turn
@@ -47,69 +51,67 @@ class GameState:
 
     """
 
-    def __init__(self, config, serialized_string):
+    def __init__(self, config, serialized_string, rules=None, lazy=False):
         """ Setup a turns variables using arguments passed
 
         Args:
             * config (JSON): A json object containing information about the game
-            * serialized_string (string): A string containing information about the game state at the start of this turn
+            * serialized_string (string): A string containing information about the game state at the start of this turn.
+              The state already decoded as a dict is accepted too, see AlgoCore.decode_messages.
+            * rules (:obj: GameRules): The constants of config. Looked up with get_rules(config) if None.
+            * lazy (bool): If true, only the turn number, health, time and resources are parsed now.
+              The units are parsed the first time game_map or unit_table is used.
 
         """
         self.serialized_string = serialized_string
         self.config = config
         self.enable_warnings = True
 
-        global WALL, SUPPORT, TURRET, SCOUT, DEMOLISHER, INTERCEPTOR, REMOVE, UPGRADE, STRUCTURE_TYPES, ALL_UNITS, UNIT_TYPE_TO_INDEX
-        UNIT_TYPE_TO_INDEX = {}
-        WALL = config["unitInformation"][0]["shorthand"]
-        UNIT_TYPE_TO_INDEX[WALL] = 0
-        SUPPORT = config["unitInformation"][1]["shorthand"]
-        UNIT_TYPE_TO_INDEX[SUPPORT] = 1
-        TURRET = config["unitInformation"][2]["shorthand"]
-        UNIT_TYPE_TO_INDEX[TURRET] = 2
-        SCOUT = config["unitInformation"][3]["shorthand"]
-        UNIT_TYPE_TO_INDEX[SCOUT] = 3
-        DEMOLISHER = config["unitInformation"][4]["shorthand"]
-        UNIT_TYPE_TO_INDEX[DEMOLISHER] = 4
-        INTERCEPTOR = config["unitInformation"][5]["shorthand"]
-        UNIT_TYPE_TO_INDEX[INTERCEPTOR] = 5
-        REMOVE = config["unitInformation"][6]["shorthand"]
-        UNIT_TYPE_TO_INDEX[REMOVE] = 6
-        UPGRADE = config["unitInformation"][7]["shorthand"]
-        UNIT_TYPE_TO_INDEX[UPGRADE] = 7
-
-        ALL_UNITS = [SCOUT, DEMOLISHER, INTERCEPTOR, WALL, SUPPORT, TURRET]
-        STRUCTURE_TYPES = [WALL, SUPPORT, TURRET]
+        # Constants are shared by every state built with this config, copy them so self.WALL etc. keep working
+        self.rules = rules if rules is not None else get_rules(config)
+        for name in ["WALL", "SUPPORT", "TURRET", "SCOUT", "DEMOLISHER", "INTERCEPTOR", "REMOVE", "UPGRADE",
+                     "UNIT_TYPE_TO_INDEX", "STRUCTURE_TYPES", "ALL_UNITS", "MP", "SP"]:
+            setattr(self, name, getattr(self.rules, name))
 
         self.ARENA_SIZE = 28
         self.HALF_ARENA = int(self.ARENA_SIZE / 2)
-        self.MP = 1
-        self.SP = 0
-        global MP, SP
-        MP = self.MP
-        SP = self.SP
 
-        self.game_map = GameMap(self.config)
         self._shortest_path_finder = ShortestPathFinder()
+        self._flat_path_finder = None
+        self._fields = {}
+        self._undo_log = None
+        self._savepoints = []
+        self._game_map = None
+        self._unit_table = None
         self._build_stack = []
         self._deploy_stack = []
         self._player_resources = [
                 {'SP': 0, 'MP': 0},  # player 0, which is you
                 {'SP': 0, 'MP': 0}]  # player 1, which is the opponent
-        self.__parse_state(serialized_string)
+        self.__parse_state(serialized_string, lazy)
 
-    def __parse_state(self, state_line):
+    def __parse_state(self, state_line, lazy=False):
         """
         Fills in map based on the serialized game state so that self.game_map[x,y] is a list of GameUnits at that location.
-        state_line is the game state as a json string.
+        state_line is the game state as a json string, or as a dict if it was already decoded.
+        Units are parsed into self.unit_table, GameUnits are only created when the map is indexed.
         """
-        state = json.loads(state_line)
+        state = None
+        if isinstance(state_line, dict):
+            state = state_line
+            turn_info, p1_stats, p2_stats = state["turnInfo"], state["p1Stats"], state["p2Stats"]
+        elif lazy:
+            turn_info = extract_json_value(state_line, "turnInfo")
+            p1_stats = extract_json_value(state_line, "p1Stats")
+            p2_stats = extract_json_value(state_line, "p2Stats")
+        if state is None and (not lazy or turn_info is None or p1_stats is None or p2_stats is None):
+            state = json_loads(state_line)
+            turn_info, p1_stats, p2_stats = state["turnInfo"], state["p1Stats"], state["p2Stats"]
 
-        turn_info = state["turnInfo"]
         self.turn_number = int(turn_info[1])
 
-        p1_health, p1_SP, p1_MP, p1_time = map(float, state["p1Stats"][:4])
-        p2_health, p2_SP, p2_MP, p2_time = map(float, state["p2Stats"][:4])
+        p1_health, p1_SP, p1_MP, p1_time = map(float, p1_stats[:4])
+        p2_health, p2_SP, p2_MP, p2_time = map(float, p2_stats[:4])
 
         self.my_health = p1_health
         self.my_time = p1_time
@@ -120,37 +122,44 @@ class GameState:
             {'SP': p1_SP, 'MP': p1_MP},
             {'SP': p2_SP, 'MP': p2_MP}]
 
+        if state is not None and not (lazy and state is state_line):
+            self.__parse_units(state)
+
+    def __parse_units(self, state=None):
+        """
+        Helper function for __parse_state to fill in the unit table and the map, parsing the serialized string again if state is None.
+        """
+        if state is None:
+            state = self.serialized_string
+            if not isinstance(state, dict):
+                state = json_loads(state)
         p1units = state["p1Units"]
         p2units = state["p2Units"]
 
-        self.__create_parsed_units(p1units, 0)
-        self.__create_parsed_units(p2units, 1)
-
-    def __create_parsed_units(self, units, player_number):
-        """
-        Helper function for __parse_state to add units to the map.
-        """
-        typedef = self.config.get("unitInformation")
-        for i, unit_types in enumerate(units):
-            for uinfo in unit_types:
-                unit_type = typedef[i].get("shorthand")
-                sx, sy, shp = uinfo[:3]
-                x, y = map(int, [sx, sy])
-                hp = float(shp)
-                # This depends on RM and UP always being the last types to be processed
-                if unit_type == REMOVE:
-                    # Quick fix will deploy engine fix soon
-                    if self.contains_stationary_unit([x,y]):
-                        self.game_map[x,y][0].pending_removal = True
-                elif unit_type == UPGRADE:
-                    if self.contains_stationary_unit([x,y]):
-                        self.game_map[x,y][0].upgrade()
-                else:
-                    unit = GameUnit(unit_type, self.config, player_number, hp, x, y)
-                    self.game_map[x,y].append(unit)
+        self._unit_table = UnitTable(self.config)
+        self._unit_table.add_serialized_units(p1units, 0)
+        self._unit_table.add_serialized_units(p2units, 1)
+        self._game_map = GameMap(self.config, self._unit_table, self.rules)
+        self._game_map.enable_warnings = self.enable_warnings
+
+    @property
+    def game_map(self):
+        if self._game_map is None:
+            self.__parse_units()
+        return self._game_map
+
+    @game_map.setter
+    def game_map(self, game_map):
+        self._game_map = game_map
+
+    @property
+    def unit_table(self):
+        if self._unit_table is None:
+            self.__parse_units()
+        return self._unit_table
 
     def __resource_required(self, unit_type):
-        return self.SP if is_stationary(unit_type) else self.MP
+        return self.SP if self.rules.is_stationary(unit_type) else self.MP
 
     def __set_resource(self, resource_type, amount, player_index=0):
         """
@@ -163,6 +172,8 @@ class GameState:
         elif resource_type == self.SP:
             resource_key = 'SP'
         held_resource = self.get_resource(resource_type, player_index)
+        if self._undo_log is not None:
+            self._undo_log.append((_UNDO_RESOURCE, player_index, resource_key, self._player_resources[player_index][resource_key]))
         self._player_resources[player_index][resource_key] = held_resource + amount
 
     def _invalid_player_index(self, index):
@@ -175,8 +186,8 @@ class GameState:
         """Submit and end your turn.
             Must be called at the end of your turn or the algo will hang.
         """
-        build_string = json.dumps(self._build_stack)
-        deploy_string = json.dumps(self._deploy_stack)
+        build_string = json_dumps(self._build_stack)
+        deploy_string = json_dumps(self._deploy_stack)
         send_command(build_string)
         send_command(deploy_string)
 
@@ -234,18 +245,18 @@ class GameState:
             The number of units affordable of the given unit_type.
 
         """
-        if unit_type not in ALL_UNITS:
+        if unit_type not in self.ALL_UNITS:
             self._invalid_unit(unit_type)
             return
 
         costs = self.type_cost(unit_type)
         player_held = self.get_resources()
-        if costs[MP] > 0 and costs[SP] > 0:
-            return min(math.floor(player_held[SP] / costs[SP]), math.floor(player_held[MP] / costs[MP]))
-        elif costs[MP] > 0:
-            return math.floor(player_held[MP] / costs[MP])
-        elif costs[SP] > 0:
-            return math.floor(player_held[SP] / costs[SP])
+        if costs[self.MP] > 0 and costs[self.SP] > 0:
+            return min(math.floor(player_held[self.SP] / costs[self.SP]), math.floor(player_held[self.MP] / costs[self.MP]))
+        elif costs[self.MP] > 0:
+            return math.floor(player_held[self.MP] / costs[self.MP])
+        elif costs[self.SP] > 0:
+            return math.floor(player_held[self.SP] / costs[self.SP])
         else:
             self.warn("Invalid costs for unit, cost is 0 for both resources, returning 0")
             return 0
@@ -292,14 +303,14 @@ class GameState:
             The units costs as a list [SP, MP]
 
         """
-        if unit_type == REMOVE:
+        if unit_type == self.REMOVE:
             self._invalid_unit(unit_type)
             return
         
-        unit_def = self.config["unitInformation"][UNIT_TYPE_TO_INDEX[unit_type]]
+        unit_def = self.config["unitInformation"][self.UNIT_TYPE_TO_INDEX[unit_type]]
         cost_base = [unit_def.get('cost1', 0), unit_def.get('cost2', 0)]
         if upgrade:
-            return [unit_def.get('upgrade', {}).get('cost1', cost_base[SP]), unit_def.get('upgrade', {}).get('cost2', cost_base[MP])]
+            return [unit_def.get('upgrade', {}).get('cost1', cost_base[self.SP]), unit_def.get('upgrade', {}).get('cost2', cost_base[self.MP])]
 
         return cost_base
 
@@ -320,7 +331,7 @@ class GameState:
             True if we can spawn the unit(s)
 
         """
-        if unit_type not in ALL_UNITS:
+        if unit_type not in self.ALL_UNITS:
             self._invalid_unit(unit_type)
             return
         
@@ -330,8 +341,8 @@ class GameState:
             return False
 
         affordable = self.number_affordable(unit_type) >= num
-        stationary = is_stationary(unit_type)
-        blocked = self.contains_stationary_unit(location) or (stationary and len(self.game_map[location[0],location[1]]) > 0)
+        stationary = self.rules.is_stationary(unit_type)
+        blocked = self.contains_stationary_unit(location) or (stationary and len(self.game_map._peek(int(location[0]), int(location[1]))) > 0)
         correct_territory = location[1] < self.HALF_ARENA
         on_edge = location in (self.game_map.get_edge_locations(self.game_map.BOTTOM_LEFT) + self.game_map.get_edge_locations(self.game_map.BOTTOM_RIGHT))
 
@@ -364,7 +375,7 @@ class GameState:
             The number of units successfully spawned
 
         """
-        if unit_type not in ALL_UNITS:
+        if unit_type not in self.ALL_UNITS:
             self._invalid_unit(unit_type)
             return
         if num < 1 or not locations:
@@ -379,10 +390,12 @@ class GameState:
                 if self.can_spawn(unit_type, location, 1):
                     x, y = map(int, location)
                     costs = self.type_cost(unit_type)
-                    self.__set_resource(SP, 0 - costs[SP])
-                    self.__set_resource(MP, 0 - costs[MP])
+                    self.__set_resource(self.SP, 0 - costs[self.SP])
+                    self.__set_resource(self.MP, 0 - costs[self.MP])
+                    if self._undo_log is not None:
+                        self._undo_log.append((_UNDO_TILE, x, y, list(self.game_map[x, y])))
                     self.game_map.add_unit(unit_type, location, 0)
-                    if is_stationary(unit_type):
+                    if self.rules.is_stationary(unit_type):
                         self._build_stack.append((unit_type, x, y))
                     else:
                         self._deploy_stack.append((unit_type, x, y))
@@ -407,7 +420,7 @@ class GameState:
         for location in locations:
             if location[1] < self.HALF_ARENA and self.contains_stationary_unit(location):
                 x, y = map(int, location)
-                self._build_stack.append((REMOVE, x, y))
+                self._build_stack.append((self.REMOVE, x, y))
                 removed_units += 1
             else:
                 self.warn("Could not remove a unit from {}. Location has no structures or is enemy territory.".format(location))
@@ -439,14 +452,17 @@ class GameState:
                     if unit.stationary:
                         existing_unit = unit
 
-                if not existing_unit.upgraded and self.config["unitInformation"][UNIT_TYPE_TO_INDEX[existing_unit.unit_type]].get("upgrade", None) is not None:
+                if not existing_unit.upgraded and self.config["unitInformation"][self.UNIT_TYPE_TO_INDEX[existing_unit.unit_type]].get("upgrade", None) is not None:
                     costs = self.type_cost(existing_unit.unit_type, True)
                     resources = self.get_resources()
-                    if resources[SP] >= costs[SP] and resources[MP] >= costs[MP]:
-                        self.__set_resource(SP, 0 - costs[SP])
-                        self.__set_resource(MP, 0 - costs[MP])
+                    if resources[self.SP] >= costs[self.SP] and resources[self.MP] >= costs[self.MP]:
+                        self.__set_resource(self.SP, 0 - costs[self.SP])
+                        self.__set_resource(self.MP, 0 - costs[self.MP])
+                        if self._undo_log is not None:
+                            self._undo_log.append((_UNDO_UNIT, x, y, existing_unit.definition))
                         existing_unit.upgrade()
-                        self._build_stack.append((UPGRADE, x, y))
+                        self._fields.clear()
+                        self._build_stack.append((self.UPGRADE, x, y))
                         spawned_units += 1
             else:
                 self.warn("Could not upgrade a unit from {}. Location has no structures or is enemy territory.".format(location))
@@ -498,6 +514,174 @@ class GameState:
         end_points = self.game_map.get_edge_locations(target_edge)
         return self._shortest_path_finder.navigate_multiple_endpoints(start_location, end_points, self)
 
+    def find_paths_from_edges(self, locations=None, target_edge=None):
+        """Gets the paths units at many locations would take, in one call.
+        The blocked tiles are read once and units in the same pocket share their pathing work,
+        which is much faster than calling find_path_to_edge for each location.
+
+        Args:
+            locations: The locations of hypothetical units. Defaults to every unblocked edge location, both friendly and enemy.
+            target_edge: The edge the units want to reach. game_map.TOP_LEFT, game_map.BOTTOM_RIGHT, etc. Induced from each location if None.
+
+        Returns:
+            A dict mapping each location, as an (x, y) tuple, to the path a unit there would take.
+            Locations blocked by a structure map to None.
+
+        """
+        edges = self.game_map.get_edges()
+        if locations is None:
+            locations = [location for edge in edges for location in edge if not self.contains_stationary_unit(location)]
+        else:
+            for location in locations:
+                if not self.game_map.in_arena_bounds(location):
+                    self.warn("Attempted to perform pathing from out of bounds location {}".format(location))
+                    return
+        end_points = [edges[target_edge if target_edge is not None else self.get_target_edge(location)] for location in locations]
+
+        paths = {}
+        for location, path in zip(locations, self._get_flat_path_finder().navigate_from_locations(locations, end_points, self)):
+            if path is None:
+                self.warn("Attempted to perform pathing from blocked starting location {}".format(location))
+            paths[tuple(location)] = path
+        return paths
+
+    def find_path_to_edge_with_change(self, start_location, changed_location, target_edge=None):
+        """Gets the path a unit at a given location would take if one location changed.
+        If changed_location holds a structure, the path is computed as if it was removed,
+        otherwise as if a structure was placed there. The game map is not modified.
+
+        The path of the current layout is repaired locally rather than recomputed,
+        so this is the cheap way to evaluate many hypothetical placements.
+
+        Args:
+            start_location: The location of a hypothetical unit
+            changed_location: The location of the hypothetical placement or removal
+            target_edge: The edge the unit wants to reach. game_map.TOP_LEFT, game_map.BOTTOM_RIGHT, etc. Induced from start_location if None.
+
+        Returns:
+            A list of locations corresponding to the path the unit would take
+            to get from it's starting location to the best available end location
+
+        """
+        if not self.game_map.in_arena_bounds(changed_location):
+            self.warn("Attempted to change out of bounds location {}".format(changed_location))
+            return
+        if target_edge is None:
+            target_edge = self.get_target_edge(start_location)
+
+        end_points = self.game_map.get_edge_locations(target_edge)
+        path = self._get_flat_path_finder().navigate_with_change(start_location, end_points, self, changed_location)
+        if path is None:
+            self.warn("Attempted to perform pathing from blocked starting location {}".format(start_location))
+        return path
+
+    def _get_flat_path_finder(self):
+        if isinstance(self._shortest_path_finder, FlatShortestPathFinder):
+            return self._shortest_path_finder
+        if self._flat_path_finder is None:
+            self._flat_path_finder = FlatShortestPathFinder()
+        return self._flat_path_finder
+
+    def fork(self):
+        """Creates a hypothetical copy of this state, for trying out moves without affecting it
+
+        The copy shares the parsed units, the game map and the pathfinding caches with this state.
+        Locations of the map this state already handed out are copied up front, so units taken from
+        this state before the fork keep belonging to it, and the others are copied once either state
+        accesses them. attempt_spawn,
+        attempt_remove and attempt_upgrade on the copy change its resources, map and build stacks
+        but not this state's. Forks of forks work the same way, so this is the cheap way to search
+        over build orders.
+
+        Forks share their pathfinders, so only use one of them at a time.
+
+        Returns:
+            A new GameState equal to this one
+
+        """
+        child = copy.copy(self)
+        if self._game_map is not None:
+            # A lazy state that was never used leaves its fork to parse the units on its own
+            child._game_map = self._game_map.fork()
+        child._player_resources = [dict(resources) for resources in self._player_resources]
+        child._build_stack = list(self._build_stack)
+        child._deploy_stack = list(self._deploy_stack)
+        child._fields = dict(self._fields)
+        child._undo_log = None
+        child._savepoints = []
+        return child
+
+    def savepoint(self):
+        """Marks the current resources, game map and build stacks so they can be restored later
+
+        Everything attempt_spawn, attempt_upgrade and attempt_remove change after this call is
+        recorded, and rollback undoes it in time proportional to the number of changes.
+        Savepoints can be nested. Rolling back or releasing a savepoint also ends the savepoints
+        taken after it, and the changes stop being recorded once the outermost one is released.
+
+        Returns:
+            A savepoint to pass to rollback or release_savepoint
+
+        """
+        if self._undo_log is None:
+            self._undo_log = []
+        savepoint = (next(_savepoint_ids), len(self._undo_log), len(self._build_stack), len(self._deploy_stack))
+        self._savepoints.append(savepoint[0])
+        return savepoint
+
+    def __find_savepoint(self, savepoint):
+        # The position of a live savepoint in the stack of savepoints
+        try:
+            return self._savepoints.index(savepoint[0])
+        except ValueError:
+            raise ValueError("Savepoint {} was released, rolled back past or taken on another state".format(savepoint)) from None
+
+    def rollback(self, savepoint):
+        """Undoes every attempted spawn, upgrade and removal since a savepoint
+
+        The savepoint stays valid, so one savepoint can be used to try several alternatives in a row.
+        Savepoints taken after it are ended.
+
+        Args:
+            savepoint: A savepoint returned by savepoint()
+
+        Raises:
+            ValueError: If the savepoint was released, ended by rolling back an outer one, or taken on another state
+
+        """
+        del self._savepoints[self.__find_savepoint(savepoint) + 1:]
+        _, log_length, build_length, deploy_length = savepoint
+        while len(self._undo_log) > log_length:
+            entry = self._undo_log.pop()
+            if entry[0] == _UNDO_RESOURCE:
+                self._player_resources[entry[1]][entry[2]] = entry[3]
+            elif entry[0] == _UNDO_TILE:
+                self.game_map[entry[1], entry[2]] = entry[3]
+            else:
+                # Look the structure up again, the unit upgraded may since have been copied by a fork
+                for unit in self.game_map[entry[1], entry[2]]:
+                    if unit.stationary:
+                        unit.definition = entry[3]
+                self._fields.clear()
+        del self._build_stack[build_length:]
+        del self._deploy_stack[deploy_length:]
+
+    def release_savepoint(self, savepoint):
+        """Keeps the changes made since a savepoint, ending it and the savepoints taken after it
+
+        Changes stop being recorded once no savepoint is left.
+
+        Args:
+            savepoint: A savepoint returned by savepoint()
+
+        Raises:
+            ValueError: If the savepoint was released, ended by rolling back an outer one, or taken on another state
+
+        """
+        del self._savepoints[self.__find_savepoint(savepoint):]
+        if not self._savepoints:
+            self._undo_log = None
+
     def contains_stationary_unit(self, location):
         """Check if a location is blocked, return structures unit if it is
 
@@ -512,9 +696,12 @@ class GameState:
             self.warn('Checked for stationary unit outside of arena bounds')
             return False
         x, y = map(int, location)
-        for unit in self.game_map[x,y]:
+        for unit in self.game_map._peek(x, y):
             if unit.stationary:
-                return unit
+                # Look the unit up again so a forked map hands out its own copy
+                for unit in self.game_map[x,y]:
+                    if unit.stationary:
+                        return unit
         return False
 
     def warn(self, message):
@@ -533,7 +720,69 @@ class GameState:
         """
 
         self.enable_warnings = not suppress
-        self.game_map.enable_warnings = not suppress
+        if self._game_map is not None:
+            self._game_map.enable_warnings = not suppress
+
+    def use_flat_pathfinder(self, enable=True):
+        """Choose the pathfinding engine used by find_path_to_edge
+
+        The flat engine returns the same paths as the default one, but is much faster
+        when pathing is done many times per turn.
+
+        Args:
+            enable: If true, use the flat array engine. If false, use the default Node based engine.
+
+        """
+        if enable:
+            self._shortest_path_finder = self._get_flat_path_finder()
+        elif isinstance(self._shortest_path_finder, FlatShortestPathFinder):
+            self._flat_path_finder = self._shortest_path_finder
+            self._shortest_path_finder = ShortestPathFinder()
+
+    def threat_map(self, player_index=0):
+        """Gets the damage per frame structures deal to a player's mobile units on every tile
+
+        The map is built in one pass over the board and cached until the structures change,
+        so it is the fast way to score many paths or tiles per turn.
+
+        Args:
+            player_index: The index corresponding to the defending player, 0 for you 1 for the enemy
+
+        Returns:
+            A ThreatMap, use threat_map.damage_at(location) or threat_map.path_damage(path, unit_type)
+
+        """
+        if not player_index == 0 and not player_index == 1:
+            self._invalid_player_index(player_index)
+            return
+        return self._get_field(ThreatMap, player_index)
+
+    def shield_map(self, player_index=0):
+        """Gets the shield a player's supports give to that player's mobile units on every tile
+
+        The map is built in one pass over the board and cached until the structures change.
+
+        Args:
+            player_index: The index corresponding to the shielded player, 0 for you 1 for the enemy
+
+        Returns:
+            A ShieldMap, use shield_map.shield_at(location) or shield_map.path_shield(path)
+
+        """
+        if not player_index == 0 and not player_index == 1:
+            self._invalid_player_index(player_index)
+            return
+        return self._get_field(ShieldMap, player_index)
+
+    def _get_field(self, field_type, player_index):
+        # Fields are rebuilt after any change to the game map, or after attempt_upgrade
+        key = (field_type, player_index)
+        revision = self.game_map.revision
+        cached = self._fields.get(key)
+        if cached is None or cached[0] != revision:
+            cached = (revision, field_type(self, player_index))
+            self._fields[key] = cached
+        return cached[1]
 
     def get_target(self, attacking_unit):
         """Returns target of given unit based on current map of the game board. 
@@ -565,7 +814,7 @@ class GameState:
 
         for location in possible_locations:
             for unit in self.game_map[location]:
-                if unit.player_index == attacking_unit.player_index or (attacking_unit.damage_f == 0 and is_stationary(unit.unit_type)) or (attacking_unit.damage_i == 0 and not(is_stationary(unit.unit_type))):
+                if unit.player_index == attacking_unit.player_index or (attacking_unit.damage_f == 0 and self.rules.is_stationary(unit.unit_type)) or (attacking_unit.damage_i == 0 and not(self.rules.is_stationary(unit.unit_type))):
                     continue
 
                 new_target = False
@@ -635,11 +884,7 @@ class GameState:
         """
         Get locations in the range of TURRET units
         """
-        max_range = 0
-        for unit in self.config["unitInformation"]:
-            if unit.get('attackRange', 0) >= max_range:
-                max_range = unit.get('attackRange', 0)
-        possible_locations= self.game_map.get_locations_in_range(location, max_range)
+        possible_locations= self.game_map.get_locations_in_range(location, self.rules.max_attack_range)
         for location_unit in possible_locations:
             for unit in self.game_map[location_unit]:
                 if unit.damage_i + unit.damage_f > 0 and unit.player_index != player_index and self.game_map.distance_between_locations(location, location_unit) <= unit.attackRange:
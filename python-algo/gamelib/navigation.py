@@ -2,7 +2,28 @@ import heapq
 import math
 import sys
 import queue
+from collections import deque, OrderedDict
 from .util import debug_write
+from .game_map import ARENA_SIZE, HALF_ARENA, IN_ARENA_BOUNDS
+
+
+def _build_neighbor_table():
+    """Precomputes the in bounds neighbors of every tile, in the same order as ShortestPathFinder._get_neighbors
+
+    Tiles are indexed as x * ARENA_SIZE + y. Out of bounds tiles get an empty tuple.
+    """
+    table = []
+    for x in range(ARENA_SIZE):
+        for y in range(ARENA_SIZE):
+            if not IN_ARENA_BOUNDS[x][y]:
+                table.append(())
+                continue
+            candidates = [(x, y + 1), (x, y - 1), (x + 1, y), (x - 1, y)]
+            table.append(tuple(nx * ARENA_SIZE + ny for nx, ny in candidates
+                               if 0 <= nx < ARENA_SIZE and 0 <= ny < ARENA_SIZE and IN_ARENA_BOUNDS[nx][ny]))
+    return table
+
+NEIGHBORS = _build_neighbor_table()
 
 class Node:
     """A pathfinding node
@@ -314,3 +335,547 @@ class ShortestPathFinder:
             sys.stderr.write(" ")
         sys.stderr.write(str(number))
         sys.stderr.write(" ")
+
+
+class FlatShortestPathFinder:
+    """Handles pathfinding using preallocated flat arrays instead of a grid of Nodes
+
+    Produces exactly the same paths as ShortestPathFinder, but every tile is a single
+    index (x * ARENA_SIZE + y) into flat lists, neighbors come from a precomputed table
+    and the searches use a deque instead of a thread safe queue.
+    Enable it with game_state.use_flat_pathfinder().
+
+    Pathlength fields only depend on the blocked tiles, the target edge and the ideal tile,
+    so they are kept in an LRU cache keyed by those three. Every unit in the same pocket of
+    pathable space shares a field, and units heading to an edge they can reach share one
+    field no matter which pocket they are in. The cache follows GameMap.get_blocked_mask,
+    so adding or removing structures through the GameMap is picked up automatically.
+
+    Attributes :
+        * HORIZONTAL (int): A constant representing a horizontal movement
+        * VERTICAL (int): A constant representing a vertical movement
+
+        * game_state (:obj: GameState): The current gamestate
+        * blocked (bytearray): 1 for every tile containing a structure
+        * pathlength (list): The pathlength field used by the last search, -1 for unvisited tiles
+        * cache_size (int): The number of pathlength fields kept in the cache
+
+    """
+    def __init__(self, cache_size=128):
+        self.HORIZONTAL = 1
+        self.VERTICAL = 2
+        self.initialized = False
+        self.cache_size = cache_size
+        self.blocked = bytearray(ARENA_SIZE * ARENA_SIZE)
+        self.pathlength = [-1] * (ARENA_SIZE * ARENA_SIZE)
+        self._blocked_mask = None
+        self._fields = OrderedDict()
+        self._reset_pockets()
+
+    def _reset_pockets(self):
+        # _pocket_of[tile] is the index in _pockets of the pocket containing tile, or -1 if not yet explored
+        self._pocket_of = [-1] * (ARENA_SIZE * ARENA_SIZE)
+        self._pockets = []
+        self._pocket_ideals = {}
+
+    def initialize_map(self, game_state):
+        """Initializes the map, reusing the previous blocked tiles if no structures changed
+
+        Args:
+            game_state: A GameState object representing the gamestate we want to traverse
+        """
+        self.initialized = True
+        self.game_state = game_state
+        mask = game_state.game_map.get_blocked_mask()
+        if mask == self._blocked_mask:
+            return
+        blocked = bytearray(ARENA_SIZE * ARENA_SIZE)
+        remaining = mask
+        while remaining:
+            lowest = remaining & -remaining
+            blocked[lowest.bit_length() - 1] = 1
+            remaining ^= lowest
+        self.blocked = blocked
+        self._blocked_mask = mask
+        self._reset_pockets()
+
+    def navigate_multiple_endpoints(self, start_point, end_points, game_state):
+        """Finds the path a unit would take to reach a set of endpoints
+
+        Args:
+            * start_point: The starting location of the unit
+            * end_points: The end points of the unit, should be a list of edge locations
+            * game_state: The current game state
+
+        Returns:
+            The path a unit at start_point would take when trying to reach end_points given the current game state.
+            Note that this path can change if a tower is destroyed during pathing, or if you or your enemy places structures.
+
+        """
+        if game_state.contains_stationary_unit(start_point):
+            return
+
+        self.initialize_map(game_state)
+        start = int(start_point[0]) * ARENA_SIZE + int(start_point[1])
+        targets = tuple(x * ARENA_SIZE + y for x, y in end_points)
+        direction = self._get_direction_from_endpoints(end_points)
+        ideal_tile = self._idealness_search(start, targets, direction)
+        self.pathlength = self._get_field(ideal_tile, targets)
+        return self._get_path(start_point, start, direction)
+
+    def _get_direction_from_endpoints(self, end_points):
+        """Gets the direction [x, y] of the edge, [1, 1] for the top right and [-1, 1] for the top left
+        """
+        x, y = end_points[0]
+        return (-1 if x < HALF_ARENA else 1, -1 if y < HALF_ARENA else 1)
+
+    def _get_pocket(self, start):
+        """Gets the index of the pocket of pathable space containing start, exploring it on first use
+        """
+        pocket_index = self._pocket_of[start]
+        if pocket_index != -1:
+            return pocket_index
+
+        blocked = self.blocked
+        pocket_of = self._pocket_of
+        pocket_index = len(self._pockets)
+        pocket_of[start] = pocket_index
+        tiles = [start]
+        current = deque(tiles)
+        while current:
+            search_location = current.popleft()
+            for neighbor in NEIGHBORS[search_location]:
+                if blocked[neighbor] or pocket_of[neighbor] != -1:
+                    continue
+                pocket_of[neighbor] = pocket_index
+                tiles.append(neighbor)
+                current.append(neighbor)
+        self._pockets.append(tiles)
+        return pocket_index
+
+    def _idealness_search(self, start, targets, direction):
+        """
+        Finds the most ideal tile in our 'pocket' of pathable space.
+        The edge if it is available, or the best self destruct location otherwise.
+        Non edge tiles all have distinct idealness, so the result only depends on the pocket,
+        and is computed once per pocket and target edge.
+        """
+        pocket_index = self._get_pocket(start)
+        key = (pocket_index, targets)
+        most_ideal = self._pocket_ideals.get(key)
+        if most_ideal is not None:
+            return most_ideal
+
+        pocket = self._pockets[pocket_index]
+        target_set = set(targets)
+        right = direction[0] == 1
+        up = direction[1] == 1
+        best_idealness = -1
+        for location in pocket:
+            if location in target_set:
+                most_ideal = location
+                break
+            x, y = divmod(location, ARENA_SIZE)
+            idealness = (ARENA_SIZE * y if up else ARENA_SIZE * (ARENA_SIZE - 1 - y)) + (x if right else ARENA_SIZE - 1 - x)
+            if idealness > best_idealness:
+                best_idealness = idealness
+                most_ideal = location
+        self._pocket_ideals[key] = most_ideal
+        return most_ideal
+
+    def _get_field(self, ideal_tile, targets):
+        """Gets the pathlength field leading to ideal_tile, from the cache if possible
+        """
+        # Any reachable end point means the whole edge is the source, so the field is shared by all such pockets
+        key = (self._blocked_mask, targets, None if ideal_tile in targets else ideal_tile)
+        fields = self._fields
+        field = fields.get(key)
+        if field is not None:
+            fields.move_to_end(key)
+            return field
+
+        field = self._validate(ideal_tile, targets)
+        self._store_field(key, field)
+        return field
+
+    def _validate(self, ideal_tile, targets):
+        """Breadth first search of the grid, returning the pathlengths of each tile
+
+        """
+        blocked = self.blocked
+        pathlength = [-1] * (ARENA_SIZE * ARENA_SIZE)
+        if ideal_tile in targets:
+            sources = targets
+        else:
+            sources = [ideal_tile]
+
+        current = deque()
+        for location in sources:
+            if pathlength[location] == -1:
+                pathlength[location] = 0
+                # Blocked end points are given a pathlength, but nothing can path through them
+                if not blocked[location]:
+                    current.append(location)
+
+        while current:
+            current_location = current.popleft()
+            next_length = pathlength[current_location] + 1
+            for neighbor in NEIGHBORS[current_location]:
+                if blocked[neighbor] or pathlength[neighbor] != -1:
+                    continue
+                pathlength[neighbor] = next_length
+                current.append(neighbor)
+        return pathlength
+
+    def navigate_from_locations(self, start_points, end_points, game_state):
+        """Finds the paths units at many start points would take, sharing one blocked grid and the cached fields
+
+        Args:
+            * start_points: The starting locations of the units
+            * end_points: For each start point, the list of edge locations it is trying to reach
+            * game_state: The current game state
+
+        Returns:
+            A list with the path of each start point, or None for start points blocked by a structure
+
+        """
+        self.initialize_map(game_state)
+        blocked = self.blocked
+        directions = {}
+        paths = []
+        for start_point, edge in zip(start_points, end_points):
+            start = int(start_point[0]) * ARENA_SIZE + int(start_point[1])
+            if blocked[start]:
+                paths.append(None)
+                continue
+            targets = tuple(x * ARENA_SIZE + y for x, y in edge)
+            direction = directions.get(targets)
+            if direction is None:
+                direction = directions[targets] = self._get_direction_from_endpoints(edge)
+            ideal_tile = self._idealness_search(start, targets, direction)
+            self.pathlength = self._get_field(ideal_tile, targets)
+            paths.append(self._get_path(start_point, start, direction))
+        return paths
+
+    def navigate_with_change(self, start_point, end_points, game_state, changed_location):
+        """Finds the path a unit would take if the blocked state of one location were flipped
+
+        The pathlength field of the current layout is repaired locally instead of being rebuilt,
+        so evaluating many single structure placements or removals costs one local repair each.
+        The game state is not modified.
+
+        Args:
+            * start_point: The starting location of the unit
+            * end_points: The end points of the unit, should be a list of edge locations
+            * game_state: The current game state
+            * changed_location: A location that becomes blocked if it is empty, or unblocked if it holds a structure
+
+        Returns:
+            The path a unit at start_point would take after the change, or None if start_point would be blocked
+
+        """
+        self.initialize_map(game_state)
+        start = int(start_point[0]) * ARENA_SIZE + int(start_point[1])
+        tile = int(changed_location[0]) * ARENA_SIZE + int(changed_location[1])
+        targets = tuple(x * ARENA_SIZE + y for x, y in end_points)
+        direction = self._get_direction_from_endpoints(end_points)
+
+        blocking = not self.blocked[tile]
+        if (self.blocked[start] and start != tile) or (blocking and start == tile):
+            return
+        new_blocked = bytearray(self.blocked)
+        new_blocked[tile] = 1 if blocking else 0
+        new_mask = self._blocked_mask ^ (1 << tile)
+
+        if blocking:
+            field, ideal_tile = self._field_after_block(start, tile, targets, direction, new_blocked)
+        else:
+            field, ideal_tile = self._field_after_unblock(start, tile, targets, direction, new_blocked)
+
+        if field is None:
+            # The change moved the ideal tile of our pocket, do a full search on the new layout
+            return self._navigate_layout(start_point, start, targets, direction, new_blocked, new_mask)
+        if field is not self._cached_field(ideal_tile, targets):
+            self._store_field((new_mask, targets, None if ideal_tile in targets else ideal_tile), field)
+
+        base_blocked = self.blocked
+        self.blocked = new_blocked
+        self.pathlength = field
+        try:
+            return self._get_path(start_point, start, direction)
+        finally:
+            self.blocked = base_blocked
+
+    def _cached_field(self, ideal_tile, targets):
+        """Gets the cached pathlength field of the current layout, or None if it was not computed yet
+        """
+        return self._fields.get((self._blocked_mask, targets, None if ideal_tile in targets else ideal_tile))
+
+    def _store_field(self, key, field):
+        fields = self._fields
+        fields[key] = field
+        fields.move_to_end(key)
+        if len(fields) > self.cache_size:
+            fields.popitem(last=False)
+
+    def _field_after_block(self, start, tile, targets, direction, new_blocked):
+        """Repairs the field of start's pocket after tile becomes blocked
+
+        Returns:
+            (field, ideal_tile), or (None, None) if the ideal tile of the pocket changes
+        """
+        ideal_tile = self._idealness_search(start, targets, direction)
+        field = self._get_field(ideal_tile, targets)
+        if self._pocket_of[tile] != self._pocket_of[start]:
+            return field, ideal_tile
+        if tile == ideal_tile:
+            return None, None
+
+        sources = targets if ideal_tile in targets else (ideal_tile,)
+        field = repair_blocked(field, tile, new_blocked, sources)
+        # A pocket that loses its way to the source has a new ideal tile
+        if field[start] == -1:
+            return None, None
+        return field, ideal_tile
+
+    def _field_after_unblock(self, start, tile, targets, direction, new_blocked):
+        """Repairs the field of start's pocket after tile becomes unblocked
+
+        Returns:
+            (field, ideal_tile), or (None, None) if the ideal tile can not be found from the current pockets
+        """
+        if start == tile:
+            return None, None
+        start_pocket = self._get_pocket(start)
+        ideal_tile = self._idealness_search(start, targets, direction)
+        merged = [neighbor for neighbor in NEIGHBORS[tile] if not self.blocked[neighbor]]
+        if start_pocket not in [self._get_pocket(neighbor) for neighbor in merged]:
+            return self._get_field(ideal_tile, targets), ideal_tile
+
+        # The pockets around tile merge, the new ideal tile is the best of their ideal tiles and tile itself
+        candidates = [self._idealness_search(neighbor, targets, direction) for neighbor in merged]
+        candidates.append(tile)
+        target_set = set(targets)
+        new_ideal = None
+        best_idealness = -1
+        right = direction[0] == 1
+        up = direction[1] == 1
+        for candidate in candidates:
+            if candidate in target_set:
+                new_ideal = candidate
+                break
+            x, y = divmod(candidate, ARENA_SIZE)
+            idealness = (ARENA_SIZE * y if up else ARENA_SIZE * (ARENA_SIZE - 1 - y)) + (x if right else ARENA_SIZE - 1 - x)
+            if idealness > best_idealness:
+                best_idealness = idealness
+                new_ideal = candidate
+
+        sources = targets if new_ideal in target_set else (new_ideal,)
+        field = self._get_field(new_ideal, targets)
+        return repair_unblocked(field, tile, new_blocked, sources), new_ideal
+
+    def _navigate_layout(self, start_point, start, targets, direction, blocked, mask):
+        """Runs a full search on a different layout, leaving the current layout and its pockets untouched
+        """
+        saved = (self.blocked, self._blocked_mask, self._pocket_of, self._pockets, self._pocket_ideals, self.pathlength)
+        self.blocked = blocked
+        self._blocked_mask = mask
+        self._reset_pockets()
+        try:
+            ideal_tile = self._idealness_search(start, targets, direction)
+            self.pathlength = self._get_field(ideal_tile, targets)
+            return self._get_path(start_point, start, direction)
+        finally:
+            self.blocked, self._blocked_mask, self._pocket_of, self._pockets, self._pocket_ideals, self.pathlength = saved
+
+    def _get_path(self, start_point, start, direction):
+        """Once all tiles are validated, and a target is found, the unit can path to its target
+
+        """
+        pathlength = self.pathlength
+        path = [start_point]
+        current = start
+        move_direction = 0
+
+        while pathlength[current] != 0:
+            next_move = self._choose_next_move(current, move_direction, direction)
+            if current // ARENA_SIZE == next_move // ARENA_SIZE:
+                move_direction = self.VERTICAL
+            else:
+                move_direction = self.HORIZONTAL
+            path.append(list(divmod(next_move, ARENA_SIZE)))
+            current = next_move
+        return path
+
+    def _choose_next_move(self, current_point, previous_move_direction, direction):
+        """Given the current location and adjacent locations, return the best 'next step' for a given unit to take
+        """
+        blocked = self.blocked
+        pathlength = self.pathlength
+        ideal_neighbor = current_point
+        best_pathlength = pathlength[current_point]
+        for neighbor in NEIGHBORS[current_point]:
+            if blocked[neighbor]:
+                continue
+            current_pathlength = pathlength[neighbor]
+            if current_pathlength > best_pathlength:
+                continue
+            if current_pathlength == best_pathlength and not self._better_direction(current_point, neighbor, ideal_neighbor, previous_move_direction, direction):
+                continue
+            ideal_neighbor = neighbor
+            best_pathlength = current_pathlength
+        return ideal_neighbor
+
+    def _better_direction(self, prev_tile, new_tile, prev_best, previous_move_direction, direction):
+        """Compare two tiles and return True if the unit would rather move to the new one
+
+        """
+        prev_x, prev_y = divmod(prev_tile, ARENA_SIZE)
+        new_x, new_y = divmod(new_tile, ARENA_SIZE)
+        best_x, best_y = divmod(prev_best, ARENA_SIZE)
+        if previous_move_direction == self.HORIZONTAL and not new_x == best_x:
+            return not prev_y == new_y
+        if previous_move_direction == self.VERTICAL and not new_y == best_y:
+            return not prev_x == new_x
+        if previous_move_direction == 0:
+            return not prev_y == new_y
+
+        if new_y == best_y:
+            return (direction[0] == 1 and new_x > best_x) or (direction[0] == -1 and new_x < best_x)
+        if new_x == best_x:
+            return (direction[1] == 1 and new_y > best_y) or (direction[1] == -1 and new_y < best_y)
+        return True
+
+    def print_map(self):
+        """Prints an ASCII version of the current game map for debug purposes
+
+        """
+        if not self.initialized:
+            debug_write("Attempted to print_map before pathfinder initialization. Use 'this_object.initialize_map(game_state)' to initialize the map first")
+            return
+
+        for y in range(ARENA_SIZE):
+            for x in range(ARENA_SIZE):
+                index = x * ARENA_SIZE + ARENA_SIZE - y - 1
+                if not self.blocked[index] and not self.pathlength[index] == -1:
+                    self._print_justified(self.pathlength[index])
+                else:
+                    sys.stderr.write("   ")
+            debug_write("")
+
+    def _print_justified(self, number):
+        """Prints a number between 100 and -10 in 3 spaces
+
+        """
+        if number < 10 and number > -1:
+            sys.stderr.write(" ")
+        sys.stderr.write(str(number))
+        sys.stderr.write(" ")
+
+
+def repair_blocked(pathlength, tile, blocked, sources):
+    """Repairs a pathlength field after tile becomes blocked
+
+    Only the tiles whose every shortest route ran through tile are recomputed.
+
+    Args:
+        * pathlength: The field before the change, it is not modified
+        * tile: The index of the newly blocked tile
+        * blocked: The blocked tiles after the change
+        * sources: The indexes the field measures distance to
+
+    Returns:
+        A new field equal to a full search on the new layout
+    """
+    field = list(pathlength)
+    tile_length = field[tile]
+    field[tile] = 0 if tile in sources else -1
+    if tile_length == -1:
+        return field
+
+    # Walk outwards in order of distance, collecting tiles left without a route of the same length
+    affected = bytearray(len(field))
+    queued = bytearray(len(field))
+    current = deque()
+    for neighbor in NEIGHBORS[tile]:
+        if not blocked[neighbor] and field[neighbor] == tile_length + 1:
+            queued[neighbor] = 1
+            current.append(neighbor)
+    affected_tiles = []
+    while current:
+        location = current.popleft()
+        length = field[location]
+        supported = False
+        for neighbor in NEIGHBORS[location]:
+            if not blocked[neighbor] and not affected[neighbor] and field[neighbor] == length - 1:
+                supported = True
+                break
+        if supported:
+            continue
+        affected[location] = 1
+        affected_tiles.append(location)
+        for neighbor in NEIGHBORS[location]:
+            if not blocked[neighbor] and not queued[neighbor] and field[neighbor] == length + 1:
+                queued[neighbor] = 1
+                current.append(neighbor)
+
+    for location in affected_tiles:
+        field[location] = -1
+    frontier = []
+    for location in affected_tiles:
+        best = -1
+        for neighbor in NEIGHBORS[location]:
+            length = field[neighbor]
+            if length != -1 and not blocked[neighbor] and (best == -1 or length + 1 < best):
+                best = length + 1
+        if best != -1:
+            frontier.append((best, location))
+    heapq.heapify(frontier)
+    while frontier:
+        length, location = heapq.heappop(frontier)
+        if field[location] != -1:
+            continue
+        field[location] = length
+        for neighbor in NEIGHBORS[location]:
+            if affected[neighbor] and field[neighbor] == -1:
+                heapq.heappush(frontier, (length + 1, neighbor))
+    return field
+
+
+def repair_unblocked(pathlength, tile, blocked, sources):
+    """Repairs a pathlength field after tile becomes unblocked
+
+    Args:
+        * pathlength: The field before the change, it is not modified
+        * tile: The index of the newly unblocked tile
+        * blocked: The blocked tiles after the change
+        * sources: The indexes the field measures distance to
+
+    Returns:
+        A new field equal to a full search on the new layout
+    """
+    field = list(pathlength)
+    if tile in sources:
+        field[tile] = 0
+    else:
+        best = -1
+        for neighbor in NEIGHBORS[tile]:
+            length = field[neighbor]
+            if length != -1 and not blocked[neighbor] and (best == -1 or length + 1 < best):
+                best = length + 1
+        field[tile] = best
+        if best == -1:
+            return field
+
+    current = deque([tile])
+    while current:
+        location = current.popleft()
+        next_length = field[location] + 1
+        for neighbor in NEIGHBORS[location]:
+            if blocked[neighbor]:
+                continue
+            length = field[neighbor]
+            if length == -1 or length > next_length:
+                field[neighbor] = next_length
+                current.append(neighbor)
+    return field
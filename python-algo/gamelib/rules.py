@@ -0,0 +1,96 @@
+"""
+Constants derived from a game config.
+
+The unit shorthands, type indices and range tables only depend on the config, so they are
+computed once per config and shared by every GameState, GameMap and GameUnit built with it.
+Nothing here is written after construction, which makes it safe to build states in several
+threads at once, or for configs that differ.
+"""
+
+from .game_map import config_ranges, range_offsets
+from .unit import get_unit_definitions
+from .util import ConfigCache
+
+
+class GameRules:
+    """Holds the constants of a game config
+
+    Attributes :
+        * config (JSON): Contains information about the game
+        * UNIT_TYPE_TO_INDEX (dict): Maps a unit to a corresponding index
+        * WALL (str): A constant representing the wall unit
+        * SUPPORT (str): A constant representing the support unit
+        * TURRET (str): A constant representing the turret unit
+        * SCOUT (str): A constant representing the scout unit
+        * DEMOLISHER (str): A constant representing the demolisher unit
+        * INTERCEPTOR (str): A constant representing the interceptor unit
+        * REMOVE (str): A constant representing removing your own unit
+        * UPGRADE (str): A constant representing upgrading a unit
+        * STRUCTURE_TYPES (tuple): The structure units
+        * ALL_UNITS (tuple): The units that can be spawned
+        * MP (int): A constant representing the Mobile Points resource, used in the get_resource function
+        * SP (int): A constant representing the SP resource, used in the get_resource function
+        * unit_definitions (dict): Maps a unit to its UnitDefinition
+        * get_hit_radius (float): The getHitRadius from the unit information in the config
+        * max_attack_range (float): The longest attack range of any unit, upgrades included
+
+    Use get_rules(config) rather than building a GameRules, so that a config is only processed once.
+
+    """
+    def __init__(self, config):
+        """Reads the constants from a config
+
+        Args:
+            config (JSON): Contains information about the game
+
+        """
+        self.config = config
+        unit_information = config["unitInformation"]
+        self.WALL = unit_information[0]["shorthand"]
+        self.SUPPORT = unit_information[1]["shorthand"]
+        self.TURRET = unit_information[2]["shorthand"]
+        self.SCOUT = unit_information[3]["shorthand"]
+        self.DEMOLISHER = unit_information[4]["shorthand"]
+        self.INTERCEPTOR = unit_information[5]["shorthand"]
+        self.REMOVE = unit_information[6]["shorthand"]
+        self.UPGRADE = unit_information[7]["shorthand"]
+        self.UNIT_TYPE_TO_INDEX = {unit_information[index]["shorthand"]: index for index in range(8)}
+        self.ALL_UNITS = (self.SCOUT, self.DEMOLISHER, self.INTERCEPTOR, self.WALL, self.SUPPORT, self.TURRET)
+        self.STRUCTURE_TYPES = (self.WALL, self.SUPPORT, self.TURRET)
+        self.MP = 1
+        self.SP = 0
+
+        self.unit_definitions = get_unit_definitions(config)
+        self.get_hit_radius = unit_information[0].get("getHitRadius", 0)
+        self.max_attack_range = 0
+        for type_information in unit_information:
+            for values in [type_information, type_information.get("upgrade", {})]:
+                self.max_attack_range = max(self.max_attack_range, values.get("attackRange", 0))
+        for radius in config_ranges(config):
+            range_offsets(radius, self.get_hit_radius)
+
+    def is_stationary(self, unit_type):
+        """
+            Args:
+                unit_type: A unit type
+
+            Returns:
+                Boolean, True if the unit is stationary, False otherwise.
+        """
+        return unit_type in self.STRUCTURE_TYPES
+
+
+# Rules are built once per config, for the few configs used most recently
+_rules = ConfigCache(GameRules)
+
+
+def get_rules(config):
+    """Gets the GameRules of a config, building them the first time the config is seen
+
+    Args:
+        config (JSON): Contains information about the game
+
+    Returns:
+        The GameRules shared by every state using this config
+    """
+    return _rules.get(config)
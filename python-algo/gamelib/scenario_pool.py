@@ -0,0 +1,221 @@
+"""
+Evaluating candidate deployments on several cores.
+
+A ScenarioPool keeps worker processes alive for the whole game. Each turn the board is serialized
+once and sent once to every worker, which builds its Simulator for the turn. Candidates are then
+simulated in the workers with Simulator.run_batch, and only the candidates travel with each chunk:
+
+    def on_game_start(self, config):
+        self.config = config
+        self.scenario_pool = gamelib.ScenarioPool(config)
+
+    def on_turn(self, turn_state):
+        game_state = gamelib.GameState(self.config, turn_state)
+        ...
+        self.scenario_pool.set_board(game_state)
+        results = self.scenario_pool.evaluate(candidates, deadline=time.perf_counter() + 1.0)
+
+Results come back in the order of the candidates. A candidate that could not be simulated before
+the deadline gets None, and one whose simulation was cut short has complete set to False.
+Workers stop simulating at the deadline on their own, and skip chunks that reach them after it,
+so chunks abandoned by one evaluate do not keep the workers busy for the next.
+AlgoCore shuts the pool down when the game ends.
+
+Workers must not write to stdout, which carries the commands sent to the engine, use debug_write.
+"""
+
+import math
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+
+from .game_state import GameState
+from .game_map import ARENA_LOCATION_LIST
+from .simulator import Simulator
+from .unit_table import REMOVE_INDEX, UPGRADE_INDEX
+from .util import debug_write, json_dumps
+
+# Seconds a worker waits for the others to pick up a new board before giving up on the broadcast
+BOARD_BROADCAST_TIMEOUT = 1.0
+
+# Set in each worker process, the config and broadcast barrier once per game and the simulator of the last board seen
+_worker_config = None
+_worker_barrier = None
+_worker_board = None
+
+
+def _initialize_worker(config, barrier):
+    global _worker_config, _worker_barrier
+    _worker_config = config
+    _worker_barrier = barrier
+
+
+def _warm_up():
+    return os.getpid()
+
+
+def _load_board(board_key, board):
+    """Builds the Simulator of a new board in a worker
+
+    Each worker waits for the others first, so a broadcast of one task per worker reaches every worker.
+
+    Returns:
+        False if some worker did not pick up the board in time
+    """
+    try:
+        _worker_barrier.wait(BOARD_BROADCAST_TIMEOUT)
+        reached_all = True
+    except threading.BrokenBarrierError:
+        reached_all = False
+    _set_worker_board(board_key, board)
+    return reached_all
+
+
+def _set_worker_board(board_key, board):
+    global _worker_board
+    if _worker_board is None or _worker_board[0] != board_key:
+        game_state = GameState(_worker_config, board)
+        game_state.suppress_warnings(True)
+        _worker_board = (board_key, Simulator(game_state))
+
+
+def _evaluate(board_key, board, candidates, enemy_spawns, wall_deadline):
+    """Simulates a chunk of candidates in a worker, on the board sent by _load_board or on board if it is given
+    """
+    if wall_deadline is not None and time.time() >= wall_deadline:
+        return [None] * len(candidates)
+    if board is not None:
+        _set_worker_board(board_key, board)
+    elif _worker_board is None or _worker_board[0] != board_key:
+        raise RuntimeError("Worker {} did not receive board {}".format(os.getpid(), board_key))
+    deadline = None
+    if wall_deadline is not None:
+        deadline = time.perf_counter() + wall_deadline - time.time()
+    return _worker_board[1].run_batch(candidates, enemy_spawns, deadline)
+
+
+def serialize_board(game_state):
+    """Serializes the structures and stats of a GameState in the engine's format, without mobile units
+
+    Upgrades and removal marks are kept, as the engine sends them.
+
+    Args:
+        game_state: The GameState to serialize, including structures placed with attempt_spawn
+
+    Returns:
+        A json string GameState can be built from
+    """
+    units = [[[] for _ in game_state.config["unitInformation"]], [[] for _ in game_state.config["unitInformation"]]]
+    game_map = game_state.game_map
+    for x, y in ARENA_LOCATION_LIST:
+        for unit in game_map._peek(x, y):
+            if not unit.stationary:
+                continue
+            units[unit.player_index][unit.definition.type_index].append([x, y, unit.health, ""])
+            if unit.upgraded:
+                units[unit.player_index][UPGRADE_INDEX].append([x, y, 0, ""])
+            if unit.pending_removal:
+                units[unit.player_index][REMOVE_INDEX].append([x, y, 0, ""])
+    stats = []
+    for player_index, (health, time_taken) in enumerate([(game_state.my_health, game_state.my_time), (game_state.enemy_health, game_state.enemy_time)]):
+        resources = game_state.get_resources(player_index)
+        stats.append([health, resources[0], resources[1], time_taken])
+    return json_dumps({"turnInfo": [0, game_state.turn_number, -1], "p1Stats": stats[0], "p2Stats": stats[1],
+                       "p1Units": units[0], "p2Units": units[1]})
+
+
+class ScenarioPool:
+    """Worker processes simulating candidate deployments in parallel
+
+    Attributes :
+        * workers (int): The number of worker processes
+        * margin (float): Seconds the workers stop before the deadline, to send their results back in time
+        * board (str): The board set with set_board, as serialized by serialize_board
+
+    """
+    def __init__(self, config, workers=None, margin=0.05):
+        """Starts the worker processes and waits for them to be ready
+
+        Args:
+            config (JSON): Contains information about the game, sent to each worker once
+            workers: The number of worker processes, one less than the number of cores if None
+            margin: Seconds the workers stop before the deadline
+
+        """
+        self.workers = workers if workers is not None else max(1, (os.cpu_count() or 2) - 1)
+        self.margin = margin
+        self.board = None
+        self.__board_key = 0
+        # True when the last broadcast missed a worker, chunks then carry the board themselves
+        self.__attach_board = False
+        self.__barrier = multiprocessing.Barrier(self.workers)
+        self.__executor = ProcessPoolExecutor(self.workers, initializer=_initialize_worker, initargs=(config, self.__barrier))
+        # Starting processes takes a while, do it now rather than during the first turn
+        for future in [self.__executor.submit(_warm_up) for _ in range(self.workers)]:
+            future.result()
+
+    def set_board(self, game_state):
+        """Sets the board candidates are evaluated on, usually once per turn after planning structures
+
+        The board is sent to every worker once, and each builds its Simulator, before this returns.
+        A worker still busy with a chunk past BOARD_BROADCAST_TIMEOUT misses the broadcast, and the
+        chunks of this board are then sent with the board attached.
+
+        Args:
+            game_state: The GameState whose structures are simulated against
+        """
+        self.board = serialize_board(game_state)
+        self.__board_key += 1
+        self.__barrier.reset()
+        broadcast = [self.__executor.submit(_load_board, self.__board_key, self.board) for _ in range(self.workers)]
+        self.__attach_board = not all([future.result() for future in broadcast])
+
+    def evaluate(self, candidates, enemy_spawns=(), deadline=None, chunk_size=None):
+        """Simulates candidate deployments on the board in the worker processes
+
+        Args:
+            candidates: A list of spawn lists, in the format of Simulator.run
+            enemy_spawns: The enemy's mobile units, the same for every candidate
+            deadline: A time.perf_counter() value by which to return, or None to wait for every candidate
+            chunk_size: The number of candidates sent to a worker at once. Smaller chunks spread
+                the work more evenly and lose less when the deadline passes, larger ones cost less overhead.
+
+        Returns:
+            A list with the SimulationResult of each candidate, or None for candidates not simulated in time
+        """
+        if self.board is None:
+            raise ValueError("set_board must be called before evaluate")
+        if not candidates:
+            return []
+        if chunk_size is None:
+            chunk_size = max(1, math.ceil(len(candidates) / (self.workers * 4)))
+        wall_deadline = None
+        timeout = None
+        if deadline is not None:
+            timeout = max(0, deadline - time.perf_counter())
+            wall_deadline = time.time() + timeout - self.margin
+
+        chunks = {}
+        for start in range(0, len(candidates), chunk_size):
+            future = self.__executor.submit(_evaluate, self.__board_key, self.board if self.__attach_board else None,
+                                            candidates[start:start + chunk_size], list(enemy_spawns), wall_deadline)
+            chunks[future] = start
+        done, not_done = wait(chunks, timeout)
+
+        results = [None] * len(candidates)
+        for future in not_done:
+            future.cancel()
+        for future in done:
+            if future.exception() is not None:
+                debug_write("Scenario evaluation failed: {}".format(future.exception()))
+                continue
+            start = chunks[future]
+            results[start:start + chunk_size] = future.result()
+        return results
+
+    def shutdown(self):
+        """Stops the worker processes without waiting for running simulations
+        """
+        self.__executor.shutdown(wait=False, cancel_futures=True)
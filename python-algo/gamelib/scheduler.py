@@ -0,0 +1,160 @@
+"""
+Planning a turn against the engine's time limit.
+
+The engine expects the build and deploy commands within waitTimeBotSoft milliseconds, from the
+config's timingAndReplay, and penalizes slower algos. A TurnScheduler runs planning stages one
+after another, each with its own budget, and submits the best plan found before that limit:
+
+    scheduler = gamelib.TurnScheduler(self.config)
+    scheduler.add_stage("defence", self.plan_defence, budget=0.5)
+    scheduler.add_stage("attack", self.search_attacks, budget=2.0)
+    scheduler.run(game_state)
+    gamelib.debug_write(scheduler.report())
+
+A stage is called as stage(plan, scheduler), where plan is a fork of the best plan so far, and
+returns the GameState to keep, or None to keep the previous one. A stage that searches for as
+long as it is allowed to can be a generator instead, yielding better and better plans. It is
+stopped between two yields once its budget is spent, and the last plan it yielded is kept. Each
+yielded plan is forked as it is accepted, so the stage may keep changing the plan it yielded.
+
+The scheduler can only check the time between stages and between yields, it can not interrupt
+them. A stage that is not a generator, or a generator slow to reach its first or next yield, can
+overrun its budget and the soft limit. Such stages should check stage_time_left themselves.
+"""
+
+import time
+import traceback
+
+from .util import debug_write
+
+
+class StageTiming:
+    """How a stage used its budget during the last run
+
+    Attributes :
+        * name (str): The name of the stage
+        * budget (float): The seconds the stage was allowed, after clamping to the time left in the turn
+        * elapsed (float): The seconds the stage took
+        * plans (int): The number of plans the stage returned or yielded
+        * stopped (bool): True if a generator stage was stopped before it finished
+        * failed (bool): True if the stage raised an exception
+
+    """
+    def __init__(self, name, budget):
+        self.name = name
+        self.budget = budget
+        self.elapsed = 0
+        self.plans = 0
+        self.stopped = False
+        self.failed = False
+
+    def __repr__(self):
+        return "StageTiming({}, {:.1f}ms of {:.1f}ms)".format(self.name, self.elapsed * 1000, self.budget * 1000)
+
+
+class TurnScheduler:
+    """Runs planning stages with per stage budgets and submits the best plan before the soft time limit
+
+    Attributes :
+        * soft_limit (float): Seconds the engine allows for a turn before penalizing, from waitTimeBotSoft
+        * margin (float): Seconds kept free before the soft limit, for submitting and communication
+        * stages (list): The (name, stage, budget) of each registered stage, in order
+        * timings (list): The StageTiming of each stage that ran during the last run
+        * deadline (float): The time.perf_counter() value by which the last run submits its plan
+
+    """
+    def __init__(self, config, margin=0.25):
+        """Reads the time limit from a game config
+
+        Args:
+            config (JSON): Contains information about the game
+            margin: Seconds to keep free before the soft limit
+
+        """
+        self.soft_limit = config.get("timingAndReplay", {}).get("waitTimeBotSoft", 5000) / 1000
+        self.margin = margin
+        self.stages = []
+        self.timings = []
+        self.deadline = None
+        self.__stage_deadline = None
+
+    def add_stage(self, name, stage, budget=None):
+        """Registers a stage, stages run in the order they are added
+
+        Args:
+            name: A name for the stage, used in the timings
+            stage: A function or generator function called as stage(plan, scheduler)
+            budget: Seconds the stage may use. If None, the stage may use all the time left in the turn.
+
+        """
+        self.stages.append((name, stage, budget))
+
+    def time_left(self):
+        """Seconds left before the plan has to be submitted
+        """
+        return self.deadline - time.perf_counter()
+
+    def stage_time_left(self):
+        """Seconds left for the running stage. Stages that are not generators should check this to return in time.
+        """
+        return self.__stage_deadline - time.perf_counter()
+
+    def run(self, game_state, started=None, submit=True):
+        """Runs every stage and submits the best plan
+
+        Stages that no longer have time left are skipped, and a stage raising an exception
+        is reported with debug_write and ignored, so a plan is always submitted.
+
+        Args:
+            game_state: The GameState of this turn
+            started: The time.perf_counter() value when the turn state was received, now if None
+            submit: If False, the plan is returned without calling submit_turn
+
+        Returns:
+            The GameState of the plan submitted
+        """
+        if started is None:
+            started = time.perf_counter()
+        self.deadline = started + self.soft_limit - self.margin
+        self.timings = []
+        best = game_state
+        for name, stage, budget in self.stages:
+            time_left = self.time_left()
+            if time_left <= 0:
+                break
+            timing = StageTiming(name, time_left if budget is None else min(budget, time_left))
+            self.timings.append(timing)
+            stage_started = time.perf_counter()
+            self.__stage_deadline = stage_started + timing.budget
+            try:
+                result = stage(best.fork(), self)
+                if hasattr(result, "send"):
+                    for plan in result:
+                        if plan is not None:
+                            # The stage may go on changing the plan it yielded
+                            best = plan.fork()
+                            timing.plans += 1
+                        if self.stage_time_left() <= 0:
+                            timing.stopped = True
+                            result.close()
+                            break
+                elif result is not None:
+                    best = result
+                    timing.plans += 1
+            except Exception:
+                debug_write("Stage {} failed:\n{}".format(name, traceback.format_exc()))
+                timing.failed = True
+            timing.elapsed = time.perf_counter() - stage_started
+        if submit:
+            best.submit_turn()
+        return best
+
+    def report(self):
+        """Describes the timings of the last run, one line per stage
+        """
+        lines = []
+        for timing in self.timings:
+            status = "failed" if timing.failed else "stopped" if timing.stopped else "done"
+            lines.append("{:<20} {:>9.1f}ms of {:>9.1f}ms, {} plans, {}".format(
+                timing.name, timing.elapsed * 1000, timing.budget * 1000, timing.plans, status))
+        return "\n".join(lines)
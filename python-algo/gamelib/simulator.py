@@ -0,0 +1,495 @@
+"""
+Frame by frame simulation of the action phase.
+
+A Simulator reads the structures of a GameState once, then plays out deployments against them
+without touching the state:
+
+    simulator = Simulator(game_state)
+    result = simulator.run([(SCOUT, 13, 0)] * 5 + [(DEMOLISHER, 14, 0)])
+    result.breaches[0], result.structure_damage[0], result.destroyed[1]
+
+Spawns use the same (unit_type, x, y) entries as GameState's deploy stack, one entry per unit.
+Each frame follows the engine's order of operations:
+
+    1. Supports shield friendly mobile units in range, each support shields a unit once
+    2. Mobile units move along their path once every 1/speed frames. A unit reaching its target
+       edge breaches, a unit with nowhere left to go self destructs
+    3. Structures, then mobile units, attack the target GameState.get_target would choose
+    4. Destroyed units are removed, and mobile units find new paths if a structure was destroyed
+
+Paths are cached by board, tile and target edge and shared by every run of a Simulator, and
+in range checks use stencils precomputed for each structure, so one run of a few dozen units
+takes milliseconds. Use run_batch to compare many candidate deployments under a deadline.
+
+To follow a simulation frame by frame, start a Scenario and step it until step returns False:
+
+    scenario = simulator.start(spawns, enemy_spawns)
+    while simulator.step(scenario):
+        scenario.mobile_units()
+"""
+
+import time
+
+from .game_map import ARENA_SIZE, HALF_ARENA, ARENA_LOCATION_LIST, locations_in_range
+from .navigation import FlatShortestPathFinder
+
+
+class SimulationResult:
+    """What happened during a simulated action phase, indexed by player, 0 for you 1 for the enemy
+
+    Attributes :
+        * breaches ([list, list]): The [x, y] locations where each player's units scored
+        * breach_damage ([float, float]): The health each player's breaches removed from the opponent
+        * structure_damage ([float, float]): The damage each player's units dealt to enemy structures
+        * destroyed ([list, list]): The (unit_type, x, y) of each player's structures that were destroyed
+        * frames (int): The number of frames simulated
+        * complete (bool): False if the simulation stopped while mobile units remained, at max_frames or a deadline
+
+    """
+    def __init__(self):
+        self.breaches = [[], []]
+        self.breach_damage = [0, 0]
+        self.structure_damage = [0, 0]
+        self.destroyed = [[], []]
+        self.frames = 0
+        self.complete = True
+
+    def __repr__(self):
+        return "SimulationResult(breaches: {}, structure damage: {}, destroyed: {}, frames: {})".format(
+            [len(breaches) for breaches in self.breaches], self.structure_damage, [len(destroyed) for destroyed in self.destroyed], self.frames)
+
+
+class _UnitStats:
+    """The stats of a unit type the simulation needs, read once per UnitDefinition
+    """
+    __slots__ = ("unit_type", "stationary", "damage_f", "damage_i", "attack_range", "attack_reach", "shield_range",
+                 "shield_per_unit", "shield_bonus_per_y", "move_period", "breach_damage",
+                 "self_destruct_f", "self_destruct_i", "self_destruct_range", "self_destruct_reach", "self_destruct_steps")
+
+    def __init__(self, definition, get_hit_radius):
+        type_config = definition.config["unitInformation"][definition.type_index]
+        self.unit_type = definition.unit_type
+        self.stationary = definition.stationary
+        self.damage_f = definition.damage_f
+        self.damage_i = definition.damage_i
+        self.attack_range = definition.attackRange
+        self.attack_reach = (definition.attackRange + get_hit_radius) ** 2
+        self.shield_range = definition.shieldRange
+        self.shield_per_unit = definition.shieldPerUnit
+        self.shield_bonus_per_y = definition.shieldBonusPerY
+        self.move_period = max(1, round(1 / definition.speed)) if definition.speed > 0 else 1
+        self.breach_damage = type_config.get("playerBreachDamage", 1)
+        self.self_destruct_f = type_config.get("selfDestructDamageTower", 0)
+        self.self_destruct_i = type_config.get("selfDestructDamageWalker", 0)
+        self.self_destruct_range = type_config.get("selfDestructRange", 0)
+        self.self_destruct_reach = (self.self_destruct_range + get_hit_radius) ** 2
+        self.self_destruct_steps = type_config.get("selfDestructStepsRequired", 0)
+
+
+class _SimUnit:
+    """A unit during a simulation. Mobile units also track their path and movement.
+
+    index is the position of a structure in the scenario, or of a mobile unit in its player's spawns.
+    """
+    __slots__ = ("stats", "player_index", "x", "y", "health", "index", "shield_amount",
+                 "move_timer", "steps", "path", "path_index", "edge", "shielded")
+
+    def __init__(self, stats, player_index, x, y, health, index=-1):
+        self.stats = stats
+        self.player_index = player_index
+        self.x = x
+        self.y = y
+        self.health = health
+        self.index = index
+        self.shield_amount = 0
+        self.move_timer = 0
+        self.steps = 0
+        self.path = None
+        self.path_index = 0
+        self.edge = None
+        self.shielded = 0
+
+    def copy(self):
+        unit = _SimUnit(self.stats, self.player_index, self.x, self.y, self.health, self.index)
+        unit.shield_amount = self.shield_amount
+        return unit
+
+
+class Scenario:
+    """The units and board of one simulation in progress, created by Simulator.start
+
+    Attributes :
+        * frame (int): The number of frames simulated so far
+        * result (:obj: SimulationResult): What happened so far
+
+    """
+    __slots__ = ("structures", "structure_at", "blocked_mask", "mobiles", "result", "frame", "hit")
+
+    def __init__(self):
+        self.structures = None
+        self.structure_at = None
+        self.blocked_mask = 0
+        self.mobiles = None
+        self.result = None
+        self.frame = 0
+        # Structures damaged this frame, the only ones that can be destroyed at the end of it
+        self.hit = []
+
+    def mobile_units(self):
+        """Gets the mobile units still on the board
+
+        Returns:
+            A dict mapping (player_index, spawn_index) to (x, y, health), where spawn_index is the
+            position of the unit in the spawns passed to Simulator.start. Spawns that were skipped,
+            and units that breached, self destructed or were destroyed, are left out.
+        """
+        return {(unit.player_index, unit.index): (unit.x, unit.y, unit.health) for unit in self.mobiles if unit.health > 0}
+
+
+class Simulator:
+    """Plays out deployments against the structures of a GameState
+
+    Attributes :
+        * game_state (:obj: GameState): The state the structures were read from. It is never modified.
+        * max_frames (int): Simulations stop after this many frames even if mobile units remain
+        * path_cache_size (int): The number of paths kept before the path cache is cleared
+
+    """
+    def __init__(self, game_state, max_frames=500, path_cache_size=8192):
+        """Reads the structures of a GameState and precomputes their ranges
+
+        Args:
+            game_state: The GameState to simulate on, usually after planning this turn's structures
+            max_frames: The number of frames after which a simulation stops
+            path_cache_size: The number of paths kept before the path cache is cleared
+
+        """
+        self.game_state = game_state
+        self.max_frames = max_frames
+        self.path_cache_size = path_cache_size
+        self.__paths = {}
+        self.__blocked_mask = game_state.game_map.get_blocked_mask()
+        self.__get_hit_radius = game_state.rules.get_hit_radius
+        self.__stats = {}
+        self.__path_finder = FlatShortestPathFinder()
+        self.__edges = game_state.game_map.get_edges()
+        self.__edge_tiles = [frozenset(x * ARENA_SIZE + y for x, y in edge) for edge in self.__edges]
+
+        # Structures are stored once, each run copies their health. Coverage maps a tile to the structures
+        # reaching it, turret_coverage[p] for those attacking player p's units and shield_coverage[p] for those shielding them
+        self.__structures = []
+        self.__structure_at = {}
+        self.__turret_coverage = [{}, {}]
+        self.__shield_coverage = [{}, {}]
+        game_map = game_state.game_map
+        for x, y in ARENA_LOCATION_LIST:
+            for unit in game_map._peek(x, y):
+                if not unit.stationary:
+                    continue
+                stats = self._get_stats(unit.definition)
+                index = len(self.__structures)
+                structure = _SimUnit(stats, unit.player_index, x, y, unit.health, index)
+                if stats.shield_per_unit + stats.shield_bonus_per_y > 0:
+                    rows_from_edge = y if unit.player_index == 0 else ARENA_SIZE - 1 - y
+                    structure.shield_amount = stats.shield_per_unit + stats.shield_bonus_per_y * rows_from_edge
+                    for i, j in locations_in_range(x, y, stats.shield_range, self.__get_hit_radius):
+                        self.__shield_coverage[unit.player_index].setdefault(i * ARENA_SIZE + j, []).append(index)
+                if stats.damage_i > 0:
+                    for i, j in locations_in_range(x, y, stats.attack_range, self.__get_hit_radius):
+                        self.__turret_coverage[1 - unit.player_index].setdefault(i * ARENA_SIZE + j, []).append(index)
+                self.__structures.append(structure)
+                self.__structure_at[x * ARENA_SIZE + y] = index
+
+    def _get_stats(self, definition):
+        stats = self.__stats.get(definition)
+        if stats is None:
+            stats = self.__stats[definition] = _UnitStats(definition, self.__get_hit_radius)
+        return stats
+
+    def run(self, spawns, enemy_spawns=()):
+        """Simulates an action phase
+
+        Args:
+            spawns: Your mobile units, as a list of (unit_type, x, y), one entry per unit
+            enemy_spawns: The enemy's mobile units, in the same format
+
+        Returns:
+            A SimulationResult
+        """
+        scenario = self.start(spawns, enemy_spawns)
+        while self.step(scenario):
+            pass
+        return scenario.result
+
+    def run_batch(self, candidates, enemy_spawns=(), deadline=None):
+        """Simulates several candidate deployments in lockstep, one frame of each at a time
+
+        The paths missing after each frame are found together for every candidate, with one call to the
+        pathfinder per board. All candidates start on the same board, so their first paths share one
+        search, and candidates destroying the same structure share the search of the board it leaves.
+        Stepping in lockstep also keeps every candidate at the same frame when the deadline passes, so
+        the partial results are comparable with each other, where a loop over run would leave the last
+        candidates not simulated at all.
+
+        Args:
+            candidates: A list of spawn lists, each in the format of run's spawns
+            enemy_spawns: The enemy's mobile units, the same for every candidate
+            deadline: A time.perf_counter() value after which no more frames are simulated, or None
+
+        Returns:
+            A list with the SimulationResult of each candidate. Candidates stopped by the deadline have complete set to False.
+        """
+        scenarios = [self.__start(spawns, enemy_spawns) for spawns in candidates]
+        self.__find_paths(scenarios)
+        active = scenarios
+        while active:
+            if deadline is not None and time.perf_counter() >= deadline:
+                for scenario in active:
+                    scenario.result.frames = scenario.frame
+                    scenario.result.complete = False
+                break
+            still_active = []
+            repath = []
+            for scenario in active:
+                more, destroyed = self.__advance(scenario)
+                if more:
+                    still_active.append(scenario)
+                    if destroyed and scenario.mobiles:
+                        repath.append(scenario)
+            self.__find_paths(repath)
+            active = still_active
+        return [scenario.result for scenario in scenarios]
+
+    def start(self, spawns, enemy_spawns=()):
+        """Sets up a scenario at frame 0, to step through one frame at a time with step
+
+        Spawns on a tile holding a structure are skipped, as the engine would refuse them.
+
+        Args:
+            spawns: Your mobile units, as a list of (unit_type, x, y), one entry per unit
+            enemy_spawns: The enemy's mobile units, in the same format
+
+        Returns:
+            A Scenario with fresh copies of the structures, and paths for the spawned units
+        """
+        scenario = self.__start(spawns, enemy_spawns)
+        self.__find_paths([scenario])
+        return scenario
+
+    def __start(self, spawns, enemy_spawns):
+        """Sets up a scenario at frame 0, without finding the paths of its units
+        """
+        scenario = Scenario()
+        scenario.result = SimulationResult()
+        scenario.structures = [base.copy() for base in self.__structures]
+        scenario.structure_at = dict(self.__structure_at)
+        scenario.blocked_mask = self.__blocked_mask
+
+        mobiles = []
+        definitions = self.game_state.rules.unit_definitions
+        for player_index, player_spawns in [(0, spawns), (1, enemy_spawns)]:
+            for spawn_index, (unit_type, x, y) in enumerate(player_spawns):
+                if x * ARENA_SIZE + y in scenario.structure_at:
+                    continue
+                unit = _SimUnit(self._get_stats(definitions[unit_type]), player_index, x, y, definitions[unit_type].max_health, spawn_index)
+                unit.edge = self.game_state.get_target_edge([x, y])
+                mobiles.append(unit)
+        scenario.mobiles = mobiles
+        return scenario
+
+    def step(self, scenario):
+        """Simulates the next frame of a scenario created by start
+
+        Returns:
+            True if the scenario has more frames to simulate
+        """
+        more, destroyed = self.__advance(scenario)
+        if destroyed and scenario.mobiles:
+            self.__find_paths([scenario])
+        return more
+
+    def __advance(self, scenario):
+        """Simulates the next frame of a scenario, leaving its units on their old paths
+
+        Returns:
+            True if the scenario has more frames to simulate, and True if a structure was destroyed
+        """
+        if not scenario.mobiles or scenario.frame >= self.max_frames:
+            scenario.result.frames = scenario.frame
+            scenario.result.complete = not scenario.mobiles
+            return False, False
+        scenario.frame += 1
+        self.__shield(scenario)
+        self.__move(scenario)
+        self.__attack(scenario)
+
+        scenario.mobiles = [unit for unit in scenario.mobiles if unit.health > 0]
+        destroyed = False
+        for structure in scenario.hit:
+            tile = structure.x * ARENA_SIZE + structure.y
+            if structure.health <= 0 and tile in scenario.structure_at:
+                del scenario.structure_at[tile]
+                scenario.blocked_mask &= ~(1 << tile)
+                scenario.result.destroyed[structure.player_index].append((structure.stats.unit_type, structure.x, structure.y))
+                destroyed = True
+        scenario.hit = []
+        return True, destroyed
+
+    def __find_paths(self, scenarios):
+        """Gives each mobile unit the path from its location to its target edge on its scenario's board
+
+        Paths are cached by board, tile and edge, only the missing ones are computed, with one call to the
+        pathfinder for each board they are missing on.
+        """
+        paths = self.__paths
+        if len(paths) > self.path_cache_size:
+            paths.clear()
+        # Maps each board to its scenario and the units missing a path on it, by key
+        missing = {}
+        for scenario in scenarios:
+            for unit in scenario.mobiles:
+                key = (scenario.blocked_mask, unit.x * ARENA_SIZE + unit.y, unit.edge)
+                path = paths.get(key)
+                if path is None:
+                    board = missing.get(scenario.blocked_mask)
+                    if board is None:
+                        board = missing[scenario.blocked_mask] = (scenario, {})
+                    board[1].setdefault(key, []).append(unit)
+                else:
+                    unit.path = path
+                    unit.path_index = 0
+
+        for scenario, units in missing.values():
+            state = self.__board_state(scenario)
+            keys = list(units)
+            locations = [list(divmod(tile, ARENA_SIZE)) for _, tile, _ in keys]
+            found = self.__path_finder.navigate_from_locations(locations, [self.__edges[edge] for _, _, edge in keys], state)
+            for key, path in zip(keys, found):
+                path = [x * ARENA_SIZE + y for x, y in path] if path is not None else [key[1]]
+                paths[key] = path
+                for unit in units[key]:
+                    unit.path = path
+                    unit.path_index = 0
+
+    def __board_state(self, scenario):
+        """Gets a fork of the game state whose structures match the scenario's board, for the pathfinder
+        """
+        state = self.game_state.fork()
+        removed = self.__blocked_mask & ~scenario.blocked_mask
+        while removed:
+            lowest = removed & -removed
+            state.game_map.remove_unit(list(divmod(lowest.bit_length() - 1, ARENA_SIZE)))
+            removed ^= lowest
+        return state
+
+    def __shield(self, scenario):
+        shield_coverage = self.__shield_coverage
+        structures = scenario.structures
+        for unit in scenario.mobiles:
+            for index in shield_coverage[unit.player_index].get(unit.x * ARENA_SIZE + unit.y, ()):
+                support = structures[index]
+                if support.health > 0 and not unit.shielded >> index & 1:
+                    unit.shielded |= 1 << index
+                    unit.health += support.shield_amount
+
+    def __move(self, scenario):
+        result = scenario.result
+        for unit in scenario.mobiles:
+            if unit.health <= 0:
+                continue
+            stats = unit.stats
+            unit.move_timer += 1
+            if unit.move_timer < stats.move_period:
+                continue
+            unit.move_timer = 0
+            if unit.path_index + 1 < len(unit.path):
+                unit.path_index += 1
+                tile = unit.path[unit.path_index]
+                unit.x, unit.y = divmod(tile, ARENA_SIZE)
+                unit.steps += 1
+                if tile in self.__edge_tiles[unit.edge]:
+                    result.breaches[unit.player_index].append([unit.x, unit.y])
+                    result.breach_damage[unit.player_index] += stats.breach_damage
+                    unit.health = 0
+            else:
+                self.__self_destruct(unit, scenario)
+
+    def __self_destruct(self, unit, scenario):
+        stats = unit.stats
+        structures = scenario.structures
+        structure_at = scenario.structure_at
+        unit.health = 0
+        if unit.steps < stats.self_destruct_steps:
+            return
+        if stats.self_destruct_f > 0:
+            for i, j in locations_in_range(unit.x, unit.y, stats.self_destruct_range, self.__get_hit_radius):
+                index = structure_at.get(i * ARENA_SIZE + j)
+                if index is not None:
+                    self.__damage(unit, structures[index], stats.self_destruct_f, scenario)
+        if stats.self_destruct_i > 0:
+            for other in scenario.mobiles:
+                if other.player_index != unit.player_index and other.health > 0 and (other.x - unit.x) ** 2 + (other.y - unit.y) ** 2 < stats.self_destruct_reach:
+                    other.health -= stats.self_destruct_i
+
+    def __attack(self, scenario):
+        # Each structure only considers the units standing on a tile it covers
+        turret_coverage = self.__turret_coverage
+        mobiles = scenario.mobiles
+        structures = scenario.structures
+        structure_at = scenario.structure_at
+        candidates = {}
+        for unit in mobiles:
+            if unit.health <= 0:
+                continue
+            for index in turret_coverage[unit.player_index].get(unit.x * ARENA_SIZE + unit.y, ()):
+                if index in candidates:
+                    candidates[index].append(unit)
+                else:
+                    candidates[index] = [unit]
+        for index in sorted(candidates):
+            turret = structures[index]
+            if turret.health <= 0:
+                continue
+            target = self.__choose_target(turret, [unit for unit in candidates[index] if unit.health > 0])
+            if target is not None:
+                target.health -= turret.stats.damage_i
+
+        for attacker in mobiles:
+            if attacker.health <= 0:
+                continue
+            stats = attacker.stats
+            in_range = []
+            if stats.damage_i > 0:
+                in_range = [unit for unit in mobiles if unit.player_index != attacker.player_index and unit.health > 0
+                            and (unit.x - attacker.x) ** 2 + (unit.y - attacker.y) ** 2 < stats.attack_reach]
+            if in_range:
+                target = self.__choose_target(attacker, in_range)
+                target.health -= stats.damage_i
+            elif stats.damage_f > 0:
+                # Mobile targets always come first, so structures are only looked up when none is in range
+                for i, j in locations_in_range(attacker.x, attacker.y, stats.attack_range, self.__get_hit_radius):
+                    index = structure_at.get(i * ARENA_SIZE + j)
+                    if index is not None and structures[index].player_index != attacker.player_index and structures[index].health > 0:
+                        in_range.append(structures[index])
+                target = self.__choose_target(attacker, in_range)
+                if target is not None:
+                    self.__damage(attacker, target, stats.damage_f, scenario)
+
+    def __choose_target(self, attacker, units):
+        """Picks the target GameState.get_target would, among units of a single kind, mobile or structure
+        """
+        target = None
+        best = None
+        for unit in units:
+            # Nearest, then lowest health, then closest to the attacker's edge, then furthest from the middle column
+            key = ((unit.x - attacker.x) ** 2 + (unit.y - attacker.y) ** 2, unit.health,
+                   unit.y if attacker.player_index == 0 else -unit.y, -abs(HALF_ARENA - 0.5 - unit.x))
+            if best is None or key < best:
+                best = key
+                target = unit
+        return target
+
+    def __damage(self, attacker, structure, damage, scenario):
+        scenario.result.structure_damage[attacker.player_index] += min(damage, max(structure.health, 0))
+        structure.health -= damage
+        scenario.hit.append(structure)
@@ -1,7 +1,26 @@
 import unittest
+import copy
+import pickle
 import json
+import random
+import threading
+import time
+from unittest import mock
 from .game_state import GameState
 from .unit import GameUnit
+from .game_map import GameMap
+from .algocore import AlgoCore
+from . import bitboard
+from . import game_map
+from . import rules
+from . import unit
+from . import scenario_pool
+from . import util
+from .background import BackgroundPlanner
+from .scheduler import TurnScheduler
+from .navigation import FlatShortestPathFinder
+from .simulator import Simulator
+from .scenario_pool import ScenarioPool, serialize_board
 
 class BasicTests(unittest.TestCase):
 
@@ -225,6 +244,18 @@ class BasicTests(unittest.TestCase):
         self.assertEqual(0, len(game.game_map.get_locations_in_range([-500,-500], 10)), "Invalid tiles are being marked as in range")
         self.assertEqual(1, len(game.game_map.get_locations_in_range([13,13], 0)), "A location should be in range of itself")
     
+    def test_arena_bounds(self):
+        game = self.make_turn_0_map()
+        locations = [location for location in game.game_map]
+        self.assertEqual(420, len(locations), "The arena should have 420 tiles")
+        self.assertEqual([[13, 0], [14, 0], [12, 1]], locations[:3], "Iteration should start at the bottom row")
+        self.assertEqual([14, 27], locations[-1], "Iteration should end at the top row")
+        self.assertTrue(game.game_map.in_arena_bounds([0, 13]), "[0, 13] is on the left corner")
+        self.assertFalse(game.game_map.in_arena_bounds([0, 12]), "[0, 12] is off the board")
+        self.assertFalse(game.game_map.in_arena_bounds([-1, 14]), "Negative coordinates are off the board")
+        game.game_map.add_unit("FF", [0, 13])
+        self.assertIs(game.game_map[0, 13], game.game_map.get_unchecked(0, 13), "get_unchecked should return the same list")
+
     def test_get_units(self):
         game = self.make_turn_0_map()
         self.assertEqual(0, len(game.game_map[13,13]), "There should not be a unit on this location")
@@ -240,6 +271,21 @@ class BasicTests(unittest.TestCase):
         self.assertEqual(1, len(game.game_map.get_locations_in_range([13,13], 0)), "We should be in 0 range of ourself")
         self.assertEqual(37, len(game.game_map.get_locations_in_range([13,13], 3.5)), "Wrong number of tiles in range")
 
+    def test_range_cache_follows_config(self):
+        game = self.make_turn_0_map()
+        self.assertEqual(5, len(game.game_map.get_locations_in_range([13, 13], 1)), "Range 1 should only reach the 4 neighbors")
+        config = json.loads(json.dumps(game.config))
+        config["unitInformation"][0]["getHitRadius"] = 0.5
+        self.assertEqual(9, len(GameMap(config).get_locations_in_range([13, 13], 1)), "A larger getHitRadius should reach the diagonals")
+        self.assertEqual(5, len(game.game_map.get_locations_in_range([13, 13], 1)), "Configs should not share cached ranges")
+
+    def test_range_cache_is_bounded(self):
+        game = self.make_turn_0_map()
+        for step in range(1000):
+            game.game_map.get_locations_in_range([13, 13], 1 + step / 1000)
+        self.assertLessEqual(game_map.range_offsets.cache_info().currsize, game_map.RANGE_OFFSETS_CACHE_SIZE, "Computed radii should not grow the cache without limit")
+        self.assertEqual(37, len(game.game_map.get_locations_in_range([13, 13], 3.5)), "Evicted ranges should be computed again")
+
     def _test_get_attackers(self):
         game = self.make_turn_0_map()
         
@@ -256,6 +302,703 @@ class BasicTests(unittest.TestCase):
         game.game_map.add_unit("DF", [14,14], 1)
         self.assertEqual(3, len(game.get_attackers([13,13], 0)), "We should be in danger from 3 places")
 
+    def test_flat_pathfinder_matches_default(self):
+        rng = random.Random(2022)
+        for wall_count in [0, 40, 100, 150, 220]:
+            game = self.make_turn_0_map()
+            locations = [location for location in game.game_map]
+            for location in rng.sample(locations, wall_count):
+                game.game_map.add_unit("FF", location, 0 if location[1] < 14 else 1)
+            edges = game.game_map.get_edges()
+            starts = [location for edge in edges for location in edge if not game.contains_stationary_unit(location)]
+            default_paths = [game.find_path_to_edge(location) for location in starts]
+            game.use_flat_pathfinder()
+            flat_paths = [game.find_path_to_edge(location) for location in starts]
+            self.assertEqual(default_paths, flat_paths, "Flat pathfinder disagrees with the default pathfinder")
+
+    def test_flat_pathfinder_cache(self):
+        game = self.make_turn_0_map()
+        game.use_flat_pathfinder()
+        starts = game.game_map.get_edge_locations(game.game_map.BOTTOM_LEFT) + game.game_map.get_edge_locations(game.game_map.BOTTOM_RIGHT)
+        for location in starts:
+            game.find_path_to_edge(location)
+        self.assertEqual(2, len(game._shortest_path_finder._fields), "Each target edge should need a single field")
+
+        finder = game._shortest_path_finder
+        path = game.find_path_to_edge([13, 0])
+        game.game_map.add_unit("FF", path[3], 0)
+        flat_path = game.find_path_to_edge([13, 0])
+        game.use_flat_pathfinder(False)
+        self.assertEqual(game.find_path_to_edge([13, 0]), flat_path, "Cached field was not invalidated by add_unit")
+        game._shortest_path_finder = finder
+        game.game_map.remove_unit(path[3])
+        self.assertEqual(path, game.find_path_to_edge([13, 0]), "Cached field was not invalidated by remove_unit")
+
+    def test_find_paths_from_edges(self):
+        rng = random.Random(4)
+        game = self.make_turn_0_map()
+        for location in rng.sample([location for location in game.game_map], 90):
+            game.game_map.add_unit("FF", location, 0)
+        paths = game.find_paths_from_edges()
+        starts = [location for edge in game.game_map.get_edges() for location in edge if not game.contains_stationary_unit(location)]
+        self.assertEqual(sorted(map(tuple, starts)), sorted(paths.keys()), "Default locations should be every unblocked edge location")
+        for location in starts:
+            self.assertEqual(game.find_path_to_edge(location), paths[tuple(location)], "Batch path from {} differs".format(location))
+        paths = game.find_paths_from_edges([[13, 0], [14, 0]], game.game_map.TOP_LEFT)
+        self.assertEqual(game.find_path_to_edge([14, 0], game.game_map.TOP_LEFT), paths[(14, 0)], "Batch path ignored target_edge")
+
+    def test_path_with_change(self):
+        rng = random.Random(3)
+        for wall_count in [0, 60, 150, 220]:
+            game = self.make_turn_0_map()
+            locations = [location for location in game.game_map]
+            for location in rng.sample(locations, wall_count):
+                game.game_map.add_unit("FF", location, 0 if location[1] < 14 else 1)
+            starts = [location for location in game.game_map.get_edges()[2] if not game.contains_stationary_unit(location)]
+            for changed in rng.sample(locations, 40):
+                start = rng.choice(starts)
+                predicted = game.find_path_to_edge_with_change(start, changed)
+                if game.contains_stationary_unit(changed):
+                    previous = game.game_map[changed]
+                    game.game_map.remove_unit(changed)
+                    expected = game.find_path_to_edge(start)
+                    game.game_map[tuple(changed)] = previous
+                else:
+                    game.game_map.add_unit("FF", changed, 0)
+                    expected = game.find_path_to_edge(start)
+                    game.game_map.remove_unit(changed)
+                self.assertEqual(expected, predicted, "Repaired path from {} differs after changing {}".format(start, changed))
+
+    def test_bitboards(self):
+        game = self.make_turn_0_map()
+        self.assertEqual(420, bitboard.popcount(bitboard.ARENA), "The arena should have 420 tiles")
+        self.assertEqual(210, bitboard.popcount(bitboard.BOTTOM_HALF), "Each half should have 210 tiles")
+        for edge, locations in zip(bitboard.EDGES, game.game_map.get_edges()):
+            self.assertEqual(sorted(locations), bitboard.to_locations(edge), "Edge masks should match get_edges")
+        self.assertEqual(37, bitboard.popcount(bitboard.range_mask([13, 13], 3.5, 0.01)), "Wrong number of tiles in range")
+        for location, radius, get_hit_radius in [([13, 13], 3.0, 1.1), ([0, 13], 4.5, 0.01), ([13, 0], 2.5, 0.5)]:
+            self.assertEqual(bitboard.from_locations(game_map.locations_in_range(location[0], location[1], radius, get_hit_radius)),
+                             bitboard.range_mask(location, radius, get_hit_radius), "Range masks should match locations_in_range")
+
+        game.game_map.add_unit("FF", [0, 13], 0)
+        game.game_map.add_unit("DF", [1, 13], 0)
+        game.game_map.add_unit("DF", [13, 16], 1)
+        game.game_map.add_unit("SI", [13, 0], 0)
+        planes = bitboard.BoardPlanes(game)
+        self.assertEqual(2, bitboard.popcount(planes.structures[0]), "I should have 2 structures")
+        self.assertEqual(3, bitboard.popcount(planes.units[0]), "I should have 3 units")
+        self.assertEqual(1, bitboard.popcount(planes.of_type("DF", 1) & planes.range_mask([13, 13], 3.5)), "One enemy turret should be in range")
+        self.assertFalse(bitboard.is_line_closed(planes.blocked(), bitboard.ROWS[13]), "Row 13 is not closed")
+        for x in range(28):
+            game.game_map.add_unit("FF", [x, 13], 0)
+        self.assertTrue(bitboard.is_line_closed(bitboard.BoardPlanes(game).blocked(), bitboard.ROWS[13]), "Row 13 should be closed")
+
+    def test_threat_map(self):
+        game = self.make_turn_0_map()
+        random.seed(8)
+        for _ in range(30):
+            x, y = random.choice([location for location in game.game_map])
+            game.game_map.add_unit(random.choice(["FF", "EF", "DF"]), [x, y], 1 if y >= 14 else 0)
+        for x, y in [location for location in game.game_map][::7]:
+            if game.contains_stationary_unit([x, y]) and y >= 14:
+                game.game_map[x, y][0].upgrade()
+        for player_index in [0, 1]:
+            threat_map = game.threat_map(player_index)
+            for location in game.game_map:
+                attackers = [unit for unit in game.get_attackers(location, player_index) if unit.stationary and unit.damage_i > 0]
+                self.assertEqual(len(attackers), threat_map.attackers_at(location), "Wrong attacker count at {}".format(location))
+                self.assertEqual(sum(unit.damage_i for unit in attackers), threat_map.damage_at(location), "Wrong damage at {}".format(location))
+
+        threat_map = game.threat_map(0)
+        path = game.find_path_to_edge([13, 0])
+        self.assertEqual(sum(threat_map.damage_at(location) for location in path), threat_map.path_damage(path), "Path damage should sum the tiles")
+        self.assertEqual(threat_map.path_damage(path) * 4, threat_map.path_damage(path, "SI"), "Slower units should take more damage")
+        self.assertIs(threat_map, game.threat_map(0), "The threat map should be cached")
+        game.game_map.add_unit("DF", [13, 27], 1)
+        self.assertIsNot(threat_map, game.threat_map(0), "The threat map should be rebuilt after the map changes")
+
+    def test_shield_map(self):
+        game = self.make_turn_0_map()
+        config = json.loads(json.dumps(game.config))
+        config["unitInformation"][1].update({"shieldRange": 3.5, "shieldPerUnit": 3.0, "shieldBonusPerY": 0.0})
+        config["unitInformation"][1]["upgrade"].update({"shieldRange": 7, "shieldPerUnit": 2, "shieldBonusPerY": 0.34})
+        game = GameState(config, game.serialized_string)
+        game.game_map.add_unit("EF", [13, 2], 0)
+        game.game_map.add_unit("EF", [14, 10], 0)
+        game.game_map[14, 10][0].upgrade()
+        game.game_map.add_unit("EF", [13, 20], 1)
+        game.game_map[13, 20][0].upgrade()
+
+        shield_map = game.shield_map(0)
+        self.assertEqual([3.0, 2 + 0.34 * 10], shield_map.amounts, "Wrong shield amounts")
+        self.assertAlmostEqual(3.0 + 2 + 0.34 * 10, shield_map.shield_at([13, 4]), 5, "Both supports should cover [13, 4]")
+        self.assertEqual(0, shield_map.shield_at([0, 13]), "No support should cover [0, 13]")
+        path = [[13, 3], [13, 4], [13, 5], [13, 6]]
+        self.assertAlmostEqual(3.0 + 2 + 0.34 * 10, shield_map.path_shield(path), 5, "Each support should only count once")
+        self.assertEqual(1, len(shield_map.supports_covering([[14, 16]])), "Only the upgraded support reaches [14, 16]")
+        self.assertAlmostEqual(2 + 0.34 * 7, game.shield_map(1).amounts[0], 5, "Enemy shield bonus should count rows from their edge")
+        self.assertIs(shield_map, game.shield_map(0), "The shield map should be cached")
+
+    def test_unit_table(self):
+        game = self.make_turn_0_map()
+        state = json.loads(game.serialized_string)
+        state["p1Units"] = [[[3, 12, 60.0, "1"], [4, 12, 60.0, "2"]], [[13, 2, 30.0, "3"]], [[5, 10, 75.0, "4"]], [[13, 0, 15.0, "5"], [13, 0, 15.0, "6"]], [], [], [[4, 12, 0.0, "7"]], [[5, 10, 0.0, "8"], [20, 20, 0.0, "9"]]]
+        state["p2Units"] = [[[13, 20, 60.0, "10"]], [], [], [], [], [[13, 20, 40.0, "11"]], [], []]
+        game = GameState(game.config, json.dumps(state))
+
+        self.assertEqual(8, len(game.unit_table), "The table should hold every unit but removals and upgrades")
+        expected_mask = bitboard.from_locations([[3, 12], [4, 12], [13, 2], [5, 10], [13, 20]])
+        self.assertEqual(expected_mask, game.game_map.get_blocked_mask(), "The blocked mask should come from the table")
+        self.assertEqual(expected_mask, game.unit_table.structure_mask, "Wrong structure mask")
+
+        turret = game.game_map[5, 10][0]
+        self.assertTrue(turret.upgraded, "The turret should be upgraded")
+        self.assertEqual(3.5, turret.attackRange, "The upgrade should apply to the turret's stats")
+        self.assertEqual(75.0, turret.health, "Wrong health")
+        self.assertTrue(game.game_map[4, 12][0].pending_removal, "The wall should be pending removal")
+        self.assertFalse(game.game_map[3, 12][0].pending_removal, "The wall should not be pending removal")
+        self.assertEqual(2, len(game.game_map[13, 0]), "Both scouts should be on the map")
+        self.assertEqual(["FF", "SI"], [unit.unit_type for unit in game.game_map[13, 20]], "Wrong units at [13, 20]")
+        self.assertEqual(1, game.game_map[13, 20][1].player_index, "Wrong player")
+        self.assertEqual([], game.game_map[20, 20], "Upgrades on empty tiles should be ignored")
+        self.assertIs(game.game_map[5, 10][0], turret, "Units should only be created once")
+
+        game.game_map.remove_unit([3, 12])
+        game.game_map.add_unit("PI", [4, 12], 0)
+        self.assertEqual(expected_mask & ~bitboard.bit([3, 12]), game.game_map.get_blocked_mask(), "Wrong mask after changing the map")
+        self.assertEqual(2, len(game.game_map[4, 12]), "Mobile units should join the parsed structure")
+
+    def test_unit_definitions(self):
+        game = self.make_turn_0_map()
+        first = GameUnit("DF", game.config, 0, None, 3, 12)
+        second = GameUnit("DF", game.config, 1, 20.0, 4, 12)
+        self.assertIs(first.definition, second.definition, "Units of the same type should share a definition")
+        self.assertEqual(90.0, first.health, "Health should default to the start health")
+        self.assertEqual(20.0, second.health, "Wrong health")
+
+        second.upgrade()
+        self.assertTrue(second.upgraded, "The unit should be upgraded")
+        self.assertFalse(first.upgraded, "Upgrading a unit should not change other units")
+        self.assertEqual((2.5, 3.5), (first.attackRange, second.attackRange), "Wrong attack ranges")
+        self.assertEqual([6.0, 0], second.cost, "Upgraded cost should include the upgrade")
+        self.assertIs(second.definition, GameUnit("DF", game.config).definition.upgraded_definition, "Upgraded units should share a definition")
+        with self.assertRaises(AttributeError):
+            first.definition.attackRange = 10
+        self.assertFalse(hasattr(first, "__dict__"), "Units should not have a __dict__")
+
+    def test_rules_per_config(self):
+        game = self.make_turn_0_map()
+        renamed = json.loads(json.dumps(game.config))
+        renamed["unitInformation"][2]["shorthand"] = "TT"
+        self.assertIs(game.rules, GameState(game.config, game.serialized_string).rules, "Rules should be shared per config")
+
+        def build(config, expected_turret, results):
+            for _ in range(20):
+                state = GameState(config, game.serialized_string)
+                state.suppress_warnings(True)
+                results.append(state.TURRET == expected_turret and state.attempt_spawn(expected_turret, [13, 0]) == 1
+                               and state.game_map[13, 0][0].unit_type == expected_turret)
+
+        results = []
+        threads = [threading.Thread(target=build, args=args) for args in [(game.config, "DF", results), (renamed, "TT", results)] * 2]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([True] * 80, results, "States built at the same time should not share constants")
+
+        for turret in ["T{}".format(index) for index in range(20)]:
+            config = json.loads(json.dumps(game.config))
+            config["unitInformation"][2]["shorthand"] = turret
+            self.assertEqual(turret, GameState(config, game.serialized_string).TURRET, "Each config should get its own rules")
+        self.assertLessEqual(len(rules._rules), rules._rules.size, "Rules of old configs should be freed")
+        self.assertLessEqual(len(unit._definitions), unit._definitions.size, "Definitions of old configs should be freed")
+        self.assertEqual("DF", GameState(game.config, game.serialized_string).TURRET, "Evicted configs should be built again")
+        self.assertEqual("DF", game.TURRET, "Evicting should not change the rules of a state")
+
+    def test_fork(self):
+        game = self.make_turn_0_map()
+        state = json.loads(game.serialized_string)
+        state["p1Units"] = [[[3, 12, 60.0, "1"]], [], [[5, 10, 75.0, "2"]], [], [], [], [], []]
+        game = GameState(game.config, json.dumps(state))
+        game.suppress_warnings(True)
+        game.game_map[3, 12]
+
+        child = game.fork()
+        self.assertEqual(1, child.attempt_spawn("FF", [4, 12]), "The fork should be able to spawn")
+        self.assertEqual(1, child.attempt_upgrade([5, 10]), "The fork should be able to upgrade")
+        child.game_map[3, 12][0].health = 1
+        self.assertEqual([], game.game_map[4, 12], "Spawning in the fork should not change the parent")
+        self.assertFalse(game.game_map[5, 10][0].upgraded, "Upgrading in the fork should not change the parent")
+        self.assertEqual(60.0, game.game_map[3, 12][0].health, "Changing a unit in the fork should not change the parent")
+        self.assertEqual(25.0, game.get_resource(game.SP), "The parent should keep its resources")
+        self.assertEqual(25.0 - 1 - 4, child.get_resource(child.SP), "The fork should pay for its moves")
+        self.assertEqual([], game._build_stack, "The parent should keep its build stack")
+        self.assertNotEqual(game.game_map.get_blocked_mask(), child.game_map.get_blocked_mask(), "Blocked masks should differ")
+
+        grandchild = child.fork()
+        grandchild.game_map.remove_unit([4, 12])
+        game.game_map.remove_unit([3, 12])
+        self.assertTrue(child.contains_stationary_unit([4, 12]), "Removing in a fork of a fork should not change the fork")
+        self.assertTrue(grandchild.contains_stationary_unit([3, 12]), "Removing in the parent should not change forks")
+        self.assertTrue(grandchild.game_map[5, 10][0].upgraded, "Forks should start from their parent's state")
+
+        copied = copy.deepcopy(grandchild)
+        self.assertTrue(copied.game_map[5, 10][0].upgraded, "Deep copies should keep upgrades")
+        self.assertEqual(3.5, pickle.loads(pickle.dumps(copied.game_map[5, 10]))[0].attackRange, "Pickled units should keep their stats")
+
+    def test_fork_keeps_parent_references(self):
+        game = self.make_turn_0_map()
+        game.game_map.add_unit("FF", [3, 12])
+        wall = game.game_map[3, 12][0]
+        health = wall.health
+        scouts = game.game_map[13, 0]
+        child = game.fork()
+        wall.health = 1
+        scouts.append(GameUnit("PI", game.config, 0, None, 13, 0))
+        self.assertIs(wall, game.game_map[3, 12][0], "Forking should not detach units the parent handed out")
+        self.assertEqual(1, len(game.game_map[13, 0]), "Forking should not detach lists the parent handed out")
+        self.assertEqual(health, child.game_map[3, 12][0].health, "Changes through old references should not reach the fork")
+        self.assertEqual([], child.game_map[13, 0], "Changes through old lists should not reach the fork")
+
+    def test_savepoints(self):
+        game = self.make_turn_0_map()
+        game.attempt_spawn("DF", [5, 10])
+        outer = game.savepoint()
+        game.attempt_spawn("FF", [4, 12])
+        game.attempt_spawn("PI", [13, 0], 2)
+        inner = game.savepoint()
+        game.attempt_upgrade([5, 10])
+        game.attempt_remove([4, 12])
+        self.assertTrue(game.game_map[5, 10][0].upgraded, "The turret should be upgraded")
+
+        game.rollback(inner)
+        self.assertFalse(game.game_map[5, 10][0].upgraded, "The upgrade should be undone")
+        self.assertEqual(2, len(game._build_stack), "The removal should be undone")
+        self.assertEqual(2, len(game.game_map[13, 0]), "Changes before the savepoint should be kept")
+        game.release_savepoint(inner)
+
+        game.rollback(outer)
+        self.assertEqual([], game.game_map[4, 12], "The wall should be gone")
+        self.assertEqual([], game.game_map[13, 0], "The scouts should be gone")
+        self.assertEqual([("DF", 5, 10)], game._build_stack, "Only the first turret should be left to build")
+        self.assertEqual([], game._deploy_stack, "Nothing should be left to deploy")
+        self.assertEqual([23.0, 5.0], game.get_resources(), "Resources should be restored")
+        self.assertEqual(bitboard.bit([5, 10]), game.game_map.get_blocked_mask(), "Only the turret should block")
+
+        game.attempt_spawn("FF", [4, 12])
+        game.release_savepoint(outer)
+        self.assertIsNone(game._undo_log, "Releasing the outer savepoint should stop recording")
+        self.assertEqual(2, len(game._build_stack), "Released changes should be kept")
+        with self.assertRaises(ValueError):
+            game.rollback(outer)
+
+    def test_nested_savepoints(self):
+        game = self.make_turn_0_map()
+        outer = game.savepoint()
+        inner = game.savepoint()
+        game.attempt_spawn("FF", [4, 12])
+        game.release_savepoint(inner)
+        game.rollback(outer)
+        self.assertEqual([], game.game_map[4, 12], "Releasing an inner savepoint should keep the outer one")
+
+        inner = game.savepoint()
+        game.attempt_spawn("FF", [4, 12])
+        game.rollback(outer)
+        game.attempt_spawn("FF", [4, 12])
+        game.attempt_spawn("FF", [5, 12])
+        with self.assertRaises(ValueError):
+            game.rollback(inner)
+        with self.assertRaises(ValueError):
+            game.release_savepoint(inner)
+        self.assertTrue(game.contains_stationary_unit([5, 12]), "A stale savepoint should change nothing")
+        game.rollback(outer)
+        self.assertEqual(0, len(game._build_stack), "The outer savepoint should still undo everything")
+        game.release_savepoint(outer)
+        self.assertIsNone(game._undo_log, "Releasing the outermost savepoint should stop recording")
+
+    def test_rollback_after_fork(self):
+        game = self.make_turn_0_map()
+        game.game_map.add_unit("DF", [3, 12])
+        savepoint = game.savepoint()
+        self.assertEqual(1, game.attempt_upgrade([3, 12]), "The turret should be upgraded")
+        child = game.fork()
+        game.game_map[3, 12]
+        game.rollback(savepoint)
+        self.assertFalse(game.game_map[3, 12][0].upgraded, "Rolling back after a fork should undo the parent's upgrade")
+        self.assertTrue(child.game_map[3, 12][0].upgraded, "Rolling back the parent should not change the fork")
+        with self.assertRaises(ValueError):
+            child.rollback(savepoint)
+
+    def test_lazy_parsing(self):
+        game = self.make_turn_0_map()
+        state = json.loads(game.serialized_string)
+        state["turnInfo"] = [0, 7, -1]
+        state["p1Units"] = [[[3, 12, 60.0, "1"]], [], [[5, 10, 75.0, "2"]], [], [], [], [], [[5, 10, 0.0, "3"]]]
+        serialized = json.dumps(state)
+        lazy = GameState(game.config, serialized, lazy=True)
+        lazy.suppress_warnings(True)
+        self.assertIsNone(lazy._game_map, "The map should not be built yet")
+        self.assertEqual(7, lazy.turn_number, "Wrong turn number")
+        self.assertEqual([25.0, 5.0], lazy.get_resources(), "Resources should be parsed eagerly")
+        self.assertEqual(30.0, lazy.enemy_health, "Wrong enemy health")
+
+        eager = GameState(game.config, serialized)
+        self.assertEqual(eager.game_map.get_blocked_mask(), lazy.game_map.get_blocked_mask(), "Lazy and eager maps should match")
+        self.assertTrue(lazy.game_map[5, 10][0].upgraded, "The turret should be upgraded")
+        self.assertFalse(lazy.game_map.enable_warnings, "Suppressed warnings should carry over to the map")
+        self.assertEqual(2, len(lazy.unit_table), "Wrong number of units")
+
+    def test_json_codecs(self):
+        game = self.make_turn_0_map()
+        self.assertEqual("json", util.JSON_CODECS[-1].name, "The standard json module should always be available")
+        self.assertEqual(util.JSON_CODECS[0], util.get_json_codec(), "The fastest backend should be used by default")
+        stack = [("FF", 3, 12), ("DF", 5, 10)]
+        for codec in util.JSON_CODECS:
+            self.assertEqual(json.loads(game.serialized_string), codec.loads(game.serialized_string), "{} parsed a different state".format(codec.name))
+            self.assertIsInstance(codec.dumps(stack), str, "{} should serialize to a string".format(codec.name))
+            self.assertEqual([["FF", 3, 12], ["DF", 5, 10]], json.loads(codec.dumps(stack)), "{} serialized a different stack".format(codec.name))
+        with self.assertRaises(ValueError):
+            util.set_json_codec("not a backend")
+
+    def test_decoded_messages(self):
+        game = self.make_turn_0_map()
+        state = json.loads(game.serialized_string)
+        state["p1Units"][2] = [[5, 10, 75.0, "2"]]
+        serialized = json.dumps(state)
+        for lazy in [False, True]:
+            decoded = GameState(game.config, json.loads(serialized), lazy=lazy)
+            self.assertEqual([25.0, 5.0], decoded.get_resources(), "Wrong resources from a dict")
+            self.assertEqual(GameState(game.config, serialized).game_map.get_blocked_mask(), decoded.game_map.get_blocked_mask(), "Maps from a dict and a string should match")
+
+        class RecordingAlgo(AlgoCore):
+            def __init__(self):
+                super().__init__()
+                self.received = []
+
+            def on_turn(self, turn_state):
+                self.received.append(turn_state)
+
+            def on_action_frame(self, frame):
+                self.received.append(frame)
+
+        action_frame = serialized.replace('"turnInfo": [0, 0, -1]', '"turnInfo": [1, 0, 3]')
+        end_frame = serialized.replace('"turnInfo": [0, 0, -1]', '"turnInfo": [2, 0, 10]')
+        self.assertNotEqual(serialized, action_frame, "The test state should hold turnInfo [0, 0, -1]")
+        for decode_messages in [False, True]:
+            algo = RecordingAlgo()
+            algo.decode_messages = decode_messages
+            messages = iter([serialized, action_frame, end_frame])
+            with mock.patch("gamelib.algocore.get_command", lambda: next(messages)), mock.patch("gamelib.algocore.debug_write"):
+                algo.start()
+            expected = [json.loads(serialized), json.loads(action_frame)] if decode_messages else [serialized, action_frame]
+            self.assertEqual(expected, algo.received, "Wrong messages passed with decode_messages={}".format(decode_messages))
+
+    def test_action_frame_filter(self):
+        game = self.make_turn_0_map()
+        frame = json.loads(game.serialized_string)
+        frame["turnInfo"] = [1, 0, 3]
+        quiet_frame = json.dumps(frame, separators=(",", ":"))
+        frame["events"]["breach"] = [[[13, 27], 1.0, 3, "5", 1]]
+        frame["events"]["move"] = [[[13, 26], [13, 27], [0, 0], 3, "5", 1]]
+        breach_frame = json.dumps(frame, separators=(",", ":"))
+        end_frame = quiet_frame.replace('"turnInfo":[1,0,3]', '"turnInfo":[2,0,4]')
+
+        class RecordingAlgo(AlgoCore):
+            def __init__(self):
+                super().__init__()
+                self.received = []
+
+            def on_action_frame(self, frame):
+                self.received.append(frame)
+
+        def run(algo):
+            messages = iter([quiet_frame, breach_frame, end_frame])
+            with mock.patch("gamelib.algocore.get_command", lambda: next(messages)), mock.patch("gamelib.algocore.debug_write"):
+                algo.start()
+            return algo.received
+
+        algo = RecordingAlgo()
+        algo.set_action_frame_filter(events=["breach"])
+        expected = {"turnInfo": [1, 0, 3], "events": {"breach": [[[13, 27], 1.0, 3, "5", 1]]}}
+        self.assertEqual([expected], run(algo), "Only the breach of the frame holding one should be passed")
+
+        algo = RecordingAlgo()
+        algo.set_action_frame_filter(events=["breach"], fields=["p2Stats"])
+        received = run(algo)
+        self.assertEqual(2, len(received), "Frames should not be skipped when fields are requested")
+        self.assertEqual({"breach": []}, received[0]["events"], "Empty events should be passed as empty lists")
+        self.assertEqual([30.0, 25.0, 5.0, 0], received[0]["p2Stats"], "Wrong field")
+
+        algo = RecordingAlgo()
+        algo.set_action_frame_filter(events=["breach"])
+        algo.set_action_frame_filter()
+        self.assertEqual([quiet_frame, breach_frame], run(algo), "Removing the filter should pass whole frames again")
+        with self.assertRaises(ValueError):
+            algo.set_action_frame_filter(events=["breaches"])
+
+    def test_messages_with_spaced_keys(self):
+        game = self.make_turn_0_map()
+        state = json.loads(game.serialized_string)
+        state["events"]["breach"] = [[[13, 27], 1.0, 3, "5", 1]]
+        turn = json.dumps(state).replace('"turnInfo":', '"turnInfo" :')
+        self.assertEqual([0, 0, -1], util.extract_json_value(turn, "turnInfo"), "Spaces before the colon should be allowed")
+        self.assertEqual(-1, util.find_json_value('{"kind": "turnInfo"}', "turnInfo"), "String values should not match keys")
+        action_frame = turn.replace('"turnInfo" : [0, 0, -1]', '"turnInfo" : [1, 0, 3]').replace('"breach":', '"breach" :')
+        end_frame = turn.replace('"turnInfo" : [0, 0, -1]', '"turnInfo" : [2, 0, 4]')
+        self.assertNotEqual(turn, action_frame, "The test state should hold turnInfo [0, 0, -1]")
+
+        class RecordingAlgo(AlgoCore):
+            def __init__(self):
+                super().__init__()
+                self.received = []
+
+            def on_turn(self, turn_state):
+                self.received.append(turn_state)
+
+            def on_action_frame(self, frame):
+                self.received.append(frame)
+
+        # An escaped key is valid json the fast scan cannot find
+        escaped_turn = turn.replace('"turnInfo"', '"turn\\u0049nfo"')
+        self.assertIsNone(util.extract_json_value(escaped_turn, "turnInfo"), "The fast scan should miss escaped keys")
+        algo = RecordingAlgo()
+        algo.set_action_frame_filter(events=["breach"])
+        messages = iter([escaped_turn, action_frame, end_frame])
+        with mock.patch("gamelib.algocore.get_command", lambda: next(messages)), mock.patch("gamelib.algocore.debug_write"):
+            algo.start()
+        self.assertEqual(escaped_turn, algo.received[0], "A turn the fast scan misses should still reach on_turn")
+        self.assertEqual(state["events"]["breach"], algo.received[1]["events"]["breach"], "Spaced event keys should be found")
+
+    def test_background_planner(self):
+        game = self.make_turn_0_map()
+        game.attempt_spawn("DF", [5, 10])
+        frame_seen = threading.Event()
+
+        def plan_next_turn(predicted_state, run):
+            frame_seen.wait(5)
+            return (predicted_state.turn_number, len(predicted_state.game_map[5, 10]), run.latest_frame())
+
+        planner = BackgroundPlanner(plan_next_turn)
+        self.assertIsNone(planner.result(), "There should be no plan before start")
+        planner.start(game.fork())
+        self.assertTrue(planner.running(), "The worker should wait for a frame")
+        planner.feed("frame")
+        frame_seen.set()
+        self.assertEqual((0, 1, "frame"), planner.result(timeout=5), "Wrong plan")
+        self.assertIsNone(planner.result(), "A plan should only be returned once")
+
+        def plan_until_cancelled(predicted_state, run):
+            while not run.cancelled():
+                frame_seen.wait(0.001)
+            return "stale"
+
+        planner = BackgroundPlanner(plan_until_cancelled)
+        planner.start(game.fork())
+        self.assertIsNone(planner.result(timeout=0.01), "An unfinished plan should be cancelled")
+        self.assertTrue(planner.cancelled(), "The worker should be told to stop")
+
+        runs = []
+        stopped = threading.Event()
+
+        def plan_and_record(predicted_state, run):
+            runs.append(run)
+            while not run.cancelled():
+                time.sleep(0.001)
+            stopped.wait(5)
+            return run.latest_frame()
+
+        planner = BackgroundPlanner(plan_and_record)
+        planner.start(game.fork())
+        planner.feed("turn 1")
+        self.assertIsNone(planner.result(), "The first run should not be done")
+        planner.start(game.fork())
+        planner.feed("turn 2")
+        for _ in range(500):
+            if len(runs) == 2:
+                break
+            time.sleep(0.01)
+        self.assertTrue(runs[0].cancelled(), "The first worker should see it was cancelled after a restart")
+        self.assertFalse(runs[1].cancelled(), "The new run should not be cancelled")
+        self.assertEqual("turn 1", runs[0].latest_frame(), "The first worker should not get the new turn's frames")
+        self.assertTrue(planner.running(), "A cancelled worker that has not returned is still running")
+        planner.cancel()
+        stopped.set()
+
+        class PlanningAlgo(AlgoCore):
+            def on_turn(self, turn_state):
+                self.background_planner.start(game.fork())
+
+        frame_seen.clear()
+        algo = PlanningAlgo()
+        algo.background_planner = BackgroundPlanner(plan_next_turn)
+        turn = game.serialized_string
+        action_frame = turn.replace('"turnInfo":[0,0,-1]', '"turnInfo":[1,0,3]')
+        end_frame = turn.replace('"turnInfo":[0,0,-1]', '"turnInfo":[2,0,4]')
+        messages = iter([turn, action_frame, end_frame])
+        with mock.patch("gamelib.algocore.get_command", lambda: next(messages)), mock.patch("gamelib.algocore.debug_write"):
+            algo.start()
+        self.assertEqual(1, algo.background_planner.frames, "Action frames should be fed to a running planner")
+        self.assertTrue(algo.background_planner.cancelled(), "The planner should be cancelled at the end of the game")
+        frame_seen.set()
+
+    def test_turn_scheduler(self):
+        game = self.make_turn_0_map()
+        scheduler = TurnScheduler(game.config)
+        self.assertEqual(5, scheduler.soft_limit, "The soft limit should come from waitTimeBotSoft")
+
+        def build_wall(plan, scheduler):
+            plan.attempt_spawn("FF", [3, 12])
+            return plan
+
+        def add_turrets(plan, scheduler):
+            for x in range(5, 23):
+                plan.attempt_spawn("DF", [x, 10])
+                yield plan
+            while True:
+                yield None
+
+        def broken(plan, scheduler):
+            raise RuntimeError("broken stage")
+
+        scheduler.add_stage("wall", build_wall, budget=1)
+        scheduler.add_stage("turrets", add_turrets, budget=0.05)
+        scheduler.add_stage("broken", broken)
+        sent = []
+        with mock.patch("gamelib.game_state.send_command", sent.append), mock.patch("gamelib.scheduler.debug_write"):
+            plan = scheduler.run(game)
+        self.assertEqual([["FF", 3, 12]] + [["DF", x, 10] for x in range(5, 17)], json.loads(sent[0]), "The best plan should be submitted")
+        self.assertEqual(0.0, plan.get_resource(game.SP), "The submitted plan should be the last one yielded")
+        self.assertEqual(25.0, game.get_resource(game.SP), "Stages should plan on forks")
+        self.assertEqual(["wall", "turrets", "broken"], [timing.name for timing in scheduler.timings], "Every stage should run")
+        self.assertTrue(scheduler.timings[1].stopped, "The generator should be stopped at its budget")
+        self.assertEqual(18, scheduler.timings[1].plans, "Wrong number of plans")
+        self.assertTrue(scheduler.timings[2].failed, "The failing stage should be reported")
+        self.assertEqual(3, len(scheduler.report().splitlines()), "The report should have a line per stage")
+
+        with mock.patch("gamelib.game_state.send_command", sent.append):
+            scheduler.run(game, started=time.perf_counter() - 10)
+        self.assertEqual([], scheduler.timings, "No stage should run once the soft limit is passed")
+        self.assertEqual([], json.loads(sent[-1]), "A plan should be submitted even without time")
+
+        def change_after_yield(plan, scheduler):
+            yield plan
+            plan.attempt_spawn("FF", [4, 12])
+
+        scheduler = TurnScheduler(game.config)
+        scheduler.add_stage("changing", change_after_yield)
+        plan = scheduler.run(game, submit=False)
+        self.assertFalse(plan.contains_stationary_unit([4, 12]), "Changes after a yield should not reach the kept plan")
+
+    def test_simulator(self):
+        game = self.make_turn_0_map()
+        game.suppress_warnings(True)
+        result = Simulator(game).run([("PI", 13, 0)])
+        self.assertEqual([[27, 14]], result.breaches[0], "A scout on an empty board should breach")
+        self.assertEqual([1.0, 0], result.breach_damage, "Wrong breach damage")
+        self.assertEqual(len(game.find_path_to_edge([13, 0])) - 1, result.frames, "The scout should move once per frame")
+
+        walled = game.fork()
+        for x in range(28):
+            walled.game_map.add_unit("FF", [x, 14], 1)
+        result = Simulator(walled).run([("PI", 13, 0)])
+        self.assertEqual([[], []], result.breaches, "A walled off scout can not breach")
+        self.assertGreaterEqual(result.structure_damage[0], 30, "The scout should self destruct next to two walls")
+
+        defended = game.fork()
+        defended.game_map.add_unit("EF", [15, 2], 1)
+        result = Simulator(defended).run([("PI", 13, 0)] * 3)
+        self.assertEqual([("EF", 15, 2)], result.destroyed[1], "Three scouts should destroy the support")
+        self.assertEqual(30, result.structure_damage[0], "Damage should stop at the structure's health")
+        self.assertEqual(3, len(result.breaches[0]), "The scouts should breach after destroying the support")
+        self.assertEqual(1, len(defended.game_map[15, 2]), "The simulated state should not change")
+
+        config = json.loads(json.dumps(game.config))
+        config["unitInformation"][1].update({"shieldRange": 3.5, "shieldPerUnit": 3.0, "shieldBonusPerY": 0.0})
+        damage = []
+        for shielded in [False, True]:
+            state = GameState(config, game.serialized_string)
+            state.game_map.add_unit("DF", [14, 4], 1)
+            if shielded:
+                state.game_map.add_unit("EF", [12, 1], 0)
+            result = Simulator(state).run([("PI", 13, 0)])
+            self.assertEqual([[], []], result.breaches, "The turret should destroy the scout")
+            damage.append(result.structure_damage[0])
+        self.assertEqual(damage[0] + 2, damage[1], "A shielded scout should survive one more attack")
+
+    def test_simulator_steps(self):
+        game = self.make_turn_0_map()
+        game.suppress_warnings(True)
+        game.game_map.add_unit("FF", [12, 1])
+        simulator = Simulator(game)
+        scenario = simulator.start([("PI", 12, 1), ("PI", 13, 0)], [("PI", 14, 27)])
+        self.assertEqual({(0, 1): (13, 0, 15.0), (1, 0): (14, 27, 15.0)}, scenario.mobile_units(), "Blocked spawns should be skipped without shifting the others")
+        self.assertTrue(simulator.step(scenario), "The scouts should still have frames to go")
+        self.assertEqual(1, scenario.frame, "Wrong frame")
+        self.assertEqual(game.find_path_to_edge([13, 0])[1], list(scenario.mobile_units()[0, 1][:2]), "The scout should take its first step")
+        while simulator.step(scenario):
+            pass
+        self.assertEqual({}, scenario.mobile_units(), "Breached units should leave the board")
+        self.assertEqual(simulator.run([("PI", 13, 0)], [("PI", 14, 27)]).breaches, scenario.result.breaches, "Stepping should match run")
+
+    def test_simulator_batch(self):
+        game = self.make_turn_0_map()
+        game.suppress_warnings(True)
+        game.game_map.add_unit("DF", [14, 4], 1)
+        game.game_map.add_unit("EF", [15, 2], 1)
+        candidates = [[("PI", 13, 0)] * 3, [("PI", 14, 0)] * 2, [("EI", 10, 3)], [("SI", 20, 6), ("PI", 20, 6)]]
+        enemy = [("PI", 13, 27)]
+        simulator = Simulator(game)
+        single = [Simulator(game).run(spawns, enemy) for spawns in candidates]
+        with mock.patch.object(FlatShortestPathFinder, "navigate_from_locations", autospec=True,
+                               side_effect=FlatShortestPathFinder.navigate_from_locations) as navigate:
+            batch = simulator.run_batch(candidates, enemy)
+        self.assertEqual(5, len(navigate.call_args_list[0][0][1]), "The first paths of every candidate should be found in one call")
+        for expected, result in zip(single, batch):
+            self.assertEqual((expected.breaches, expected.structure_damage, expected.destroyed, expected.frames),
+                             (result.breaches, result.structure_damage, result.destroyed, result.frames), "Batched and single runs should match")
+            self.assertTrue(result.complete, "Every candidate should finish")
+        self.assertEqual(batch[0].breaches, simulator.run(candidates[0], enemy).breaches, "Cached paths should give the same result")
+
+        stopped = simulator.run_batch(candidates, enemy, deadline=time.perf_counter() - 1)
+        self.assertEqual([False] * 4, [result.complete for result in stopped], "A passed deadline should stop every candidate")
+        self.assertEqual([0] * 4, [result.frames for result in stopped], "No frame should be simulated after the deadline")
+        self.assertFalse(Simulator(game, max_frames=3).run(candidates[0]).complete, "Hitting max_frames should leave the result incomplete")
+
+    def test_scenario_pool(self):
+        game = self.make_turn_0_map()
+        game.suppress_warnings(True)
+        game.attempt_spawn("DF", [13, 3])
+        game.attempt_upgrade([13, 3])
+        game.game_map.add_unit("EF", [15, 2], 1)
+        board = GameState(game.config, serialize_board(game))
+        self.assertEqual(game.game_map.get_blocked_mask(), board.game_map.get_blocked_mask(), "The board should keep every structure")
+        self.assertTrue(board.game_map[13, 3][0].upgraded, "The board should keep upgrades")
+        self.assertEqual(game.get_resources(), board.get_resources(), "The board should keep resources")
+        game.game_map[15, 2][0].pending_removal = True
+        self.assertTrue(GameState(game.config, serialize_board(game)).game_map[15, 2][0].pending_removal, "The board should keep removal marks")
+
+        candidates = [[("PI", 14, 0)] * 3, [("EI", 10, 3)], [("PI", 20, 6)] * 2]
+        expected = Simulator(game).run_batch(candidates)
+        pool = ScenarioPool(game.config, workers=2)
+        try:
+            with self.assertRaises(ValueError):
+                pool.evaluate(candidates)
+            pool.set_board(game)
+            results = pool.evaluate(candidates, chunk_size=2)
+            self.assertEqual([(result.breaches, result.structure_damage, result.frames) for result in expected],
+                             [(result.breaches, result.structure_damage, result.frames) for result in results], "Workers should simulate like a local Simulator")
+            late = pool.evaluate(candidates, deadline=time.perf_counter() - 1)
+            self.assertTrue(all(result is None or not result.complete for result in late), "Nothing should complete after the deadline")
+            game.attempt_spawn("FF", [14, 3])
+            pool.set_board(game)
+            expected = Simulator(game).run_batch(candidates)
+            results = pool.evaluate(candidates, chunk_size=1)
+            self.assertEqual([result.breaches for result in expected], [result.breaches for result in results], "Workers should switch to the new board")
+            self.assertEqual([None, None], scenario_pool._evaluate(0, None, candidates[:2], [], time.time() - 1), "Chunks past their deadline should be skipped")
+        finally:
+            pool.shutdown()
+
     def test_print_unit(self):
         game = self.make_turn_0_map()
 
@@ -1,3 +1,6 @@
+from .util import ConfigCache
+
+
 def is_stationary(unit_type, structure_types):
     """
         Args:
@@ -9,8 +12,124 @@ def is_stationary(unit_type, structure_types):
     return unit_type in structure_types
 
 
+class UnitDefinition:
+    """Holds the stats shared by every unit of a type, read once from the config.
+
+    Definitions are immutable and shared, each GameUnit references the one matching its type and upgrade.
+
+    Attributes :
+        * unit_type (string): The shorthand of the type
+        * type_index (integer): The index of the type in the config's unitInformation
+        * config (JSON): Contains information about the game
+        * upgraded (bool): If this is the definition of upgraded units
+        * stationary (bool): Whether or not units of this type are structures
+        * speed (float): A unit will move once every 1/speed frames
+        * damage_f (int): The amount of damage this mobile unit will deal to enemy structures.
+        * damage_i (int): The amount of damage this mobile unit will deal to enemy mobile units.
+        * attackRange (float): The effective range of this unit for attacking
+        * shieldRange (float): The effective range of this unit for shielding
+        * max_health (float): The starting health of units of this type
+        * shieldPerUnit (float): how much shield is given per unit
+        * shieldBonusPerY (float): how much extra shield is given per row away from the owner's edge
+        * cost ((int, int)): The resource costs of this unit first is SP second is MP, upgrade costs included
+        * upgraded_definition (UnitDefinition): The definition of this type once upgraded
+
+    """
+    __slots__ = ("unit_type", "type_index", "config", "upgraded", "stationary", "speed", "damage_f", "damage_i", "attackRange",
+                 "shieldRange", "max_health", "shieldPerUnit", "shieldBonusPerY", "cost", "upgraded_definition")
+
+    def __init__(self, unit_type, type_index, config, base=None):
+        """Reads the stats of a type from the config
+
+        Args:
+            unit_type: The shorthand of the type
+            type_index: The index of the type in the config's unitInformation
+            config (JSON): Contains information about the game
+            base: The definition of the type before upgrading. If given, this definition applies the upgrade on top of it.
+
+        """
+        type_config = config["unitInformation"][type_index]
+        set_value = object.__setattr__
+        set_value(self, "unit_type", unit_type)
+        set_value(self, "type_index", type_index)
+        set_value(self, "config", config)
+        if base is None:
+            set_value(self, "upgraded", False)
+            set_value(self, "stationary", type_config.get("unitCategory") == 0)
+            set_value(self, "speed", type_config.get("speed", 0))
+            set_value(self, "damage_f", type_config.get("attackDamageTower", 0))
+            set_value(self, "damage_i", type_config.get("attackDamageWalker", 0))
+            set_value(self, "attackRange", type_config.get("attackRange", 0))
+            set_value(self, "shieldRange", type_config.get("shieldRange", 0))
+            set_value(self, "max_health", type_config.get("startHealth", 0))
+            set_value(self, "shieldPerUnit", type_config.get("shieldPerUnit", 0))
+            set_value(self, "shieldBonusPerY", type_config.get("shieldBonusPerY", 0))
+            set_value(self, "cost", (type_config.get("cost1", 0), type_config.get("cost2", 0)))
+            set_value(self, "upgraded_definition", UnitDefinition(unit_type, type_index, config, self))
+        else:
+            type_config = type_config.get("upgrade", {})
+            set_value(self, "upgraded", True)
+            set_value(self, "stationary", base.stationary)
+            set_value(self, "speed", type_config.get("speed", base.speed))
+            set_value(self, "damage_f", type_config.get("attackDamageTower", base.damage_f))
+            set_value(self, "damage_i", type_config.get("attackDamageWalker", base.damage_i))
+            set_value(self, "attackRange", type_config.get("attackRange", base.attackRange))
+            set_value(self, "shieldRange", type_config.get("shieldRange", base.shieldRange))
+            set_value(self, "max_health", type_config.get("startHealth", base.max_health))
+            set_value(self, "shieldPerUnit", type_config.get("shieldPerUnit", base.shieldPerUnit))
+            set_value(self, "shieldBonusPerY", type_config.get("shieldBonusPerY", base.shieldBonusPerY))
+            set_value(self, "cost", (type_config.get("cost1", 0) + base.cost[0], type_config.get("cost2", 0) + base.cost[1]))
+            set_value(self, "upgraded_definition", self)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("UnitDefinition is immutable")
+
+    # Definitions are shared, so copies keep pointing at the same one and pickles look it up again
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (_find_definition, (self.config, self.unit_type, self.upgraded))
+
+    def __repr__(self):
+        return "UnitDefinition({}{})".format(self.unit_type, ", upgraded" if self.upgraded else "")
+
+
+def _build_definitions(config):
+    definitions = {}
+    for type_index, type_config in enumerate(config["unitInformation"]):
+        definitions[type_config["shorthand"]] = UnitDefinition(type_config["shorthand"], type_index, config)
+    return definitions
+
+# Definitions are built once per config, for the few configs used most recently
+_definitions = ConfigCache(_build_definitions)
+
+
+def get_unit_definitions(config):
+    """Gets the definitions of every unit type in a config
+
+    Args:
+        config (JSON): Contains information about the game
+
+    Returns:
+        A dict mapping each type's shorthand to the definition of non upgraded units of that type
+    """
+    return _definitions.get(config)
+
+
+def _find_definition(config, unit_type, upgraded):
+    definition = get_unit_definitions(config)[unit_type]
+    return definition.upgraded_definition if upgraded else definition
+
+
 class GameUnit:
-    """Holds information about a Unit. 
+    """Holds information about a Unit.
+
+    The stats of a unit are shared with every unit of the same type through its UnitDefinition,
+    only the owner, location, health and removal flag are stored per unit.
 
     Attributes :
         * unit_type (string): This unit's type
@@ -30,51 +149,88 @@ class GameUnit:
         * shieldPerUnit (float): how much shield is given per unit
         * pending_removal (boolean): If this unit is marked for removal by its owner
         * upgraded (boolean): If this unit is upgraded
+        * definition (UnitDefinition): The stats shared by every unit of this type
 
     """
+    __slots__ = ("definition", "player_index", "x", "y", "health", "pending_removal")
+
     def __init__(self, unit_type, config, player_index=None, health=None, x=-1, y=-1):
         """ Initialize unit variables using args passed
 
         """
-        self.unit_type = unit_type
-        self.config = config
+        self.definition = get_unit_definitions(config)[unit_type]
         self.player_index = player_index
         self.pending_removal = False
-        self.upgraded = False
         self.x = x
         self.y = y
-        self.__serialize_type()
-        self.health = self.max_health if not health else health
-
-    def __serialize_type(self):
-        from .game_state import STRUCTURE_TYPES, UNIT_TYPE_TO_INDEX, SUPPORT
-        type_config = self.config["unitInformation"][UNIT_TYPE_TO_INDEX[self.unit_type]]
-        self.stationary = type_config["unitCategory"] == 0
-        self.speed = type_config.get("speed", 0)
-        self.damage_f = type_config.get("attackDamageTower", 0)
-        self.damage_i = type_config.get("attackDamageWalker", 0)
-        self.attackRange = type_config.get("attackRange", 0)
-        self.shieldRange = type_config.get("shieldRange", 0)
-        self.max_health = type_config.get("startHealth", 0)
-        self.shieldPerUnit = type_config.get("shieldPerUnit", 0)
-        self.shieldBonusPerY = type_config.get("shieldBonusPerY", 0)
-        self.cost = [type_config.get("cost1", 0), type_config.get("cost2", 0)]
+        self.health = self.definition.max_health if not health else health
+
+    @property
+    def unit_type(self):
+        return self.definition.unit_type
 
+    @property
+    def config(self):
+        return self.definition.config
+
+    @property
+    def upgraded(self):
+        return self.definition.upgraded
+
+    @property
+    def stationary(self):
+        return self.definition.stationary
+
+    @property
+    def speed(self):
+        return self.definition.speed
+
+    @property
+    def damage_f(self):
+        return self.definition.damage_f
+
+    @property
+    def damage_i(self):
+        return self.definition.damage_i
+
+    @property
+    def attackRange(self):
+        return self.definition.attackRange
+
+    @property
+    def shieldRange(self):
+        return self.definition.shieldRange
+
+    @property
+    def max_health(self):
+        return self.definition.max_health
+
+    @property
+    def shieldPerUnit(self):
+        return self.definition.shieldPerUnit
+
+    @property
+    def shieldBonusPerY(self):
+        return self.definition.shieldBonusPerY
+
+    @property
+    def cost(self):
+        return list(self.definition.cost)
 
     def upgrade(self):
-        from .game_state import UNIT_TYPE_TO_INDEX
-        type_config = self.config["unitInformation"][UNIT_TYPE_TO_INDEX[self.unit_type]].get("upgrade", {})
-        self.speed = type_config.get("speed", self.speed)
-        self.damage_f = type_config.get("attackDamageTower", self.damage_f)
-        self.damage_i = type_config.get("attackDamageWalker", self.damage_i)
-        self.attackRange = type_config.get("attackRange", self.attackRange)
-        self.shieldRange = type_config.get("shieldRange", self.shieldRange)
-        self.max_health = type_config.get("startHealth", self.max_health)
-        self.shieldPerUnit = type_config.get("shieldPerUnit", self.shieldPerUnit)
-        self.shieldBonusPerY = type_config.get("shieldBonusPerY", self.shieldBonusPerY)
-        self.cost = [type_config.get("cost1", 0) + self.cost[0], type_config.get("cost2", 0) + self.cost[1]]
-        self.upgraded = True
+        self.definition = self.definition.upgraded_definition
 
+    def copy(self):
+        """Creates a unit with the same type, owner, location, health and removal flag
+        """
+        unit = GameUnit.__new__(GameUnit)
+        unit.definition = self.definition
+        unit.player_index = self.player_index
+        unit.x = self.x
+        unit.y = self.y
+        unit.health = self.health
+        unit.pending_removal = self.pending_removal
+        return unit
 
     def __toString(self):
         owner = "Friendly" if self.player_index == 0 else "Enemy"
@@ -86,4 +242,3 @@ class GameUnit:
 
     def __repr__(self):
         return self.__toString()
-
@@ -0,0 +1,133 @@
+"""
+Units of a game state stored column by column.
+
+Parsing a turn state into GameUnit objects costs an object and a dozen attribute copies per unit.
+The UnitTable keeps the parsed units as parallel lists instead, one entry per unit, and GameMap
+only builds GameUnits for a tile the first time it is indexed.
+"""
+
+from .game_map import ARENA_SIZE
+from .unit import GameUnit
+
+# Index in unitInformation of the pseudo units the engine uses to flag removals and upgrades
+REMOVE_INDEX = 6
+UPGRADE_INDEX = 7
+
+
+class UnitTable:
+    """Struct of arrays holding the units parsed from a serialized game state
+
+    Row i of the table is the unit made of type_index[i], player_index[i], x[i], y[i] and so on.
+
+    Attributes :
+        * type_index (list): Index in the config's unitInformation of each unit's type
+        * player_index (list): The player controlling each unit, 0 for you 1 for the enemy
+        * x (list): The x coordinate of each unit
+        * y (list): The y coordinate of each unit
+        * health (list): The health of each unit
+        * upgraded (list): If each unit is upgraded
+        * pending_removal (list): If each unit is marked for removal by its owner
+        * structure_mask (int): Bitboard of the tiles holding a structure, bit x * ARENA_SIZE + y
+
+    """
+    def __init__(self, config):
+        """Creates an empty table for a game config
+
+        Args:
+            config (JSON): Contains information about the game
+
+        """
+        self.config = config
+        self.__shorthands = [unit_information.get("shorthand") for unit_information in config["unitInformation"]]
+        self.__stationary = [unit_information.get("unitCategory") == 0 for unit_information in config["unitInformation"]]
+        self.type_index = []
+        self.player_index = []
+        self.x = []
+        self.y = []
+        self.health = []
+        self.upgraded = []
+        self.pending_removal = []
+        self.structure_mask = 0
+        self.__rows_at = {}
+        self.__structure_at = {}
+
+    def __len__(self):
+        return len(self.type_index)
+
+    def add_serialized_units(self, units, player_index):
+        """Adds the units of one player from a serialized game state, such as state["p1Units"]
+
+        Args:
+            units: A list holding, for each unit type, a list of [x, y, health, id] entries
+            player_index: The index corresponding to the player controlling the units, 0 for you 1 for the enemy
+
+        """
+        # Removals and upgrades flag a structure parsed earlier, so they are applied after every other type
+        for type_index, entries in enumerate(units):
+            if type_index == REMOVE_INDEX or type_index == UPGRADE_INDEX:
+                continue
+            stationary = self.__stationary[type_index]
+            for entry in entries:
+                x, y = int(entry[0]), int(entry[1])
+                tile = x * ARENA_SIZE + y
+                row = len(self.type_index)
+                self.type_index.append(type_index)
+                self.player_index.append(player_index)
+                self.x.append(x)
+                self.y.append(y)
+                self.health.append(float(entry[2]))
+                self.upgraded.append(False)
+                self.pending_removal.append(False)
+                if tile in self.__rows_at:
+                    self.__rows_at[tile].append(row)
+                else:
+                    self.__rows_at[tile] = [row]
+                if stationary and tile not in self.__structure_at:
+                    self.__structure_at[tile] = row
+                    self.structure_mask |= 1 << tile
+        for flag_index, column in [(REMOVE_INDEX, self.pending_removal), (UPGRADE_INDEX, self.upgraded)]:
+            if flag_index >= len(units):
+                continue
+            for entry in units[flag_index]:
+                row = self.__structure_at.get(int(entry[0]) * ARENA_SIZE + int(entry[1]))
+                if row is not None:
+                    column[row] = True
+
+    def rows_at(self, x, y):
+        """Gets the rows of the units at a location, in the order they were parsed
+        """
+        return self.__rows_at.get(x * ARENA_SIZE + y, ())
+
+    def structure_at(self, x, y):
+        """Gets the row of the structure at a location, or None if there is none
+        """
+        return self.__structure_at.get(x * ARENA_SIZE + y)
+
+    def occupied_tiles(self):
+        """Gets the tiles holding at least one unit, as x * ARENA_SIZE + y indices
+        """
+        return self.__rows_at.keys()
+
+    def unit_type(self, row):
+        """Gets the shorthand of the type of the unit in a row
+        """
+        return self.__shorthands[self.type_index[row]]
+
+    def materialize(self, x, y):
+        """Builds the GameUnits at a location
+
+        Args:
+            x: The x coordinate, an int
+            y: The y coordinate, an int
+
+        Returns:
+            A new list of GameUnits, the same units game_map[x, y] held before the table was introduced
+        """
+        units = []
+        for row in self.__rows_at.get(x * ARENA_SIZE + y, ()):
+            unit = GameUnit(self.__shorthands[self.type_index[row]], self.config, self.player_index[row], self.health[row], x, y)
+            if self.upgraded[row]:
+                unit.upgrade()
+            unit.pending_removal = self.pending_removal[row]
+            units.append(unit)
+        return units
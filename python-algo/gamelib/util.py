@@ -1,4 +1,7 @@
+import collections
+import json
 import sys
+import threading
 
 
 BANNER_TEXT = "---------------- Starting Your Algo --------------------"
@@ -39,3 +42,162 @@ def debug_write(*msg):
     #Printing to STDERR is okay and printed out by the game but doesn't effect turns.
     sys.stderr.write(", ".join(map(str, msg)).strip() + "\n")
     sys.stderr.flush()
+
+class JsonCodec:
+    """A json backend
+
+    Attributes :
+        * name (str): The name of the module doing the work
+        * loads (function): Parses a json string
+        * dumps (function): Serializes an object to a json string
+
+    """
+    def __init__(self, name, loads, dumps):
+        self.name = name
+        self.loads = loads
+        self.dumps = dumps
+
+    def __repr__(self):
+        return "JsonCodec({})".format(self.name)
+
+
+def _find_json_codecs():
+    """Finds the installed json backends, fastest first. The standard json module is always available.
+    """
+    codecs = []
+    try:
+        import orjson
+        codecs.append(JsonCodec("orjson", orjson.loads, lambda obj: orjson.dumps(obj).decode("utf-8")))
+    except ImportError:
+        pass
+    try:
+        import ujson
+        codecs.append(JsonCodec("ujson", ujson.loads, ujson.dumps))
+    except ImportError:
+        pass
+    codecs.append(JsonCodec("json", json.loads, json.dumps))
+    return codecs
+
+JSON_CODECS = _find_json_codecs()
+_json_codec = JSON_CODECS[0]
+
+def get_json_codec():
+    """Gets the json backend used to talk to the game engine
+    """
+    return _json_codec
+
+def set_json_codec(name):
+    """Chooses the json backend used to talk to the game engine
+
+    Args:
+        name: "orjson", "ujson" or "json". The backend must be installed.
+
+    """
+    global _json_codec
+    for codec in JSON_CODECS:
+        if codec.name == name:
+            _json_codec = codec
+            return
+    raise ValueError("json backend {} is not installed, available: {}".format(name, [codec.name for codec in JSON_CODECS]))
+
+def json_loads(serialized):
+    """Parses a json string with the fastest installed backend
+    """
+    return _json_codec.loads(serialized)
+
+def json_dumps(obj):
+    """Serializes an object to a json string with the fastest installed backend
+    """
+    return _json_codec.dumps(obj)
+
+
+_json_decoder = json.JSONDecoder()
+
+def extract_json_value(serialized, key):
+    """Parses the value of one top level key of a json object without parsing the rest of it
+
+    The key is located by searching for '"key"' followed by a colon, so it must not also appear
+    as a key nested before it. Useful to read a few fields of a large game state string.
+
+    Args:
+        serialized: The json object as a string
+        key: The key to read
+
+    Returns:
+        The parsed value, or None if the key was not found
+
+    """
+    start = find_json_value(serialized, key)
+    if start == -1:
+        return None
+    return _json_decoder.raw_decode(serialized, start)[0]
+
+def find_json_value(serialized, key):
+    """Finds where the value of a key starts in a json object string, without parsing it
+
+    The key is located the same way as in extract_json_value.
+
+    Args:
+        serialized: The json object as a string
+        key: The key to look for
+
+    Returns:
+        The index of the first character of the value, or -1 if the key was not found
+
+    """
+    needle = '"{}"'.format(key)
+    start = serialized.find(needle)
+    while start != -1:
+        start += len(needle)
+        # Whitespace is allowed around the colon, and a string value equal to the key is skipped
+        while start < len(serialized) and serialized[start] in " \t\r\n":
+            start += 1
+        if serialized.startswith(":", start):
+            start += 1
+            while start < len(serialized) and serialized[start] in " \t\r\n":
+                start += 1
+            return start
+        start = serialized.find(needle, start)
+    return -1
+
+
+class ConfigCache:
+    """Values built once per config, kept for the few configs used most recently
+
+    Configs are dicts, which can not be weakly referenced, so the configs themselves are kept
+    alongside their values to stop their ids from being reused. Bounding the cache lets tools that
+    parse one config per replay free the old ones. A config evicted and seen again gets a new value.
+
+    Attributes :
+        * build (function): Called as build(config) the first time a config is seen
+        * size (int): The number of configs kept
+
+    """
+    def __init__(self, build, size=8):
+        self.build = build
+        self.size = size
+        self.__entries = collections.OrderedDict()
+        self.__lock = threading.Lock()
+        # The config used last and its value, read without locking since games use a single config
+        self.__last = (None, None)
+
+    def get(self, config):
+        """Gets the value of a config, building it if the config is not cached
+        """
+        last_config, value = self.__last
+        if last_config is config:
+            return value
+        with self.__lock:
+            entry = self.__entries.get(id(config))
+            if entry is None or entry[0] is not config:
+                entry = (config, self.build(config))
+                self.__entries[id(config)] = entry
+                while len(self.__entries) > self.size:
+                    self.__entries.popitem(last=False)
+            else:
+                self.__entries.move_to_end(id(config))
+            self.__last = entry
+        return entry[1]
+
+    def __len__(self):
+        return len(self.__entries)
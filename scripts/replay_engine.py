@@ -0,0 +1,196 @@
+"""
+Stands in for engine.jar to time an algo's turns, without Java or an opponent.
+
+Usage, from the root of this repository:
+    python3 scripts/replay_engine.py REPLAY_FILE.replay [ALGO_DIRECTORY_OR_RUN_FILE] [--quiet] [--timeout SECONDS]
+
+The algo is started with its run.sh (run.ps1 on windows), python-algo by default, and is sent the
+lines of the replay the way the engine sends them: the config first, then each turn's state, then
+the action frames of that turn and finally the end of game state. After each turn state the script
+waits for the algo's two command lines, build then deploy, before sending anything else, and records
+how long they took.
+
+The states come from the replay, not from what the algo does, so every run of the same replay sends
+the same states. The commands are only checked to be json lists. The script ends with the latency
+of each turn and a summary, and turns slower than the config's waitTimeBotSoft are marked.
+"""
+
+import argparse
+import json
+import os
+import queue
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+
+# Get location of this run file
+file_dir = os.path.dirname(os.path.realpath(__file__))
+parent_dir = os.path.abspath(os.path.join(file_dir, os.pardir))
+is_windows = sys.platform.startswith('win')
+
+
+def algo_command(algo):
+    """Gets the command starting an algo from its folder or its run file, the same way as run_match.py
+    """
+    run_file = "run.ps1" if is_windows else "run.sh"
+    if run_file not in algo:
+        algo = os.path.join(algo, run_file)
+    return "powershell.exe -file {}".format(algo) if is_windows else "bash {}".format(algo)
+
+
+def load_replay(path):
+    """Reads a replay file
+
+    Returns:
+        The config line, and the frame lines in file order, as sent to the algo
+    """
+    config = None
+    frames = []
+    with open(path) as replay:
+        for line in replay:
+            line = line.strip()
+            if not line:
+                continue
+            if config is None and '"debug"' in line:
+                config = line
+            else:
+                frames.append(line)
+    if config is None:
+        raise ValueError("{} has no config line".format(path))
+    return config, frames
+
+
+def read_lines(stream, lines):
+    # Runs in a thread, so waiting for the algo can time out
+    for line in iter(stream.readline, ""):
+        lines.put(line.strip())
+    lines.put(None)
+
+
+def is_command(line):
+    try:
+        return isinstance(json.loads(line), list)
+    except ValueError:
+        return False
+
+
+class AlgoProcess:
+    """An algo started as the engine starts it, with its stdin and stdout as pipes
+    """
+    def __init__(self, command, quiet=False):
+        self.process = subprocess.Popen(command, shell=True, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        stderr=subprocess.DEVNULL if quiet else sys.stderr,
+                                        universal_newlines=True, bufsize=1)
+        self.lines = queue.Queue()
+        threading.Thread(target=read_lines, args=(self.process.stdout, self.lines), daemon=True).start()
+
+    def send(self, line):
+        self.process.stdin.write(line + "\n")
+        self.process.stdin.flush()
+
+    def receive(self, timeout):
+        """Waits for the next line the algo prints
+
+        Returns:
+            The line, or None if the algo exited or printed nothing for timeout seconds
+        """
+        try:
+            return self.lines.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def stop(self, timeout):
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+
+
+class TurnTiming:
+    """How long the algo took to answer one turn state
+
+    Attributes :
+        * turn (int): The turn number
+        * build (float): Seconds until the build command was received
+        * deploy (float): Seconds until the deploy command was received, the turn's latency
+        * valid (bool): True if both commands are json lists
+
+    """
+    def __init__(self, turn, build, deploy, valid):
+        self.turn = turn
+        self.build = build
+        self.deploy = deploy
+        self.valid = valid
+
+
+def play_replay(algo, config, frames, timeout):
+    """Sends the replay to the algo, waiting for its commands after each turn state
+
+    Returns:
+        The TurnTiming of each turn the algo answered
+    """
+    timings = []
+    algo.send(config)
+    for frame in frames:
+        turn_info = json.loads(frame)["turnInfo"]
+        algo.send(frame)
+        if turn_info[0] != 0:
+            continue
+        started = time.perf_counter()
+        commands = []
+        for _ in range(2):
+            line = algo.receive(max(0, started + timeout - time.perf_counter()))
+            if line is None:
+                print("Turn {}: no command from the algo after {:.1f}s, stopping".format(turn_info[1], time.perf_counter() - started))
+                return timings
+            commands.append((line, time.perf_counter() - started))
+        timings.append(TurnTiming(turn_info[1], commands[0][1], commands[1][1], all(is_command(line) for line, _ in commands)))
+    return timings
+
+
+def report(timings, soft_limit):
+    for timing in timings:
+        print("Turn {:>3}: build {:>9.1f}ms, deploy {:>9.1f}ms{}{}".format(
+            timing.turn, timing.build * 1000, timing.deploy * 1000,
+            "" if timing.valid else ", invalid command", ", over the soft limit" if timing.deploy > soft_limit else ""))
+    if not timings:
+        print("The algo answered no turn")
+        return
+    latencies = sorted(timing.deploy for timing in timings)
+    print()
+    print("{} turns, latency mean {:.1f}ms, median {:.1f}ms, 95th percentile {:.1f}ms, max {:.1f}ms".format(
+        len(latencies), statistics.mean(latencies) * 1000, statistics.median(latencies) * 1000,
+        latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, latencies[-1] * 1000))
+    print("{} turns over the soft limit of {:.0f}ms, {} with invalid commands".format(
+        sum(latency > soft_limit for latency in latencies), soft_limit * 1000, sum(not timing.valid for timing in timings)))
+
+
+def main():
+    default_algo = os.path.join(parent_dir, "python-algo")
+    parser = argparse.ArgumentParser(description="Sends a replay to an algo as the engine would and times its turns")
+    parser.add_argument("replay", help="The replay file to send")
+    parser.add_argument("algo", nargs="?", default=default_algo, help="The algo folder or run file, python-algo by default")
+    parser.add_argument("--quiet", action="store_true", help="Hide what the algo prints to stderr")
+    parser.add_argument("--timeout", type=float, default=None,
+                        help="Seconds to wait for a turn's commands, the config's waitTimeBotMax by default")
+    args = parser.parse_args()
+
+    config, frames = load_replay(args.replay)
+    timing_config = json.loads(config).get("timingAndReplay", {})
+    soft_limit = timing_config.get("waitTimeBotSoft", 5000) / 1000
+    timeout = args.timeout if args.timeout is not None else timing_config.get("waitTimeBotMax", 35000) / 1000
+
+    algo = AlgoProcess(algo_command(args.algo), args.quiet)
+    try:
+        timings = play_replay(algo, config, frames, timeout)
+    finally:
+        algo.stop(timeout=5)
+    report(timings, soft_limit)
+
+
+if __name__ == "__main__":
+    main()